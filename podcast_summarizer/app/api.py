@@ -1,10 +1,21 @@
 # app/api.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Literal, Dict, Any
-import os
+from typing import Optional, Literal, Dict, Any, AsyncIterator, List
+import asyncio, os, json
 
-from src.pipeline import get_segments, run_pipeline
+from src.pipeline import (
+    get_segments, run_pipeline, coalescing_stats, save_transcript,
+    get_segments_async, run_pipeline_async, iter_pipeline_async,
+)
+from src.jobs import JobManager
+from src.batch import run_batch
+from src.providers import get_provider, provider_name
+from src.metrics import render_prometheus
+from src.retry import breaker_stats
+from src.transcript import get_transcript_store
+from src.search import get_search_index
 
 # --------- Modelos de request/response ---------
 
@@ -15,6 +26,9 @@ class SegmentsReq(BaseModel):
     window_minutes: int = Field(default=20, ge=1, description="Tamaño de ventana para chunking/transcripción")
     gemini_model: str = Field(default="gemini-1.5-flash", description="Modelo de transcripción Gemini")
     google_api_key: Optional[str] = Field(default=None, description="API key de Gemini (opcional; si no, se usa la de entorno)")
+    stream_audio: bool = Field(default=False, description="Sin captions: descarga y transcribe en streaming, sin MP3 intermedio")
+    asr_preprocess: bool = Field(default=True, description="Audio para ASR: mono 16 kHz, cortes en silencios, sin pausas largas")
+    compact: bool = Field(default=False, description="Sin text/segments: solo cabecera y transcript_id (segmentos por páginas en /transcripts/{id}/segments)")
 
 class SummarizeReq(BaseModel):
     # Entrada (igual que SegmentsReq)
@@ -26,6 +40,8 @@ class SummarizeReq(BaseModel):
     # Transcripción
     window_minutes: int = Field(default=20, ge=1)
     gemini_model: str = Field(default="gemini-1.5-flash")
+    stream_audio: bool = Field(default=False, description="Sin captions: descarga y transcribe en streaming, sin MP3 intermedio")
+    asr_preprocess: bool = Field(default=True, description="Audio para ASR: mono 16 kHz, cortes en silencios, sin pausas largas")
 
     # Resumen
     gemma_model: str = Field(default="gemma-3-12b-it", description="Modelo para resumir")
@@ -34,14 +50,43 @@ class SummarizeReq(BaseModel):
     per_minute_token_budget: int = Field(default=12000, ge=1000, description="Presupuesto de tokens/min para rate-limit")
     prompts_dir: Optional[str] = Field(default="prompts", description="Carpeta con prompts .txt")
     do_summary: bool = Field(default=True, description="Si false, solo devuelve transcripción")
+    compact: bool = Field(default=False, description="segments_result sin text/segments (ver /transcripts/{id}/segments)")
+    use_cache: bool = Field(default=True, description="Reutiliza resúmenes por ventana ya generados (cache por prompt)")
+    incremental: bool = Field(default=False, description="Streams en vivo / premieres: procesa solo lo nuevo desde la última llamada")
+    summary_mode: Literal["sequential", "parallel"] = Field(default="sequential", description="'parallel' resume todas las ventanas a la vez")
+    summary_context: Literal["none", "draft"] = Field(default="none", description="Contexto en modo paralelo: ninguno o bullets de un pase barato")
+    coherence_pass: bool = Field(default=False, description="Revisión conjunta de las ventanas antes del resumen global")
+    reduce_group_size: int = Field(default=6, ge=2, description="Episodios muy largos: fusiona el overall por grupos de k ventanas, en niveles")
+    window_tokens: Optional[int] = Field(default=None, ge=200, description="Si se da, ventanas del resumen por tokens estimados en vez de minutos")
+    overlap_tokens: int = Field(default=0, ge=0, description="Solapamiento en tokens (con window_tokens)")
+    window_mode: Literal["time", "budget", "topic"] = Field(default="time", description="'budget': ventanas por tokens según per_minute_token_budget, sin recortar texto; 'topic': cortes en cambios de tema, sin solapamiento")
+
+class BatchReq(SummarizeReq):
+    # Mismas opciones de resumen que SummarizeReq; 'url' y 'audio_path' se ignoran.
+    sources: List[str] = Field(..., min_length=1, description="URLs de videos, playlists o canales de YouTube")
+    max_workers: int = Field(default=4, ge=1, description="Episodios en vuelo a la vez")
+    download_concurrency: int = Field(default=2, ge=1)
+    asr_concurrency: int = Field(default=2, ge=1)
+    summarize_concurrency: int = Field(default=2, ge=1)
+    retry_failed: bool = Field(default=True, description="Reintenta los episodios que fallaron en una corrida anterior")
 
 class HealthResp(BaseModel):
     status: str
     have_google_key_env: bool
+    provider: str
+
+class JobResp(BaseModel):
+    job_id: str
+    status: str
 
 # --------- App ---------
 app = FastAPI(title="YT Summarizer", version="1.0.0", docs_url="/docs", redoc_url="/redoc")
 
+# Pool de workers para /jobs/* (tamaño vía JOB_WORKERS)
+jobs = JobManager()
+
+OUTPUT_DIR = "/app/outputs"       # ruta consistente dentro del contenedor
+
 
 # --------- Helpers ---------
 def _resolve_google_key(body_key: Optional[str]) -> Optional[str]:
@@ -60,37 +105,115 @@ def _validate_source(req_url: Optional[str], req_audio_path: Optional[str]):
         )
 
 
+def _with_transcript(result: Dict[str, Any], url: Optional[str], audio_path: Optional[str],
+                     compact: bool) -> Dict[str, Any]:
+    """
+    Guarda la transcripción en formato compacto y agrega transcript_id.
+    compact=True: solo la cabecera (source, lang, kind, meta, n_segments), sin text ni segments.
+    """
+    tid = save_transcript(result, url, audio_path, out_dir=OUTPUT_DIR)
+    if not compact:
+        return dict(result, transcript_id=tid)
+    head = {k: v for k, v in result.items() if k not in ("text", "segments")}
+    return dict(head, transcript_id=tid, n_segments=len(result.get("segments") or []))
+
+
+def _segments_kwargs(req: SegmentsReq) -> Dict[str, Any]:
+    _validate_source(req.url, req.audio_path)
+    return dict(
+        url=req.url,
+        audio_path=req.audio_path,
+        lang=req.lang,
+        google_api_key=_resolve_google_key(req.google_api_key),
+        window_minutes=req.window_minutes,
+        gemini_model=req.gemini_model,
+        prefer_captions=True,         # primero intentará captions de YouTube
+        stream_audio=req.stream_audio,
+        asr_preprocess=req.asr_preprocess,
+        out_dir=OUTPUT_DIR,           # mismo out_dir que /summarize: audios, índice de búsqueda
+    )
+
+
+def _summarize_kwargs(req: SummarizeReq) -> Dict[str, Any]:
+    _validate_source(req.url, req.audio_path)
+    return dict(url=req.url, audio_path=req.audio_path, **_pipeline_kwargs(req))
+
+
+def _pipeline_kwargs(req: SummarizeReq) -> Dict[str, Any]:
+    google_key = _resolve_google_key(req.google_api_key)
+    if req.do_summary and not google_key and get_provider(google_key).requires_key:
+        # si hará resumen, igual necesitamos la key para el overall con Gemma (vía Google GenAI)
+        # (Si en tu entorno Gemma vive en otra API distinta, ajusta esta validación)
+        raise HTTPException(
+            status_code=400,
+            detail="Falta GOOGLE_API_KEY (en el body o como variable de entorno) para el resumen."
+        )
+    return dict(
+        lang=req.lang,
+        google_api_key=google_key,
+        gemini_model=req.gemini_model,
+        gemma_model=req.gemma_model,
+        window_minutes=req.window_minutes,
+        overlap_minutes=req.overlap_minutes,
+        per_window_max_chars=req.per_window_max_chars,
+        per_minute_token_budget=req.per_minute_token_budget,
+        prompts_dir=req.prompts_dir,
+        do_summary=req.do_summary,
+        use_cache=req.use_cache,
+        incremental=req.incremental,
+        summary_mode=req.summary_mode,
+        summary_context=req.summary_context,
+        coherence_pass=req.coherence_pass,
+        reduce_group_size=req.reduce_group_size,
+        window_tokens=req.window_tokens,
+        overlap_tokens=req.overlap_tokens,
+        window_mode=req.window_mode,
+        stream_audio=req.stream_audio,
+        asr_preprocess=req.asr_preprocess,
+        out_dir=OUTPUT_DIR,           # asegura ruta consistente dentro del contenedor
+    )
+
+
 # --------- Endpoints ---------
 
 @app.get("/", response_model=HealthResp, tags=["system"])
 def root():
     """Salud del servicio."""
-    return HealthResp(status="ok", have_google_key_env=bool(os.getenv("GOOGLE_API_KEY")))
+    return HealthResp(status="ok", have_google_key_env=bool(os.getenv("GOOGLE_API_KEY")), provider=provider_name())
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["system"])
+def prometheus_metrics():
+    """Totales del proceso por etapa y contadores, en formato de texto Prometheus."""
+    # cada familia en su bloque, con sus muestras contiguas bajo su TYPE
+    flights = sorted(coalescing_stats().items())
+    lines = ["# TYPE podcast_inflight gauge"]
+    lines += [f'podcast_inflight{{kind="{kind}"}} {st["keys"]}' for kind, st in flights]
+    lines.append("# TYPE podcast_inflight_waiters gauge")
+    lines += [f'podcast_inflight_waiters{{kind="{kind}"}} {st["waiters"]}' for kind, st in flights]
+    breakers = sorted(breaker_stats().items())
+    lines.append("# TYPE podcast_breaker_open gauge")
+    lines += [f'podcast_breaker_open{{model="{m}"}} {int(st["state"] != "closed")}' for m, st in breakers]
+    # por modelo; el total sin etiquetas (podcast_breaker_trips_total) sale de render_prometheus
+    lines.append("# TYPE podcast_breaker_opened_total counter")
+    lines += [f'podcast_breaker_opened_total{{model="{m}"}} {st["opened"]}' for m, st in breakers]
+    return PlainTextResponse(render_prometheus() + "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 
 @app.post("/segments", tags=["transcription"])
-def segments(req: SegmentsReq) -> Dict[str, Any]:
+async def segments(req: SegmentsReq) -> Dict[str, Any]:
     """
     Devuelve la transcripción unificada:
     {
-      text, segments, source(captions|gemini), lang, kind, meta
+      text, segments, source(captions|gemini), lang, kind, sep, meta, transcript_id
     }
+    Con compact=true solo la cabecera; los segmentos se piden luego por páginas o rango de tiempo.
     """
-    _validate_source(req.url, req.audio_path)
-
-    google_key = _resolve_google_key(req.google_api_key)
+    kwargs = _segments_kwargs(req)
 
     try:
-        result = get_segments(
-            url=req.url,
-            audio_path=req.audio_path,
-            lang=req.lang,
-            google_api_key=google_key,
-            window_minutes=req.window_minutes,
-            gemini_model=req.gemini_model,
-            prefer_captions=True,         # primero intentará captions de YouTube
-        )
-        return result
+        result = await get_segments_async(**kwargs)
+        return await asyncio.to_thread(_with_transcript, result, req.url, req.audio_path, req.compact)
     except HTTPException:
         raise
     except Exception as e:
@@ -98,7 +221,7 @@ def segments(req: SegmentsReq) -> Dict[str, Any]:
 
 
 @app.post("/summarize", tags=["summarize"])
-def summarize(req: SummarizeReq) -> Dict[str, Any]:
+async def summarize(req: SummarizeReq) -> Dict[str, Any]:
     """
     Orquesta todo: (captions -> gemini) -> resumen por ventanas (con solapamiento).
     Devuelve:
@@ -106,35 +229,153 @@ def summarize(req: SummarizeReq) -> Dict[str, Any]:
         segments_result, final_text, per_window, overall, summary_path
       }
     """
-    _validate_source(req.url, req.audio_path)
-
-    google_key = _resolve_google_key(req.google_api_key)
-    if req.do_summary and not google_key:
-        # si hará resumen, igual necesitamos la key para el overall con Gemma (vía Google GenAI)
-        # (Si en tu entorno Gemma vive en otra API distinta, ajusta esta validación)
-        raise HTTPException(
-            status_code=400,
-            detail="Falta GOOGLE_API_KEY (en el body o como variable de entorno) para el resumen."
-        )
+    kwargs = _summarize_kwargs(req)
 
     try:
-        res = run_pipeline(
-            url=req.url,
-            audio_path=req.audio_path,
-            lang=req.lang,
-            google_api_key=google_key,
-            gemini_model=req.gemini_model,
-            gemma_model=req.gemma_model,
-            window_minutes=req.window_minutes,
-            overlap_minutes=req.overlap_minutes,
-            per_window_max_chars=req.per_window_max_chars,
-            per_minute_token_budget=req.per_minute_token_budget,
-            prompts_dir=req.prompts_dir,
-            do_summary=req.do_summary,
-            out_dir="/app/outputs",       # asegura ruta consistente dentro del contenedor
-        )
-        return res
+        res = await run_pipeline_async(**kwargs)
+        # res puede ser compartido con otras peticiones idénticas (coalescencia): no se modifica
+        segs = await asyncio.to_thread(_with_transcript, res["segments_result"], req.url, req.audio_path, req.compact)
+        return dict(res, segments_result=segs)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(500, f"Summarization failed: {e}")
+
+
+def _open_transcript(transcript_id: str):
+    try:
+        t = get_transcript_store(os.path.join(OUTPUT_DIR, ".transcripts")).get(transcript_id)
+    except ValueError:
+        t = None
+    if t is None:
+        raise HTTPException(404, f"Transcripción no encontrada: {transcript_id}")
+    return t
+
+
+@app.get("/transcripts/{transcript_id}", tags=["transcription"])
+def get_transcript(transcript_id: str) -> Dict[str, Any]:
+    """Cabecera de una transcripción guardada: source, lang, kind, meta, n_segments, duration."""
+    return dict(_open_transcript(transcript_id).header(), transcript_id=transcript_id)
+
+
+@app.get("/transcripts/{transcript_id}/segments", tags=["transcription"])
+def get_transcript_segments(
+    transcript_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=200, ge=1, le=5000),
+    start: Optional[float] = Query(default=None, ge=0, description="Segundos; segmentos que siguen sonando en start o después"),
+    end: Optional[float] = Query(default=None, ge=0, description="Segundos; segmentos que empiezan antes de end"),
+) -> Dict[str, Any]:
+    """
+    Página de segmentos, opcionalmente dentro de [start, end):
+      { transcript_id, total, offset, limit, next_offset(null al final), segments }
+    """
+    page = _open_transcript(transcript_id).page(offset=offset, limit=limit, start=start, end=end)
+    return dict(page, transcript_id=transcript_id)
+
+
+@app.get("/search", tags=["search"])
+def search(
+    q: str = Query(..., min_length=1, description='Palabras (todas deben aparecer), "frase exacta" o prefijo*'),
+    limit: int = Query(default=20, ge=1, le=200),
+    offset: int = Query(default=0, ge=0),
+    episode_id: Optional[str] = Query(default=None, description="Solo este episodio (transcript_id, p.ej. yt_abc123_es)"),
+    lang: Optional[str] = Query(default=None),
+    start: Optional[float] = Query(default=None, ge=0, description="Segundos: solo segmentos que terminan después"),
+    end: Optional[float] = Query(default=None, ge=0, description="Segundos: solo segmentos que empiezan antes"),
+) -> Dict[str, Any]:
+    """
+    Búsqueda de texto en todos los episodios ya transcritos (índice local SQLite FTS5), sin volver
+    a pedir las transcripciones. Devuelve fragmentos con marca de tiempo, del más relevante al menos:
+      { query, offset, limit, next_offset, hits: [{episode_id, video_id, url, start, end, snippet, score}] }
+    """
+    try:
+        return get_search_index(OUTPUT_DIR).search(q, limit=limit, offset=offset, episode_id=episode_id,
+                                                   lang=lang, start=start, end=end)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/summarize/stream", tags=["summarize"])
+async def summarize_stream(req: SummarizeReq) -> StreamingResponse:
+    """
+    Igual que /summarize, pero como Server-Sent Events: emite cada resumen por ventana
+    apenas está listo. Eventos: segments, window, overall, result (sin segments_result), error.
+    """
+    kwargs = _summarize_kwargs(req)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for ev in iter_pipeline_async(**kwargs):
+                kind = ev.pop("type")
+                if kind == "result":
+                    res = {k: v for k, v in ev["result"].items() if k != "segments_result"}
+                    yield _sse("result", res)
+                else:
+                    yield _sse(kind, ev)
+        except Exception as e:
+            yield _sse("error", {"detail": f"Summarization failed: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --------- Jobs (asíncronos) ---------
+
+@app.post("/jobs/segments", response_model=JobResp, status_code=202, tags=["jobs"])
+def create_segments_job(req: SegmentsReq) -> JobResp:
+    """Encola una transcripción y devuelve el job_id de inmediato."""
+    job_id = jobs.submit("segments", get_segments, **_segments_kwargs(req))
+    return JobResp(job_id=job_id, status="queued")
+
+
+@app.post("/jobs/summarize", response_model=JobResp, status_code=202, tags=["jobs"])
+def create_summarize_job(req: SummarizeReq) -> JobResp:
+    """Encola transcripción + resumen y devuelve el job_id de inmediato."""
+    job_id = jobs.submit("summarize", run_pipeline, **_summarize_kwargs(req))
+    return JobResp(job_id=job_id, status="queued")
+
+
+@app.post("/jobs/batch", response_model=JobResp, status_code=202, tags=["jobs"])
+def create_batch_job(req: BatchReq) -> JobResp:
+    """
+    Encola un batch (lista de URLs, playlists o canales). Salta episodios ya procesados,
+    guarda checkpoint en outputs/batch_state.json y se puede reanudar reenviando el mismo body.
+    """
+    job_id = jobs.submit(
+        "batch", run_batch,
+        sources=req.sources,
+        max_workers=req.max_workers,
+        download_concurrency=req.download_concurrency,
+        asr_concurrency=req.asr_concurrency,
+        summarize_concurrency=req.summarize_concurrency,
+        retry_failed=req.retry_failed,
+        **_pipeline_kwargs(req),
+    )
+    return JobResp(job_id=job_id, status="queued")
+
+
+@app.get("/jobs/{job_id}", tags=["jobs"])
+def get_job(job_id: str) -> Dict[str, Any]:
+    """
+    Estado del job:
+      {
+        id, kind, status(queued|running|done|error), progress{etapa: {...}}, result, error
+      }
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job no encontrado: {job_id}")
+    return job
+
+
+@app.on_event("shutdown")
+def _shutdown_jobs():
+    jobs.shutdown(wait=False)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+from typing import Iterator, List, Tuple, IO
+from bisect import bisect_right
+import os, re, subprocess, time
+
+from .procs import run_async
+
+# Audio pensado para ASR: mono, 16 kHz, MP3 de bajo bitrate (voz)
+ASR_AUDIO_ARGS = ["-vn", "-ac", "1", "-ar", "16000", "-c:a", "libmp3lame", "-b:a", "32k"]
+
+def segment_stream(
+    source: IO[bytes],
+    segment_seconds: float,
+    work_dir: str,
+    poll_seconds: float = 0.5,
+) -> Iterator[Tuple[str, float, float]]:
+    """
+    Un único ffmpeg lee audio desde `source` (pipe) y lo corta en chunks ASR a medida que llegan
+    los bytes. Emite (path, start, end) apenas cada chunk se cierra (según la segment_list csv
+    que ffmpeg escribe al terminar cada segmento), sin esperar al final del stream.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    list_path = os.path.join(work_dir, "segments.csv")
+    pattern = os.path.join(work_dir, "chunk_%03d.mp3")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", "pipe:0",
+        *ASR_AUDIO_ARGS,
+        "-f", "segment",
+        "-segment_time", str(int(segment_seconds)),
+        "-reset_timestamps", "1",
+        "-segment_list", list_path,
+        "-segment_list_type", "csv",
+        pattern,
+    ]
+    proc = subprocess.Popen(cmd, stdin=source, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    seen = 0
+
+    def read_new() -> List[Tuple[str, float, float]]:
+        nonlocal seen
+        try:
+            with open(list_path, "r", encoding="utf-8") as f:
+                lines = [l.strip() for l in f if l.strip()]
+        except FileNotFoundError:
+            return []
+        new = []
+        for line in lines[seen:]:
+            name, st, en = line.rsplit(",", 2)
+            new.append((os.path.join(work_dir, name), float(st), float(en)))
+        seen = len(lines)
+        return new
+
+    try:
+        while proc.poll() is None:
+            for item in read_new():
+                yield item
+            time.sleep(poll_seconds)
+        for item in read_new():
+            yield item
+        if proc.returncode != 0:
+            err = proc.stderr.read().decode("utf-8", "replace") if proc.stderr else ""
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=err)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+# ========= Preprocesado para ASR (silencios) =========
+_SIL_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SIL_END_RE = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+def _silencedetect_cmd(path: str, noise_db: float, min_silence: float) -> List[str]:
+    return ["ffmpeg", "-hide_banner", "-nostats", "-i", path,
+            "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"]
+
+def detect_silences(path: str, noise_db: float = -35.0, min_silence: float = 0.4) -> List[Tuple[float, float]]:
+    """Silencios [(start, end)] según ffmpeg silencedetect (una sola pasada de decodificación)."""
+    proc = subprocess.run(
+        _silencedetect_cmd(path, noise_db, min_silence),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+    )
+    return _parse_silences(proc.stderr)
+
+async def detect_silences_async(path: str, noise_db: float = -35.0, min_silence: float = 0.4) -> List[Tuple[float, float]]:
+    return _parse_silences(await run_async(_silencedetect_cmd(path, noise_db, min_silence), capture="stderr"))
+
+def _parse_silences(stderr: str) -> List[Tuple[float, float]]:
+    out: List[Tuple[float, float]] = []
+    start = None
+    for line in stderr.splitlines():
+        m = _SIL_START_RE.search(line)
+        if m:
+            start = max(0.0, float(m.group(1)))
+            continue
+        m = _SIL_END_RE.search(line)
+        if m and start is not None:
+            out.append((start, float(m.group(1))))
+            start = None
+    return out
+
+def plan_chunks(
+    duration: float,
+    silences: List[Tuple[float, float]],
+    target_sec: float,
+    skip_silence_sec: float = 2.0,
+    search_sec: float = 90.0,
+    min_piece_sec: float = 0.3,
+) -> List[List[Tuple[float, float]]]:
+    """
+    Planifica chunks de ~target_sec de voz:
+    - silencios >= skip_silence_sec (pausas largas, cortinas bajo el umbral) se omiten del audio;
+    - los cortes caen en el punto medio de un silencio corto dentro de los últimos search_sec
+      antes del objetivo (corte duro solo si no hay ninguno), así no se parten palabras.
+    Devuelve, por chunk, la lista de intervalos de voz [(a, b)] en tiempo absoluto.
+    """
+    speech: List[Tuple[float, float]] = []
+    cur = 0.0
+    for s, e in silences:
+        if e - s >= skip_silence_sec:
+            if s > cur:
+                speech.append((cur, s))
+            cur = max(cur, e)
+    if cur < duration:
+        speech.append((cur, duration))
+    cuts = sorted((s + e) / 2 for s, e in silences if e - s < skip_silence_sec)
+
+    pieces: List[Tuple[float, float]] = []
+    for a, b in speech:
+        while b - a > target_sec:
+            goal = a + target_sec
+            i = bisect_right(cuts, goal) - 1
+            c = cuts[i] if i >= 0 and cuts[i] > max(a, goal - search_sec) else goal
+            pieces.append((a, c))
+            a = c
+        pieces.append((a, b))
+    pieces = [(a, b) for a, b in pieces if b - a >= min_piece_sec]
+
+    chunks: List[List[Tuple[float, float]]] = []
+    group: List[Tuple[float, float]] = []
+    voiced = 0.0
+    for a, b in pieces:
+        if group and voiced + (b - a) > target_sec:
+            chunks.append(group); group = []; voiced = 0.0
+        group.append((a, b)); voiced += b - a
+    if group:
+        chunks.append(group)
+    return chunks
+
+def encode_chunk(input_path: str, intervals: List[Tuple[float, float]], out_path: str):
+    """
+    Codifica [intervals[0].a, intervals[-1].b] como audio ASR; si hay varios intervalos,
+    los huecos entre ellos (silencios largos) se eliminan con aselect.
+    """
+    subprocess.check_call(_encode_chunk_cmd(input_path, intervals, out_path),
+                          stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+async def encode_chunk_async(input_path: str, intervals: List[Tuple[float, float]], out_path: str):
+    await run_async(_encode_chunk_cmd(input_path, intervals, out_path))
+
+def _encode_chunk_cmd(input_path: str, intervals: List[Tuple[float, float]], out_path: str) -> List[str]:
+    a0, b_last = intervals[0][0], intervals[-1][1]
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+           "-ss", f"{a0:.3f}", "-to", f"{b_last:.3f}", "-i", input_path]
+    if len(intervals) > 1:
+        sel = "+".join(f"between(t,{a - a0:.3f},{b - a0:.3f})" for a, b in intervals)
+        cmd += ["-af", f"aselect='{sel}',asetpts=N/SR/TB"]
+    return cmd + [*ASR_AUDIO_ARGS, out_path]
+
+
+# ========= Cola de un audio (modo incremental) =========
+def _trim_cmd(input_path: str, start_s: float, out_path: str) -> List[str]:
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-ss", f"{start_s:.3f}", "-i", input_path, *ASR_AUDIO_ARGS, out_path]
+
+def trim_audio(input_path: str, start_s: float, out_path: str) -> str:
+    """Copia como audio ASR lo que hay desde start_s hasta el final (p.ej. una grabación que sigue creciendo)."""
+    subprocess.check_call(_trim_cmd(input_path, start_s, out_path),
+                          stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    return out_path
+
+async def trim_audio_async(input_path: str, start_s: float, out_path: str) -> str:
+    await run_async(_trim_cmd(input_path, start_s, out_path))
+    return out_path
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, List, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json, os, re, threading, time
+
+from .captions import extract_video_id
+from .youtube import list_playlist_ids
+from .pipeline import run_pipeline
+
+_COLLECTION_RE = re.compile(r"[?&]list=|/playlist\b|/@[^/]+|/channel/|/c/|/user/")
+
+def expand_sources(sources: List[str]) -> List[str]:
+    """
+    Convierte URLs sueltas, playlists y canales en una lista de video IDs sin repetir
+    (en el orden de entrada). Las URL de video con &list= se tratan como video.
+    """
+    ids: List[str] = []
+    for src in sources:
+        src = (src or "").strip()
+        if not src:
+            continue
+        vid = None
+        try:
+            vid = extract_video_id(src)
+        except ValueError:
+            pass
+        found = [vid] if vid else (list_playlist_ids(src) if _COLLECTION_RE.search(src) else [])
+        if not found:
+            raise ValueError(f"No se pudo interpretar la fuente: {src}")
+        for v in found:
+            if v not in ids:
+                ids.append(v)
+    return ids
+
+
+class BatchState:
+    """
+    Checkpoint JSON {video_id: {status, summary_path|error, updated_at}} para reanudar un batch.
+    Se reescribe de forma atómica tras cada episodio.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.items: Dict[str, Dict[str, Any]] = json.load(f)
+        except Exception:
+            self.items = {}
+
+    def status(self, vid: str) -> Optional[str]:
+        with self._lock:
+            return (self.items.get(vid) or {}).get("status")
+
+    def record(self, vid: str, **info):
+        with self._lock:
+            self.items[vid] = dict(info, updated_at=time.time())
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.items, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+
+def run_batch(
+    sources: List[str],
+    out_dir: str = "/outputs",
+    max_workers: int = 4,
+    download_concurrency: int = 2,
+    asr_concurrency: int = 2,
+    summarize_concurrency: int = 2,
+    state_path: Optional[str] = None,
+    retry_failed: bool = True,
+    progress: Optional[Callable[..., None]] = None,
+    **pipeline_kwargs,
+) -> Dict[str, Any]:
+    """
+    Procesa muchas URLs / playlists / canales con run_pipeline en un pool acotado.
+    - Dedup: salta los video IDs ya 'done' en el checkpoint (out_dir/batch_state.json por defecto)
+      o que ya tienen out_dir/yt_<id>_summary.txt de una corrida anterior.
+    - Concurrencia por etapa: descargas, ASR y resúmenes tienen su propio límite, compartido
+      entre episodios (p.ej. 4 episodios en vuelo pero solo 2 descargando a la vez).
+    - retry_failed=False también salta los que quedaron en 'error'.
+    pipeline_kwargs se pasan tal cual a run_pipeline (lang, google_api_key, gemma_model, ...).
+    Devuelve {total, skipped, done, failed, results: {video_id: {...}}}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state = BatchState(state_path or os.path.join(out_dir, "batch_state.json"))
+    ids = expand_sources(sources)
+
+    skip = {"done"} if retry_failed else {"done", "error"}
+    todo = [
+        v for v in ids
+        if state.status(v) not in skip
+        and not os.path.exists(os.path.join(out_dir, f"yt_{v}_summary.txt"))
+    ]
+    skipped = len(ids) - len(todo)
+
+    limits = {
+        "download": threading.BoundedSemaphore(max(1, download_concurrency)),
+        "asr": threading.BoundedSemaphore(max(1, asr_concurrency)),
+        "summarize": threading.BoundedSemaphore(max(1, summarize_concurrency)),
+    }
+    counters = {"done": 0, "failed": 0}
+    results: Dict[str, Dict[str, Any]] = {}
+    lock = threading.Lock()
+
+    def one(vid: str) -> Dict[str, Any]:
+        res = run_pipeline(
+            url=f"https://www.youtube.com/watch?v={vid}",
+            out_dir=out_dir,
+            stage_limits=limits,
+            **pipeline_kwargs,
+        )
+        return {"status": "done", "summary_path": res.get("summary_path")}
+
+    if progress: progress("batch", status="running", done=0, failed=0, total=len(todo), skipped=skipped)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="batch") as pool:
+        futs = {pool.submit(one, v): v for v in todo}
+        for f in as_completed(futs):
+            vid = futs[f]
+            try:
+                info = f.result()
+            except Exception as e:
+                info = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+            state.record(vid, **info)
+            with lock:
+                results[vid] = info
+                counters["done" if info["status"] == "done" else "failed"] += 1
+                if progress: progress("batch", status="running", total=len(todo), skipped=skipped, **counters)
+    if progress: progress("batch", status="done", total=len(todo), skipped=skipped, **counters)
+
+    return {"total": len(ids), "skipped": skipped, **counters, "results": results}
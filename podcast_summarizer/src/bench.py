@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline del pipeline contra providers.FakeProvider (sin red ni cuota).
+
+    python -m src.bench --minutes 30 60 180 --mode sequential parallel --latency-ms 200 --rate-429 0.02
+
+La transcripción es sintética (~150 palabras/min en segmentos de 10 s) y reemplaza a
+get_segments; el resto de run_pipeline (ventanas, rate limiter, reintentos, overall) es el real.
+Imprime una fila por corrida con el tiempo total, las etapas y los contadores de result["meta"]["metrics"].
+"""
+from typing import Dict, Any, List
+import argparse, json, random, tempfile, time
+
+from . import pipeline, ratelimit, retry
+from .providers import FakeProvider
+
+_VOCAB = ("el modelo de lenguaje procesa datos del mercado y la empresa ajusta su estrategia "
+          "de producto según la latencia el costo y la escala de la nube").split()
+
+def synthetic_transcript(minutes: float, seed: int = 0, seg_seconds: float = 10.0, wpm: int = 150) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    n = max(1, int(minutes * 60 / seg_seconds))
+    words = max(1, int(wpm * seg_seconds / 60))
+    segs = [{"start": i * seg_seconds, "end": (i + 1) * seg_seconds,
+             "text": " ".join(rng.choice(_VOCAB) for _ in range(words)) + "."} for i in range(n)]
+    return {"text": " ".join(s["text"] for s in segs), "segments": segs,
+            "source": "synthetic", "lang": "es", "kind": "captions", "sep": " ", "meta": {}}
+
+def run_once(minutes: float, mode: str, args) -> Dict[str, Any]:
+    transcript = synthetic_transcript(minutes, seed=args.seed)
+    provider = FakeProvider(latency_s=args.latency_ms / 1000.0, latency_per_1k_s=args.latency_per_1k_ms / 1000.0,
+                            error_rate=args.rate_429, rpm=args.server_rpm, tpm=args.server_tpm,
+                            retry_delay_s=args.retry_delay_s, seed=args.seed, bad_json_rate=args.bad_json_rate,
+                            schema=not args.no_schema)
+    # cada corrida parte con buckets llenos y breakers cerrados, para que sean comparables
+    ratelimit._BUCKETS.clear()
+    retry._BREAKERS.clear()
+    for m in [args.model, *args.fallbacks]:
+        ratelimit.configure_bucket(m, rpm=args.rpm, tpm=args.tpm)
+
+    get_segments = pipeline.get_segments
+    pipeline.get_segments = lambda **kw: transcript
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_") as out_dir:
+            t0 = time.perf_counter()
+            res = pipeline.run_pipeline(
+                url="https://www.youtube.com/watch?v=benchbench0", out_dir=out_dir,
+                gemma_model=args.model, model_fallbacks=tuple(args.fallbacks),
+                window_minutes=args.window_minutes, overlap_minutes=args.overlap_minutes,
+                per_minute_token_budget=args.tpm, use_cache=False,
+                summary_mode=mode, provider=provider, window_mode=args.window_mode,
+            )
+            wall = time.perf_counter() - t0
+    finally:
+        pipeline.get_segments = get_segments
+    return {"minutes": minutes, "mode": mode, "wall_s": round(wall, 3),
+            "metrics": res["meta"]["metrics"], "provider": provider.stats()}
+
+def _row(r: Dict[str, Any]) -> str:
+    st = r["metrics"]["stages"]; c = r["metrics"]["counters"]
+    sec = lambda k: st.get(k, {}).get("seconds", 0.0)
+    return (f'{r["minutes"]:>6g} {r["mode"]:<10} {r["wall_s"]:>8.2f} {sec("windows"):>8.2f} {sec("overall"):>8.2f} '
+            f'{sec("generate"):>9.2f} {c.get("ratelimit_wait_seconds", 0):>8.2f} {c.get("retries", 0):>7} '
+            f'{c.get("early_fallbacks", 0) + c.get("breaker_skips", 0):>9} {c.get("llm_calls", 0):>6} '
+            f'{c.get("json_repaired", 0):>8} {c.get("json_parse_failures", 0):>8} '
+            f'{c.get("tokens_in", 0):>9} {c.get("tokens_out", 0):>8}')
+
+def main(argv: List[str] = None):
+    ap = argparse.ArgumentParser(description="Benchmark offline del pipeline con el proveedor fake.")
+    ap.add_argument("--minutes", type=float, nargs="+", default=[30, 60, 120, 240])
+    ap.add_argument("--mode", nargs="+", default=["sequential", "parallel"], choices=["sequential", "parallel"])
+    ap.add_argument("--model", default="gemma-3-12b-it")
+    ap.add_argument("--fallbacks", nargs="*", default=["gemma-3-4b-it"])
+    ap.add_argument("--window-minutes", type=int, default=20)
+    ap.add_argument("--overlap-minutes", type=int, default=5)
+    ap.add_argument("--window-mode", default="time", choices=["time", "budget", "topic"])
+    ap.add_argument("--rpm", type=float, default=600, help="límite local (rate limiter) por modelo")
+    ap.add_argument("--tpm", type=int, default=1_000_000, help="límite local y per_minute_token_budget")
+    ap.add_argument("--server-rpm", type=float, default=None, help="cuota simulada del fake (429 al excederla)")
+    ap.add_argument("--server-tpm", type=float, default=None)
+    ap.add_argument("--latency-ms", type=float, default=100)
+    ap.add_argument("--latency-per-1k-ms", type=float, default=20)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-delay-s", type=float, default=0.5)
+    ap.add_argument("--bad-json-rate", type=float, default=0.0, help="fracción de respuestas JSON mal formadas del fake")
+    ap.add_argument("--no-schema", action="store_true",
+                    help="el fake no admite schema (como Gemma): las respuestas pasan por la reparación de JSON")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="imprime los resultados completos en JSON")
+    args = ap.parse_args(argv)
+
+    results = [run_once(mins, mode, args) for mins in args.minutes for mode in args.mode]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(f'{"min":>6} {"mode":<10} {"wall_s":>8} {"windows":>8} {"overall":>8} {"generate":>9} '
+          f'{"rl_wait":>8} {"retries":>7} {"fallbacks":>9} {"calls":>6} {"repaired":>8} {"bad_json":>8} {"tok_in":>9} {"tok_out":>8}')
+    for r in results:
+        print(_row(r))
+
+if __name__ == "__main__":
+    main()
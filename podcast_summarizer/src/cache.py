@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from typing import Optional, Dict, Any
+import hashlib, json, os, threading
+
+class SummaryCache:
+    """
+    Cache en disco de respuestas del LLM, indexada por sha256(model + prompt ya rellenado).
+    Un .json por entrada. Lleva contadores de hits/misses para reportarlos en el resultado.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, prompt: str) -> str:
+        h = hashlib.sha256()
+        h.update(model.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, model: str, prompt: str) -> Optional[Any]:
+        path = self._path(self.key(model, prompt))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)["value"]
+        except Exception:
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, model: str, prompt: str, value: Any) -> None:
+        path = self._path(self.key(model, prompt))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"model": model, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp, path)  # escritura atómica
+        except Exception:
+            # la cache nunca debe romper el resumen
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
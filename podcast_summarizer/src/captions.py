@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 from typing import List, Tuple, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
 import re, json, pathlib
 
 try:
     # Nueva API
     from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
-    HAS_LIST = hasattr(YouTubeTranscriptApi, "list_transcripts")
+    HAS_LIST = hasattr(YouTubeTranscriptApi, "list_transcripts") or hasattr(YouTubeTranscriptApi, "list")
 except Exception:
     YouTubeTranscriptApi = None  # type: ignore
     HAS_LIST = False
@@ -37,42 +38,75 @@ def _normalize_segments(captions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         out.append({"id": i, "start": start, "end": end, "text": text})
     return out
 
-def get_youtube_captions(url_or_id: str, lang_priority: Tuple[str, ...] = ("es", "en")) -> Optional[Dict[str, Any]]:
+def _raw_snippets(fetched) -> List[Dict[str, Any]]:
+    # API >=1.0 devuelve FetchedTranscript; la antigua, lista de dicts
+    if hasattr(fetched, "to_raw_data"):
+        return fetched.to_raw_data()
+    return list(fetched)
+
+def _make_api(http_client=None):
+    """Instancia de YouTubeTranscriptApi (>=1.0 acepta http_client para reutilizar conexiones)."""
+    if YouTubeTranscriptApi is None:
+        return None
+    if http_client is not None:
+        try:
+            return YouTubeTranscriptApi(http_client=http_client)
+        except TypeError:
+            pass
+    return YouTubeTranscriptApi()
+
+def _list_transcripts(api, vid: str):
+    if hasattr(api, "list"):
+        return api.list(vid)
+    return api.list_transcripts(vid)
+
+def _rank_tracks(tr_list, lang_priority: Tuple[str, ...]) -> List[Tuple[Any, str]]:
+    """
+    Ordena las pistas usando solo la metadata de list_transcripts (sin fetch):
+    manual lang_priority -> auto lang_priority -> cualquier manual -> cualquier auto.
+    """
+    tracks = list(tr_list)
+    manual: Dict[str, Any] = {}
+    auto: Dict[str, Any] = {}
+    for t in tracks:
+        (auto if getattr(t, "is_generated", False) else manual).setdefault(t.language_code, t)
+    ranked: List[Tuple[Any, str]] = []
+    seen = set()
+    def add(t, kind):
+        if id(t) not in seen:
+            seen.add(id(t)); ranked.append((t, kind))
+    for lg in lang_priority:
+        if lg in manual: add(manual[lg], "manual")
+    for lg in lang_priority:
+        if lg in auto: add(auto[lg], "auto")
+    for t in tracks:
+        if not getattr(t, "is_generated", False): add(t, "manual")
+    for t in tracks:
+        if getattr(t, "is_generated", False): add(t, "auto")
+    return ranked
+
+def get_youtube_captions(url_or_id: str, lang_priority: Tuple[str, ...] = ("es", "en"), api=None) -> Optional[Dict[str, Any]]:
     """
     Devuelve dict unificado o None si no hay captions.
     Prioriza: manual lang_priority -> auto lang_priority -> cualquier manual -> cualquier auto.
+    La pista ganadora se decide con la metadata de list_transcripts y se hace un solo fetch
+    (solo si ese fetch falla se prueba la siguiente).
+    api: instancia de YouTubeTranscriptApi (o un stub con la misma interfaz) a reutilizar.
     """
-    if YouTubeTranscriptApi is None:
+    if YouTubeTranscriptApi is None and api is None:
         return None
     vid = extract_video_id(url_or_id)
+    api = api or _make_api()
     try:
-        if HAS_LIST:
-            tr_list = YouTubeTranscriptApi.list_transcripts(vid)
+        if HAS_LIST or hasattr(api, "list") or hasattr(api, "list_transcripts"):
+            tr_list = _list_transcripts(api, vid)
 
             segs = lang = kind = None
-            # manual prioritarios
-            for lg in lang_priority:
+            for t, k in _rank_tracks(tr_list, lang_priority):
                 try:
-                    t = tr_list.find_transcript([lg])
-                    segs = t.fetch(); lang = t.language_code; kind = "manual"; break
-                except Exception: pass
-            # auto prioritarios
-            if segs is None:
-                for lg in lang_priority:
-                    try:
-                        t = tr_list.find_generated_transcript([lg])
-                        segs = t.fetch(); lang = t.language_code; kind = "auto"; break
-                    except Exception: pass
-            # cualquier manual
-            if segs is None:
-                for t in tr_list:
-                    if not getattr(t, "is_generated", False):
-                        segs = t.fetch(); lang = t.language_code; kind = "manual"; break
-            # cualquier auto
-            if segs is None:
-                for t in tr_list:
-                    if getattr(t, "is_generated", False):
-                        segs = t.fetch(); lang = t.language_code; kind = "auto"; break
+                    segs = _raw_snippets(t.fetch()); lang = t.language_code; kind = k; break
+                except Exception:
+                    continue
 
             if segs is None:
                 return None
@@ -96,9 +130,57 @@ def get_youtube_captions(url_or_id: str, lang_priority: Tuple[str, ...] = ("es",
             "source": "captions",
             "lang": lang or lang_priority[0],
             "kind": kind or "manual",
+            "sep": " ",
             "meta": {"video_id": vid}
         }
     except (NoTranscriptFound, TranscriptsDisabled):
         return None
     except Exception:
         return None
+
+def _pooled_session(pool_size: int):
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+    except Exception:
+        return None
+    sess = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    return sess
+
+def get_youtube_captions_batch(
+    urls_or_ids: List[str],
+    lang_priority: Tuple[str, ...] = ("es", "en"),
+    max_workers: int = 8,
+    http_client=None,
+    api=None,
+) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Resuelve captions de muchos videos en paralelo, compartiendo una sesión HTTP con pool
+    de conexiones. Devuelve {video_id: resultado|None} (las entradas sin id válido quedan con su texto original).
+    http_client: requests.Session propia (p.ej. montada contra un servidor stub en tests).
+    api: instancia (o stub) de YouTubeTranscriptApi; tiene prioridad sobre http_client.
+    """
+    keys: List[str] = []
+    for u in urls_or_ids:
+        try:
+            k = extract_video_id(u)
+        except ValueError:
+            k = u
+        if k not in keys:
+            keys.append(k)
+    if api is None:
+        api = _make_api(http_client or _pooled_session(max_workers))
+    if api is None:
+        return {k: None for k in keys}
+
+    def one(k: str):
+        try:
+            return get_youtube_captions(k, lang_priority, api=api)
+        except ValueError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="captions") as pool:
+        return dict(zip(keys, pool.map(one, keys)))
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Optional
+from google import genai
+from google.genai import types
+import os, threading
+
+# Timeout HTTP de todas las llamadas a Google GenAI (ms). Las de ASR con audio largo tardan minutos.
+GENAI_TIMEOUT_MS = int(os.getenv("GENAI_TIMEOUT_MS", "600000"))
+
+_CLIENTS: Dict[str, genai.Client] = {}
+_LOCK = threading.Lock()
+
+def get_client(api_key: Optional[str] = None) -> genai.Client:
+    """
+    genai.Client compartido por API key (se crea la primera vez que se pide).
+    Reutiliza su pool de conexiones HTTP entre chunks, ventanas y peticiones; el cliente
+    es seguro de compartir entre hilos y su variante .aio entre tareas asyncio.
+    """
+    key = api_key or os.getenv("GOOGLE_API_KEY") or ""
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = genai.Client(
+                api_key=key or None,
+                http_options=types.HttpOptions(timeout=GENAI_TIMEOUT_MS),
+            )
+        return client
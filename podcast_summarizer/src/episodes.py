@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from typing import Optional, Dict, Any, List
+import json, os, threading, time
+
+class EpisodeStore:
+    """
+    Estado por episodio para el modo incremental (streams en vivo / premieres que siguen creciendo):
+    transcripción acumulada, resumen de cada ventana (por clave de contenido, ver
+    summarize._window_key), overall y texto final de la última actualización.
+    Un .json por episodio en root; si cambia la configuración de ventanas/modelo se descarta.
+    """
+    VERSION = 1
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, episode_id: str) -> str:
+        return os.path.join(self.root, f"{episode_id}.json")
+
+    def load(self, episode_id: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Estado guardado, o None si no hay o se generó con otra configuración."""
+        try:
+            with open(self._path(episode_id), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception:
+            return None
+        if state.get("version") != self.VERSION or state.get("config") != config:
+            return None
+        return state
+
+    def save(self, episode_id: str, state: Dict[str, Any]) -> None:
+        path = self._path(episode_id)
+        state = dict(state, version=self.VERSION, updated_at=time.time())
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp, path)  # escritura atómica
+
+
+def resume_point(state: Optional[Dict[str, Any]]) -> Optional[float]:
+    """
+    Desde qué segundo pedir contenido nuevo. Con captions, justo después del inicio del último
+    segmento (se solapan con el siguiente); con ASR, desde el final del último chunk transcrito.
+    """
+    segs = (state or {}).get("segments") or []
+    if not segs:
+        return None
+    last = segs[-1]
+    return last["start"] + 1e-3 if state.get("source") == "captions" else last["end"]
+
+def append_segments(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Transcripción acumulada: old + new (ordenados y renumerados)."""
+    merged = list(old) + sorted(new, key=lambda s: s["start"])
+    return [dict(s, id=i) for i, s in enumerate(merged)]
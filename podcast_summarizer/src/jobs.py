@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
+import copy, os, threading, time, traceback, uuid
+
+class JobManager:
+    """
+    Cola de trabajos en background sobre un pool de hilos acotado.
+    Cada job guarda: status (queued|running|done|error), progreso por etapa y resultado.
+    La función del job recibe un callback `progress(stage, **info)` para reportar avance.
+    """
+    def __init__(self, max_workers: Optional[int] = None, max_finished: int = 500):
+        self.max_workers = max_workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Any], **kwargs) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "progress": {},
+                "result": None,
+                "error": None,
+            }
+            self._evict_finished()
+        self._pool.submit(self._run, job_id, fn, kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    # --------- internos ---------
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(fields)
+
+    def _progress(self, job_id: str, stage: str, **info):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            st = job["progress"].setdefault(stage, {"status": "running", "started_at": time.time()})
+            st.update(info)
+            if st.get("status") == "done":
+                st.setdefault("finished_at", time.time())
+
+    def _run(self, job_id: str, fn: Callable[..., Any], kwargs: Dict[str, Any]):
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            result = fn(progress=lambda stage, **info: self._progress(job_id, stage, **info), **kwargs)
+            self._update(job_id, status="done", result=result, finished_at=time.time())
+        except Exception as e:
+            self._update(
+                job_id,
+                status="error",
+                error=f"{type(e).__name__}: {e}",
+                traceback=traceback.format_exc(limit=5),
+                finished_at=time.time(),
+            )
+
+    def _evict_finished(self):
+        # descarta los jobs terminados más antiguos para no crecer sin límite
+        finished = [j for j in self._jobs.values() if j["status"] in ("done", "error")]
+        if len(finished) <= self.max_finished:
+            return
+        finished.sort(key=lambda j: j["finished_at"] or 0)
+        for j in finished[: len(finished) - self.max_finished]:
+            self._jobs.pop(j["id"], None)
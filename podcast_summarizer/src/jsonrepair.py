@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from typing import Any, List, Optional, Tuple
+import json, re
+
+class JSONRepairError(RuntimeError):
+    """El texto no contiene JSON recuperable. No es ValueError a propósito: summarize usa
+    ValueError para 'prompt demasiado grande' y recorta/regenera."""
+
+
+_DANGLING_KEY = re.compile(r'([,{])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+_TRAILING_COMMA = re.compile(r",\s*$")
+_PARTIAL_LITERAL = re.compile(r"([:\[,])\s*(?:-|[0-9.eE+-]*[eE.+-]|t|tr|tru|f|fa|fal|fals|n|nu|nul)$")
+
+_MAX_STARTS = 16
+
+def _start(text: str) -> int:
+    i = [p for p in (text.find("{"), text.find("[")) if p != -1]
+    return min(i) if i else -1
+
+def _starts(text: str, expect: Optional[type]) -> List[int]:
+    # dónde puede empezar el JSON, en orden; si se espera un objeto, solo en "{"
+    # (la prosa de antes puede traer corchetes: "Nota [1]: ...")
+    opens = "{" if expect is dict else "[" if expect is list else "{["
+    return [i for i, ch in enumerate(text) if ch in opens][:_MAX_STARTS]
+
+def _closes_string(text: str, i: int) -> bool:
+    # una comilla cierra el string si lo que sigue (salvo espacios) es , : } ], el fence ``` o el final
+    j = i + 1
+    while j < len(text) and text[j] in " \t\r\n":
+        j += 1
+    return j >= len(text) or text[j] in ",:}]" or text.startswith("```", j)
+
+def repair_json(text: str, start: Optional[int] = None) -> Tuple[str, bool]:
+    """
+    Una pasada sobre el texto del modelo que devuelve (json_reparado, hubo_cambios):
+    ignora fences y prosa alrededor, escapa saltos de línea y comillas internas en strings,
+    quita comas colgantes y, si la respuesta se cortó, cierra el string y los {/[ abiertos
+    (descartando una clave sin valor). start: dónde empieza el JSON (por defecto el primer { o [).
+    Lanza JSONRepairError si no hay ni { ni [.
+    """
+    if start is None:
+        start = _start(text)
+    if start == -1:
+        raise JSONRepairError("No JSON object in model output.")
+    out: List[str] = []
+    stack: List[str] = []
+    in_str = esc = False
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+                out.append(ch)
+            elif ch == "\\":
+                esc = True
+                out.append(ch)
+            elif ch == '"':
+                if _closes_string(text, i):
+                    in_str = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch < " ":
+                out.append(" ")
+            else:
+                out.append(ch)
+        elif ch == '"':
+            in_str = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack and stack[-1] == ch:
+                stack.pop()
+                out.append(ch)
+            elif ch in stack:
+                # cierra lo que quedó abierto en medio
+                while stack[-1] != ch:
+                    out.append(stack.pop())
+                out.append(stack.pop())
+            if not stack:
+                break
+        elif ch == "`":
+            pass  # fence de cierre dentro de una respuesta cortada
+        else:
+            out.append(ch)
+        i += 1
+
+    repaired = "".join(out)
+    if stack or in_str:
+        # salida truncada
+        if in_str:
+            if esc:
+                repaired = repaired[:-1]
+            repaired += '"'
+        repaired = repaired.rstrip()
+        repaired = _PARTIAL_LITERAL.sub(r"\1", repaired)
+        if stack and stack[-1] == "}":
+            repaired = _DANGLING_KEY.sub(r"\1", repaired)
+        repaired = _TRAILING_COMMA.sub("", repaired)
+        repaired += "".join(reversed(stack))
+    return repaired, repaired != text.strip()
+
+def loads(text: str, expect: Optional[type] = None) -> Tuple[Any, bool]:
+    """
+    json.loads tolerante: (objeto, reparado). expect (dict o list): forma que debe tener el
+    resultado; si al reparar desde un inicio sale otra cosa, se prueba desde el siguiente.
+    Lanza JSONRepairError si ni reparando se puede.
+    """
+    try:
+        obj = json.loads(text)
+        if expect is None or isinstance(obj, expect):
+            return obj, False
+    except (TypeError, ValueError):
+        pass
+    text = text or ""
+    starts = _starts(text, expect)
+    if not starts:
+        raise JSONRepairError("No JSON object in model output.")
+    err = "wrong shape"
+    for start in starts:
+        repaired, _ = repair_json(text, start)
+        try:
+            obj = json.loads(repaired)
+        except ValueError as e:
+            err = str(e)
+            continue
+        if expect is None or isinstance(obj, expect):
+            return obj, True
+    raise JSONRepairError(f"Unrecoverable JSON in model output: {err}")
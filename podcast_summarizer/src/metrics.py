@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, Optional, Callable, Iterator, AsyncIterator
+import contextlib, contextvars, threading, time
+
+class Metrics:
+    """
+    Tiempos por etapa (segundos acumulados y número de veces) y contadores de una ejecución.
+    Las etapas que corren en paralelo (p.ej. ASR por chunk) suman tiempo de trabajo, no de reloj.
+    """
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            st = self.stages.setdefault(stage, {"seconds": 0.0, "count": 0})
+            st["seconds"] += seconds
+            st["count"] += 1
+
+    def add(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {k: {"seconds": round(v["seconds"], 4), "count": int(v["count"])} for k, v in self.stages.items()},
+                "counters": {k: (round(v, 4) if isinstance(v, float) else v) for k, v in self.counters.items()},
+            }
+
+
+# Totales del proceso (para /metrics) y la ejecución en curso (por contexto)
+_GLOBAL = Metrics()
+_CURRENT: contextvars.ContextVar[Optional[Metrics]] = contextvars.ContextVar("pipeline_metrics", default=None)
+
+def current() -> Optional[Metrics]:
+    return _CURRENT.get()
+
+def observe(stage: str, seconds: float):
+    _GLOBAL.observe(stage, seconds)
+    m = _CURRENT.get()
+    if m is not None:
+        m.observe(stage, seconds)
+
+def add(name: str, value: float = 1):
+    if not value:
+        return
+    _GLOBAL.add(name, value)
+    m = _CURRENT.get()
+    if m is not None:
+        m.add(name, value)
+
+@contextlib.contextmanager
+def timed(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - t0)
+
+@contextlib.contextmanager
+def use(m: Metrics):
+    """Registra en `m` todo lo medido dentro del bloque (y en los hilos lanzados con propagate)."""
+    token = _CURRENT.set(m)
+    try:
+        yield m
+    finally:
+        _CURRENT.reset(token)
+
+def iter_with(m: Metrics, gen: Iterator[Any]) -> Iterator[Any]:
+    """
+    Recorre un generador midiendo en `m` cada paso. Necesario porque entre yields el
+    generador puede reanudarse en otro contexto (p.ej. StreamingResponse usa un hilo por paso).
+    """
+    while True:
+        with use(m):
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+        yield item
+
+async def aiter_with(m: Metrics, agen: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """Como iter_with, para generadores async."""
+    while True:
+        with use(m):
+            try:
+                item = await agen.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+def propagate(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Envuelve fn para que, al correr en un ThreadPoolExecutor, mida en la ejecución actual."""
+    ctx = contextvars.copy_context()
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
+
+
+# ========= Exposición Prometheus =========
+def _name(s: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in s.lower())
+
+def render_prometheus(prefix: str = "podcast") -> str:
+    """Totales del proceso en formato de texto Prometheus (version 0.0.4)."""
+    snap = _GLOBAL.snapshot()
+    lines = [
+        f"# HELP {prefix}_stage_seconds_total Tiempo acumulado por etapa del pipeline.",
+        f"# TYPE {prefix}_stage_seconds_total counter",
+    ]
+    for stage, v in sorted(snap["stages"].items()):
+        lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {v["seconds"]}')
+    lines += [
+        f"# HELP {prefix}_stage_calls_total Veces que se ejecutó cada etapa.",
+        f"# TYPE {prefix}_stage_calls_total counter",
+    ]
+    for stage, v in sorted(snap["stages"].items()):
+        lines.append(f'{prefix}_stage_calls_total{{stage="{stage}"}} {v["count"]}')
+    for name, v in sorted(snap["counters"].items()):
+        metric = f"{prefix}_{_name(name)}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {v}"]
+    return "\n".join(lines) + "\n"
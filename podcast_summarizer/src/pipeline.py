@@ -1,12 +1,180 @@
 # -*- coding: utf-8 -*-
-from typing import Optional, Dict, Any, Tuple
-import os, pathlib, time
+from typing import Optional, Dict, Any, Tuple, Callable, Iterator, AsyncIterator
+import asyncio, contextlib, functools, inspect, os, pathlib, sqlite3, time
 
 from .captions import get_youtube_captions, extract_video_id
-from .youtube import youtube_to_mp3
-from .transcribe_gemini import transcribe_as_segments
-from .summarize import summarize_podcast_windows
+from .youtube import youtube_to_mp3, youtube_to_mp3_async
+from .transcribe_gemini import transcribe_as_segments, transcribe_as_segments_async, transcribe_stream_as_segments
+from .summarize import iter_summarize_podcast_windows, iter_summarize_podcast_windows_async
+from .cache import SummaryCache
+from .providers import Provider, get_provider, provider_name
+from .singleflight import SingleFlight
+from . import metrics
+from .workspace import Workspace, get_audio_cache
+from .audio import trim_audio, trim_audio_async
+from .episodes import EpisodeStore, resume_point, append_segments
+from .transcript import get_transcript_store, transcript_id
+from .search import SEARCH_INDEX, get_search_index
 
+def _stage(stage_limits: Optional[Dict[str, Any]], name: str):
+    # semáforo de la etapa (download | asr | summarize) o un contexto vacío
+    sem = (stage_limits or {}).get(name)
+    return sem if sem is not None else contextlib.nullcontext()
+
+@contextlib.asynccontextmanager
+async def _astage(stage_limits: Optional[Dict[str, Any]], name: str):
+    # como _stage; acepta asyncio.Semaphore o los threading.Semaphore de batch (adquiridos en un hilo)
+    sem = (stage_limits or {}).get(name)
+    if sem is None:
+        yield
+    elif isinstance(sem, asyncio.Semaphore):
+        async with sem:
+            yield
+    else:
+        await asyncio.to_thread(sem.acquire)
+        try:
+            yield
+        finally:
+            sem.release()
+
+def _require_key(provider: Provider, google_api_key: Optional[str]):
+    if provider.requires_key and not google_api_key:
+        raise ValueError("Falta GOOGLE_API_KEY para transcribir con Gemini.")
+
+# ========= Coalescencia de peticiones idénticas =========
+_SEGMENTS_FLIGHT = SingleFlight()
+_PIPELINE_FLIGHT = SingleFlight()
+# no cambian el resultado: quedan fuera de la clave
+_NOT_IN_KEY = ("google_api_key", "progress", "stage_limits", "provider", "use_cache")
+
+def _flight_key(params: Dict[str, Any]) -> Tuple:
+    p = {k: v for k, v in params.items() if k not in _NOT_IN_KEY}
+    url, audio_path = p.pop("url", None), p.pop("audio_path", None)
+    if audio_path:
+        source = "file:" + os.path.abspath(audio_path)
+    else:
+        try:
+            source = "yt:" + extract_video_id(url)
+        except ValueError:
+            source = url
+    provider = params.get("provider")
+    p["provider"] = provider.name if provider is not None else provider_name()
+    return (source, tuple(sorted((k, repr(v)) for k, v in p.items())))
+
+def _coalesced(flight: SingleFlight, on_shared: Optional[Callable[[Any], Any]] = None):
+    """
+    Single-flight por (video o audio, idioma, modelos, parámetros de ventana, ...): las llamadas
+    concurrentes idénticas esperan a la que ya está en curso y comparten su resultado
+    (progress recibe la etapa "coalesced"). on_shared transforma el resultado compartido.
+    """
+    def deco(fn):
+        sig = inspect.signature(fn)
+
+        def prepare(args, kwargs):
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = bound.arguments
+            progress = params.get("progress")
+            on_join = (lambda: progress("coalesced", status="running")) if progress else None
+            key = _flight_key(params) if params.get("url") or params.get("audio_path") else None
+            return key, progress, on_join
+
+        def finish(res, shared, progress):
+            if shared:
+                metrics.add("coalesced_requests")
+                if progress: progress("coalesced", status="done")
+                if on_shared:
+                    res = on_shared(res)
+            return res
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                key, progress, on_join = prepare(args, kwargs)
+                if key is None:
+                    return await fn(*args, **kwargs)
+                res, shared = await flight.do_async(key, lambda: fn(*args, **kwargs), on_join=on_join)
+                return finish(res, shared, progress)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key, progress, on_join = prepare(args, kwargs)
+            if key is None:
+                return fn(*args, **kwargs)
+            res, shared = flight.do(key, lambda: fn(*args, **kwargs), on_join=on_join)
+            return finish(res, shared, progress)
+        return wrapper
+    return deco
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """Ejecuciones en curso y llamadas esperándolas, por tipo (para /metrics)."""
+    return {"segments": _SEGMENTS_FLIGHT.in_flight(), "pipeline": _PIPELINE_FLIGHT.in_flight()}
+
+def _mark_coalesced(res: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(res, meta=dict(res.get("meta") or {}, coalesced=True))
+
+# ========= Índice de búsqueda =========
+def _index_segments(result: Dict[str, Any], p: Dict[str, Any]):
+    try:
+        with metrics.timed("search_index"):
+            get_search_index(p["out_dir"]).index(
+                transcript_id(result, _summary_basename(p["url"], p["audio_path"])), result,
+                url=p["url"], audio_path=p["audio_path"], since=p.get("since"))
+    except sqlite3.Error:
+        # el índice es un extra: si falla (disco lleno, base bloqueada) la transcripción sigue sirviendo
+        metrics.add("search_index_errors")
+
+def _indexed(fn):
+    """Agrega cada resultado de get_segments al índice de búsqueda (search.py) de out_dir; SEARCH_INDEX=0 lo apaga."""
+    sig = inspect.signature(fn)
+
+    def params(args, kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return bound.arguments
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def awrapper(*args, **kwargs):
+            res = await fn(*args, **kwargs)
+            if SEARCH_INDEX:
+                await asyncio.to_thread(metrics.propagate(_index_segments), res, params(args, kwargs))
+            return res
+        return awrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        res = fn(*args, **kwargs)
+        if SEARCH_INDEX:
+            _index_segments(res, params(args, kwargs))
+        return res
+    return wrapper
+
+# ========= Desde un segundo dado (modo incremental) =========
+def _captions_since(caps: Dict[str, Any], since: Optional[float]) -> Dict[str, Any]:
+    # la pista de captions llega completa: se quedan los segmentos nuevos
+    if not since:
+        return caps
+    segs = [s for s in caps["segments"] if s["start"] >= since]
+    return dict(caps, segments=segs, text=(caps.get("sep") or " ").join(s["text"] for s in segs), meta=dict(caps.get("meta") or {}, since=since))
+
+def _shift_segments(asr: Dict[str, Any], since: Optional[float]) -> Dict[str, Any]:
+    # el ASR de la cola empieza en 0: tiempos absolutos del episodio
+    if not since:
+        return asr
+    segs = [dict(s, start=s["start"] + since, end=s["end"] + since) for s in asr["segments"]]
+    return dict(asr, segments=segs, meta=dict(asr.get("meta") or {}, since=since))
+
+def _audio_name(url: str, since: Optional[float]) -> Optional[str]:
+    try:
+        name = f"yt_{extract_video_id(url)}"
+    except ValueError:
+        return None
+    return f"{name}_from{int(since)}" if since else name
+
+@_coalesced(_SEGMENTS_FLIGHT)
+@_indexed
 def get_segments(
     url: Optional[str] = None,
     audio_path: Optional[str] = None,
@@ -15,35 +183,386 @@ def get_segments(
     out_dir: str = "/outputs",
     gemini_model: str = "gemini-1.5-flash",
     window_minutes: int = 20,
-    prefer_captions: bool = True
+    prefer_captions: bool = True,
+    progress: Optional[Callable[..., None]] = None,
+    stage_limits: Optional[Dict[str, Any]] = None,
+    stream_audio: bool = False,
+    asr_preprocess: bool = True,
+    provider: Optional[Provider] = None,
+    since: Optional[float] = None
 ) -> Dict[str, Any]:
     """
-    Devuelve dict unificado {text, segments, source, lang, kind, meta}
+    Devuelve dict unificado {text, segments, source, lang, kind, sep, meta}; text son los segmentos unidos por sep
+    progress: callback opcional progress(stage, **info) para reportar avance por etapa.
+    stage_limits: semáforos opcionales {"download", "asr", "summarize"} compartidos entre
+      ejecuciones concurrentes (ver batch.run_batch).
+    stream_audio: para URLs sin captions, descarga y trocea en streaming (yt-dlp | ffmpeg) y
+      transcribe cada chunk mientras sigue la descarga, sin MP3 intermedio en out_dir.
+    asr_preprocess: chunks mono 16 kHz cortados en silencios y sin pausas largas (ver audio.plan_chunks).
+    provider: proveedor de ASR (providers.Provider); por defecto get_provider(google_api_key), según LLM_PROVIDER.
+    since: solo el contenido desde ese segundo (modo incremental, tiempos absolutos). Las captions se
+      filtran; del audio se descarga (yt-dlp --download-sections) o recorta solo la cola y se
+      transcribe eso. Con since, stream_audio no aplica.
     """
     if not url and not audio_path:
         raise ValueError("Debes proporcionar url de YouTube o audio_path (.mp3).")
 
     # 1) Captions (gratis)
     if url and prefer_captions:
-        caps = get_youtube_captions(url, (lang, "en"))
-        if caps and caps.get("segments"):
-            return caps
+        if progress: progress("captions", status="running")
+        with metrics.timed("captions"):
+            caps = get_youtube_captions(url, (lang, "en"))
+        found = bool(caps and caps.get("segments"))
+        if progress: progress("captions", status="done", found=found)
+        if found:
+            return _captions_since(caps, since)
 
     # 2) Fallback Gemini ASR
+    provider = provider or get_provider(google_api_key)
+    if not audio_path and stream_audio and not since:
+        _require_key(provider, google_api_key)
+        with _stage(stage_limits, "download"), _stage(stage_limits, "asr"):
+            return transcribe_stream_as_segments(
+                url=url,
+                api_key=google_api_key,
+                lang=lang,
+                model=gemini_model,
+                window_minutes=window_minutes,
+                progress=progress,
+                provider=provider
+            )
+
+    audio_cache = None
     if not audio_path:
-        audio_path = youtube_to_mp3(url, out_dir=out_dir)
-    if not google_api_key:
-        raise ValueError("Falta GOOGLE_API_KEY para transcribir con Gemini.")
+        # MP3 descargados en out_dir/audio, con cuota global (AUDIO_CACHE_MAX_BYTES) y desalojo LRU
+        audio_cache = get_audio_cache(os.path.join(out_dir, "audio"))
+        name = _audio_name(url, since)
+        # con since el stream puede haber crecido desde la última descarga: no se reutiliza
+        audio_path = audio_cache.lookup(f"{name}.mp3") if name and not since else None
+        if audio_path is None:
+            with _stage(stage_limits, "download"):
+                if progress: progress("download", status="running")
+                with metrics.timed("download"):
+                    audio_path = youtube_to_mp3(url, out_dir=audio_cache.root, title_hint=name, start_s=since)
+                metrics.add("download_bytes", os.path.getsize(audio_path))
+                if progress: progress("download", status="done")
+    _require_key(provider, google_api_key)
+
+    pin = audio_cache.pin(audio_path) if audio_cache else contextlib.nullcontext()
+    # audio local con since: se transcribe solo la cola, recortada a un temporal
+    tail = Workspace(prefix="tail_") if since and audio_cache is None else contextlib.nullcontext()
+    with pin, _stage(stage_limits, "asr"), tail as ws:
+        if ws:
+            audio_path = trim_audio(audio_path, since, os.path.join(ws.path, "tail.mp3"))
+        asr = transcribe_as_segments(
+            mp3_path=audio_path,
+            api_key=google_api_key,
+            lang=lang,
+            model=gemini_model,
+            window_minutes=window_minutes,
+            progress=progress,
+            preprocess=asr_preprocess,
+            provider=provider
+        )
+    if audio_cache:
+        audio_cache.enforce()
+    return _shift_segments(asr, since)
+
+def _summary_basename(url: Optional[str], audio_path: Optional[str]) -> str:
+    if audio_path:
+        return os.path.splitext(os.path.basename(audio_path))[0]
+    if url:
+        try:
+            vid = extract_video_id(url)
+            return f"yt_{vid}"
+        except Exception:
+            return f"yt_{int(time.time())}"
+    return f"summary_{int(time.time())}"
+
+def save_transcript(segments_result: Dict[str, Any], url: Optional[str] = None, audio_path: Optional[str] = None,
+                    out_dir: str = "/outputs") -> str:
+    """
+    Guarda la transcripción en formato compacto (transcript.CompactTranscript) en out_dir/.transcripts
+    y devuelve su transcript_id, para consultarla luego por páginas o rango de tiempo.
+    """
+    tid = transcript_id(segments_result, _summary_basename(url, audio_path))
+    get_transcript_store(os.path.join(out_dir, ".transcripts")).put(tid, segments_result)
+    return tid
+
+def _segments_args(p: Dict[str, Any], since: Optional[float] = None) -> Dict[str, Any]:
+    return dict(
+        url=p["url"],
+        audio_path=p["audio_path"],
+        lang=p["lang"],
+        google_api_key=p["google_api_key"],
+        out_dir=p["out_dir"],
+        gemini_model=p["gemini_model"],
+        window_minutes=p["window_minutes"],
+        prefer_captions=True,
+        progress=p["progress"],
+        stage_limits=p["stage_limits"],
+        stream_audio=p["stream_audio"],
+        asr_preprocess=p["asr_preprocess"],
+        provider=p["provider"],
+        since=since
+    )
 
-    asr = transcribe_as_segments(
-        mp3_path=audio_path,
-        api_key=google_api_key,
-        lang=lang,
-        model=gemini_model,
-        window_minutes=window_minutes
+def _segments_event(segments_result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "segments",
+        "source": segments_result.get("source"),
+        "lang": segments_result.get("lang"),
+        "kind": segments_result.get("kind"),
+        "n_segments": len(segments_result.get("segments") or []),
+    }
+
+def _summarize_args(p: Dict[str, Any], segments_result: Dict[str, Any], cache: Optional[SummaryCache],
+                    known_windows: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    return dict(
+        result=segments_result,
+        key_google=p["google_api_key"],
+        lang=p["lang"],
+        model=p["gemma_model"],
+        window_minutes=p["window_minutes"],
+        overlap_minutes=p["overlap_minutes"],
+        per_window_max_chars=p["per_window_max_chars"],
+        per_minute_token_budget=p["per_minute_token_budget"],
+        model_fallbacks=p["model_fallbacks"],
+        prompts_dir=p["prompts_dir"],
+        cache=cache,
+        progress=p["progress"],
+        mode=p["summary_mode"],
+        context=p["summary_context"],
+        coherence_pass=p["coherence_pass"],
+        reduce_group_size=p["reduce_group_size"],
+        window_tokens=p["window_tokens"],
+        overlap_tokens=p["overlap_tokens"],
+        window_mode=p["window_mode"],
+        provider=p["provider"],
+        known_windows=known_windows
     )
-    return asr
 
+def _save_summary(out: Dict[str, Any], final: Dict[str, Any], p: Dict[str, Any],
+                  cache: Optional[SummaryCache]) -> Dict[str, Any]:
+    """Guarda el .txt y completa el resultado con el resumen."""
+    final_text, per_window, overall = final["final_text"], final["per_window"], final["overall"]
+    base_name = _summary_basename(p["url"], p["audio_path"])
+    txt_path = os.path.join(p["out_dir"], f"{base_name}_summary.txt")
+    with open(txt_path, "w", encoding="utf-8") as f:
+        f.write(final_text)
+    if p["progress"]: p["progress"]("save", status="done", path=txt_path)
+
+    out.update({
+        "final_text": final_text,
+        "per_window": per_window,
+        "overall": overall,
+        "summary_path": txt_path,
+        "meta": {"cache": cache.stats() if cache else None}
+    })
+    return out
+
+# ========= Modo incremental =========
+class _Incremental:
+    """Estado de un episodio que crece (stream en vivo / premiere) durante una ejecución incremental."""
+    def __init__(self, p: Dict[str, Any]):
+        self.store = EpisodeStore(os.path.join(p["out_dir"], ".episodes"))
+        self.episode_id = _summary_basename(p["url"], p["audio_path"])
+        # lo que cambia las ventanas o sus resúmenes; con otra configuración se empieza de cero
+        self.config = {
+            "lang": p["lang"], "gemma_model": p["gemma_model"], "model_fallbacks": list(p["model_fallbacks"] or ()),
+            "window_minutes": p["window_minutes"], "overlap_minutes": p["overlap_minutes"],
+            "window_tokens": p["window_tokens"], "overlap_tokens": p["overlap_tokens"],
+            "window_mode": p["window_mode"], "summary_mode": p["summary_mode"],
+            "per_window_max_chars": p["per_window_max_chars"],
+            "per_minute_token_budget": p["per_minute_token_budget"],
+            "summary_context": p["summary_context"], "prompts_dir": p["prompts_dir"],
+        }
+        self.state = self.store.load(self.episode_id, self.config) or {}
+        self.since = resume_point(self.state)
+        self.new_segments = 0
+
+    def merge(self, new_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Transcripción acumulada = guardada + lo nuevo desde `since`."""
+        self.new_segments = len(new_result.get("segments") or [])
+        if not self.state.get("segments"):
+            return new_result
+        segs = append_segments(self.state["segments"], new_result.get("segments") or [])
+        meta = dict(new_result.get("meta") or {}, since=self.since)
+        sep = new_result.get("sep") or " "
+        return dict(new_result, segments=segs, text=sep.join(s["text"] for s in segs), meta=meta)
+
+    def unchanged(self) -> bool:
+        return self.new_segments == 0 and bool(self.state.get("final_text"))
+
+    def known_windows(self) -> Dict[str, Dict[str, Any]]:
+        return self.state.get("windows") or {}
+
+    def meta(self, reused: int) -> Dict[str, Any]:
+        return {"since": self.since, "new_segments": self.new_segments, "windows_reused": reused}
+
+    def stored_result(self, out: Dict[str, Any], p: Dict[str, Any]) -> Dict[str, Any]:
+        """Sin contenido nuevo: el resumen de la última actualización, sin llamar al LLM."""
+        st = self.state
+        txt_path = os.path.join(p["out_dir"], f"{self.episode_id}_summary.txt")
+        if not os.path.exists(txt_path):
+            with open(txt_path, "w", encoding="utf-8") as f:
+                f.write(st["final_text"])
+        out.update({
+            "final_text": st["final_text"],
+            "per_window": st.get("per_window") or [],
+            "overall": st.get("overall", ""),
+            "summary_path": txt_path,
+            "meta": {"cache": None, "incremental": self.meta(len(st.get("per_window") or []))},
+        })
+        return out
+
+    def save(self, segments_result: Dict[str, Any], final: Dict[str, Any], out: Dict[str, Any]):
+        old = self.known_windows()
+        self.store.save(self.episode_id, {
+            "config": self.config,
+            "kind": segments_result.get("kind"),
+            "source": segments_result.get("source"),
+            "lang": segments_result.get("lang"),
+            "segments": segments_result.get("segments") or [],
+            "windows": dict(zip(final["window_keys"], final["per_window"])),
+            "per_window": final["per_window"],
+            "overall": final["overall"],
+            "final_text": final["final_text"],
+        })
+        out["meta"]["incremental"] = self.meta(sum(k in old for k in final["window_keys"]))
+
+# ========= Pasos de iter_pipeline (comunes a sync y async) =========
+class _PipelineRun:
+    """Todo iter_pipeline salvo get_segments y el resumen, que la versión sync y la async llaman a su manera."""
+    def __init__(self, p: Dict[str, Any]):
+        self.p = p
+        pathlib.Path(p["out_dir"]).mkdir(parents=True, exist_ok=True)
+        self.inc = _Incremental(p) if p["incremental"] else None
+        self.segments_result: Dict[str, Any] = {}
+        self.out: Dict[str, Any] = {}
+        self.cache: Optional[SummaryCache] = None
+        self.final: Optional[Dict[str, Any]] = None
+
+    def segments_args(self) -> Dict[str, Any]:
+        return _segments_args(self.p, self.inc.since if self.inc else None)
+
+    def segments(self, segments_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Registra la transcripción (acumulada en modo incremental) y devuelve el evento "segments"."""
+        if self.inc:
+            segments_result = self.inc.merge(segments_result)
+        self.segments_result = segments_result
+        self.out = {"segments_result": segments_result}
+        return _segments_event(segments_result)
+
+    def early_result(self) -> Optional[Dict[str, Any]]:
+        """El evento "result" si no hay nada que resumir (do_summary=False o episodio sin cambios)."""
+        if not self.p["do_summary"]:
+            return {"type": "result", "result": self.out}
+        if self.inc and self.inc.unchanged():
+            return {"type": "result", "result": self.inc.stored_result(self.out, self.p)}
+        return None
+
+    def summarize_args(self) -> Dict[str, Any]:
+        if self.p["use_cache"]:
+            self.cache = SummaryCache(os.path.join(self.p["out_dir"], ".cache", "summaries"))
+        return _summarize_args(self.p, self.segments_result, self.cache,
+                               self.inc.known_windows() if self.inc else None)
+
+    def summary_event(self, ev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # el evento "final" queda para el resultado; el resto se reemite
+        if ev["type"] == "final":
+            self.final = ev
+            return None
+        return ev
+
+    def result(self) -> Dict[str, Any]:
+        out = _save_summary(self.out, self.final, self.p, self.cache)
+        if self.inc:
+            self.inc.save(self.segments_result, self.final, out)
+        return {"type": "result", "result": out}
+
+def _with_metrics(gen_fn):
+    """Mide cada ejecución del generador (sync o async) y agrega result["meta"]["metrics"] al evento final."""
+    def attach(ev, m, t0):
+        if ev["type"] == "result":
+            with metrics.use(m):
+                metrics.observe("total", time.perf_counter() - t0)
+                metrics.add("pipeline_runs")
+            ev["result"].setdefault("meta", {})["metrics"] = m.snapshot()
+        return ev
+
+    if inspect.isasyncgenfunction(gen_fn):
+        @functools.wraps(gen_fn)
+        async def awrapper(*args, **kwargs):
+            m = metrics.Metrics()
+            t0 = time.perf_counter()
+            async for ev in metrics.aiter_with(m, gen_fn(*args, **kwargs)):
+                yield attach(ev, m, t0)
+        return awrapper
+
+    @functools.wraps(gen_fn)
+    def wrapper(*args, **kwargs):
+        m = metrics.Metrics()
+        t0 = time.perf_counter()
+        for ev in metrics.iter_with(m, gen_fn(*args, **kwargs)):
+            yield attach(ev, m, t0)
+    return wrapper
+
+@_with_metrics
+def iter_pipeline(
+    url: Optional[str] = None,
+    audio_path: Optional[str] = None,
+    lang: str = "es",
+    google_api_key: Optional[str] = None,
+    out_dir: str = "/outputs",
+    gemini_model: str = "gemini-1.5-flash",
+    gemma_model: str = "gemma-3-12b-it",
+    window_minutes: int = 20,
+    overlap_minutes: int = 5,
+    per_window_max_chars: int = 6000,
+    per_minute_token_budget: int = 12000,
+    model_fallbacks: Tuple[str, ...] = ("gemma-3-4b-it",),
+    prompts_dir: Optional[str] = None,
+    do_summary: bool = True,
+    use_cache: bool = True,
+    progress: Optional[Callable[..., None]] = None,
+    summary_mode: str = "sequential",
+    summary_context: str = "none",
+    coherence_pass: bool = False,
+    reduce_group_size: int = 6,
+    window_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    window_mode: str = "time",
+    stage_limits: Optional[Dict[str, Any]] = None,
+    stream_audio: bool = False,
+    asr_preprocess: bool = True,
+    provider: Optional[Provider] = None,
+    incremental: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Versión generadora de run_pipeline. Emite:
+      {"type": "segments", "source", "lang", "kind", "n_segments"}
+      {"type": "window", ...} / {"type": "overall", ...}   (ver iter_summarize_podcast_windows)
+      {"type": "result", "result": {...}}                  (lo mismo que devuelve run_pipeline)
+    result["meta"]["metrics"] trae tiempos por etapa ({stage: {seconds, count}}) y contadores
+    (bytes descargados, chunks, llamadas/tokens al LLM, reintentos, segundos esperando rate limit).
+    """
+    run = _PipelineRun(dict(locals()))
+    yield run.segments(get_segments(**run.segments_args()))
+    early = run.early_result()
+    if early:
+        yield early
+        return
+
+    # Resumen
+    with _stage(stage_limits, "summarize"):
+        for ev in iter_summarize_podcast_windows(**run.summarize_args()):
+            ev = run.summary_event(ev)
+            if ev:
+                yield ev
+    yield run.result()
+
+@_coalesced(_PIPELINE_FLIGHT, on_shared=_mark_coalesced)
 def run_pipeline(
     url: Optional[str] = None,
     audio_path: Optional[str] = None,
@@ -53,66 +572,213 @@ def run_pipeline(
     gemini_model: str = "gemini-1.5-flash",
     gemma_model: str = "gemma-3-12b-it",
     window_minutes: int = 20,
+    overlap_minutes: int = 5,
     per_window_max_chars: int = 6000,
     per_minute_token_budget: int = 12000,
     model_fallbacks: Tuple[str, ...] = ("gemma-3-4b-it",),
     prompts_dir: Optional[str] = None,
     do_summary: bool = True,
+    use_cache: bool = True,
+    progress: Optional[Callable[..., None]] = None,
+    summary_mode: str = "sequential",
+    summary_context: str = "none",
+    coherence_pass: bool = False,
+    reduce_group_size: int = 6,
+    window_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    window_mode: str = "time",
+    stage_limits: Optional[Dict[str, Any]] = None,
+    stream_audio: bool = False,
+    asr_preprocess: bool = True,
+    provider: Optional[Provider] = None,
+    incremental: bool = False,
 ) -> Dict[str, Any]:
     """
     Orquesta todo. Si do_summary=True, genera .txt en out_dir y devuelve paths.
+    use_cache=True reutiliza resúmenes por ventana/overall guardados en out_dir/.cache/summaries.
+    summary_mode="parallel" resume todas las ventanas a la vez (summary_context: "none" | "draft").
+    provider: proveedor de ASR/LLM; con LLM_PROVIDER=fake (o un providers.FakeProvider) corre offline.
+    Llamadas concurrentes con los mismos parámetros comparten una sola ejecución (meta.coalesced=True
+    en las que esperaron); lo mismo get_segments, así que descarga y ASR tampoco se duplican.
+    incremental=True (streams en vivo / premieres que siguen creciendo): guarda el estado del episodio en
+    out_dir/.episodes y en la siguiente llamada solo baja/transcribe lo nuevo y solo resume las ventanas
+    que cambiaron (normalmente la última, que estaba incompleta, y las nuevas). Si no hay nada nuevo
+    devuelve el resumen anterior sin llamar al LLM. meta.incremental = {since, new_segments, windows_reused}.
     """
-    pathlib.Path(out_dir).mkdir(parents=True, exist_ok=True)
-
-    segments_result = get_segments(
-        url=url,
-        audio_path=audio_path,
-        lang=lang,
-        google_api_key=google_api_key,
-        out_dir=out_dir,
-        gemini_model=gemini_model,
-        window_minutes=window_minutes,
-        prefer_captions=True
-    )
+    kwargs = dict(locals())
+    out = None
+    for ev in iter_pipeline(**kwargs):
+        if ev["type"] == "result":
+            out = ev["result"]
+    return out
 
-    out: Dict[str, Any] = {"segments_result": segments_result}
 
-    if not do_summary:
-        return out
+# ========= Async (asyncio) =========
+@_coalesced(_SEGMENTS_FLIGHT)
+@_indexed
+async def get_segments_async(
+    url: Optional[str] = None,
+    audio_path: Optional[str] = None,
+    lang: str = "es",
+    google_api_key: Optional[str] = None,
+    out_dir: str = "/outputs",
+    gemini_model: str = "gemini-1.5-flash",
+    window_minutes: int = 20,
+    prefer_captions: bool = True,
+    progress: Optional[Callable[..., None]] = None,
+    stage_limits: Optional[Dict[str, Any]] = None,
+    stream_audio: bool = False,
+    asr_preprocess: bool = True,
+    provider: Optional[Provider] = None,
+    since: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Versión async de get_segments (mismos parámetros y resultado). Descarga, ffmpeg y ASR no
+    bloquean el loop; captions (librería sync) y la ingesta en streaming corren en asyncio.to_thread.
+    Comparte la coalescencia con get_segments: una llamada sync y una async idénticas se unen.
+    """
+    if not url and not audio_path:
+        raise ValueError("Debes proporcionar url de YouTube o audio_path (.mp3).")
 
-    # Resumen
-    final_text, per_window, overall = summarize_podcast_windows(
-        result=segments_result,
-        key_google=google_api_key,
-        lang=lang,
-        model=gemma_model,
-        window_minutes=window_minutes,
-        per_window_max_chars=per_window_max_chars,
-        per_minute_token_budget=per_minute_token_budget,
-        model_fallbacks=model_fallbacks,
-        prompts_dir=prompts_dir
-    )
-    # Guardar .txt
-    base_name = None
-    if audio_path:
-        base_name = os.path.splitext(os.path.basename(audio_path))[0]
-    elif url:
-        try:
-            vid = extract_video_id(url)
-            base_name = f"yt_{vid}"
-        except Exception:
-            base_name = f"yt_{int(time.time())}"
-    else:
-        base_name = f"summary_{int(time.time())}"
+    if url and prefer_captions:
+        if progress: progress("captions", status="running")
+        with metrics.timed("captions"):
+            caps = await asyncio.to_thread(metrics.propagate(get_youtube_captions), url, (lang, "en"))
+        found = bool(caps and caps.get("segments"))
+        if progress: progress("captions", status="done", found=found)
+        if found:
+            return _captions_since(caps, since)
 
-    txt_path = os.path.join(out_dir, f"{base_name}_summary.txt")
-    with open(txt_path, "w", encoding="utf-8") as f:
-        f.write(final_text)
+    provider = provider or get_provider(google_api_key)
+    if not audio_path and stream_audio and not since:
+        _require_key(provider, google_api_key)
+        async with _astage(stage_limits, "download"), _astage(stage_limits, "asr"):
+            return await asyncio.to_thread(metrics.propagate(transcribe_stream_as_segments),
+                url=url,
+                api_key=google_api_key,
+                lang=lang,
+                model=gemini_model,
+                window_minutes=window_minutes,
+                progress=progress,
+                provider=provider
+            )
 
-    out.update({
-        "final_text": final_text,
-        "per_window": per_window,
-        "overall": overall,
-        "summary_path": txt_path
-    })
+    audio_cache = None
+    if not audio_path:
+        audio_cache = get_audio_cache(os.path.join(out_dir, "audio"))
+        name = _audio_name(url, since)
+        audio_path = audio_cache.lookup(f"{name}.mp3") if name and not since else None
+        if audio_path is None:
+            async with _astage(stage_limits, "download"):
+                if progress: progress("download", status="running")
+                with metrics.timed("download"):
+                    audio_path = await youtube_to_mp3_async(url, out_dir=audio_cache.root, title_hint=name,
+                                                            start_s=since)
+                metrics.add("download_bytes", os.path.getsize(audio_path))
+                if progress: progress("download", status="done")
+    _require_key(provider, google_api_key)
+
+    pin = audio_cache.pin(audio_path) if audio_cache else contextlib.nullcontext()
+    tail = Workspace(prefix="tail_") if since and audio_cache is None else contextlib.nullcontext()
+    with pin, tail as ws:
+        async with _astage(stage_limits, "asr"):
+            if ws:
+                audio_path = await trim_audio_async(audio_path, since, os.path.join(ws.path, "tail.mp3"))
+            asr = await transcribe_as_segments_async(
+                mp3_path=audio_path,
+                api_key=google_api_key,
+                lang=lang,
+                model=gemini_model,
+                window_minutes=window_minutes,
+                progress=progress,
+                preprocess=asr_preprocess,
+                provider=provider
+            )
+    if audio_cache:
+        audio_cache.enforce()
+    return _shift_segments(asr, since)
+
+@_with_metrics
+async def iter_pipeline_async(
+    url: Optional[str] = None,
+    audio_path: Optional[str] = None,
+    lang: str = "es",
+    google_api_key: Optional[str] = None,
+    out_dir: str = "/outputs",
+    gemini_model: str = "gemini-1.5-flash",
+    gemma_model: str = "gemma-3-12b-it",
+    window_minutes: int = 20,
+    overlap_minutes: int = 5,
+    per_window_max_chars: int = 6000,
+    per_minute_token_budget: int = 12000,
+    model_fallbacks: Tuple[str, ...] = ("gemma-3-4b-it",),
+    prompts_dir: Optional[str] = None,
+    do_summary: bool = True,
+    use_cache: bool = True,
+    progress: Optional[Callable[..., None]] = None,
+    summary_mode: str = "sequential",
+    summary_context: str = "none",
+    coherence_pass: bool = False,
+    reduce_group_size: int = 6,
+    window_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    window_mode: str = "time",
+    stage_limits: Optional[Dict[str, Any]] = None,
+    stream_audio: bool = False,
+    asr_preprocess: bool = True,
+    provider: Optional[Provider] = None,
+    incremental: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Versión async de iter_pipeline (mismos eventos y parámetros)."""
+    run = _PipelineRun(dict(locals()))
+    yield run.segments(await get_segments_async(**run.segments_args()))
+    early = run.early_result()
+    if early:
+        yield early
+        return
+
+    async with _astage(stage_limits, "summarize"):
+        async for ev in iter_summarize_podcast_windows_async(**run.summarize_args()):
+            ev = run.summary_event(ev)
+            if ev:
+                yield ev
+    yield run.result()
+
+@_coalesced(_PIPELINE_FLIGHT, on_shared=_mark_coalesced)
+async def run_pipeline_async(
+    url: Optional[str] = None,
+    audio_path: Optional[str] = None,
+    lang: str = "es",
+    google_api_key: Optional[str] = None,
+    out_dir: str = "/outputs",
+    gemini_model: str = "gemini-1.5-flash",
+    gemma_model: str = "gemma-3-12b-it",
+    window_minutes: int = 20,
+    overlap_minutes: int = 5,
+    per_window_max_chars: int = 6000,
+    per_minute_token_budget: int = 12000,
+    model_fallbacks: Tuple[str, ...] = ("gemma-3-4b-it",),
+    prompts_dir: Optional[str] = None,
+    do_summary: bool = True,
+    use_cache: bool = True,
+    progress: Optional[Callable[..., None]] = None,
+    summary_mode: str = "sequential",
+    summary_context: str = "none",
+    coherence_pass: bool = False,
+    reduce_group_size: int = 6,
+    window_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    window_mode: str = "time",
+    stage_limits: Optional[Dict[str, Any]] = None,
+    stream_audio: bool = False,
+    asr_preprocess: bool = True,
+    provider: Optional[Provider] = None,
+    incremental: bool = False,
+) -> Dict[str, Any]:
+    """Versión async de run_pipeline: cientos de ejecuciones concurrentes en un solo hilo del loop."""
+    kwargs = dict(locals())
+    out = None
+    async for ev in iter_pipeline_async(**kwargs):
+        if ev["type"] == "result":
+            out = ev["result"]
     return out
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from typing import List, Optional
+import asyncio, subprocess
+
+async def run_async(cmd: List[str], capture: Optional[str] = None) -> str:
+    """
+    Ejecuta cmd con asyncio.create_subprocess_exec (sin bloquear el loop ni ocupar un hilo).
+    capture: "stdout" | "stderr" | None -> devuelve ese stream como texto; el resto va a DEVNULL.
+    Lanza subprocess.CalledProcessError si el código de salida no es 0. Si la tarea se
+    cancela, el proceso se mata.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE if capture == "stdout" else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE if capture == "stderr" else asyncio.subprocess.DEVNULL,
+    )
+    try:
+        out, err = await proc.communicate()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    text = (out if capture == "stdout" else err) or b""
+    text = text.decode("utf-8", "replace")
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=text if capture == "stderr" else None)
+    return text
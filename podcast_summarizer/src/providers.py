@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, Optional, Tuple
+from collections import deque
+from types import SimpleNamespace
+import asyncio, hashlib, json, math, os, random, threading, time
+
+from .clients import get_client
+
+class Provider:
+    """
+    Interfaz mínima que usan transcripción y resumen:
+      generate(model, contents, schema)    -> respuesta con .text y .usage_metadata
+                                              (schema: salida JSON estructurada si supports_schema(model))
+      count_tokens(model, contents)        -> int
+      transcribe(file_path, prompt, model) -> texto
+    y sus variantes async (agenerate, acount_tokens, atranscribe). Por defecto las async
+    corren la versión bloqueante en un hilo; los proveedores reales las implementan nativas.
+    """
+    name = "base"
+    requires_key = False
+
+    def supports_schema(self, model: str) -> bool:
+        return False
+
+    def generate(self, model: str, contents, schema: Optional[Dict[str, Any]] = None):
+        raise NotImplementedError
+
+    def count_tokens(self, model: str, contents) -> int:
+        raise NotImplementedError
+
+    def transcribe(self, file_path: str, prompt: str, model: str) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, model: str, contents, schema: Optional[Dict[str, Any]] = None):
+        return await asyncio.to_thread(self.generate, model, contents, schema)
+
+    async def acount_tokens(self, model: str, contents) -> int:
+        return await asyncio.to_thread(self.count_tokens, model, contents)
+
+    async def atranscribe(self, file_path: str, prompt: str, model: str) -> str:
+        return await asyncio.to_thread(self.transcribe, file_path, prompt, model)
+
+
+class GeminiProvider(Provider):
+    """Google GenAI (cliente compartido de clients.get_client, creado recién al primer uso)."""
+    name = "gemini"
+    requires_key = True
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key
+
+    @property
+    def client(self):
+        return get_client(self.api_key)
+
+    def supports_schema(self, model: str) -> bool:
+        # los Gemma servidos por la API no aceptan JSON mode (response_mime_type)
+        return not model.startswith("gemma")
+
+    @staticmethod
+    def _config(schema: Optional[Dict[str, Any]]):
+        if not schema:
+            return None
+        return {"response_mime_type": "application/json", "response_schema": schema}
+
+    def generate(self, model: str, contents, schema: Optional[Dict[str, Any]] = None):
+        return self.client.models.generate_content(model=model, contents=contents, config=self._config(schema))
+
+    def count_tokens(self, model: str, contents) -> int:
+        return int(self.client.models.count_tokens(model=model, contents=contents).total_tokens)
+
+    def transcribe(self, file_path: str, prompt: str, model: str) -> str:
+        client = self.client
+        file_obj = client.files.upload(file=file_path)
+        try:
+            resp = client.models.generate_content(
+                model=model,
+                contents=[
+                    {"role":"user","parts":[{"text":prompt}]},
+                    {"role":"user","parts":[{"file_data":{"file_uri":file_obj.uri,"mime_type":file_obj.mime_type}}]}
+                ]
+            )
+            return (resp.text or "").strip()
+        finally:
+            # el archivo subido ya no sirve: no dejarlo ocupando la cuota de Files API
+            try:
+                client.files.delete(name=file_obj.name)
+            except Exception:
+                pass
+
+    # --------- async (client.aio: sin un hilo por llamada) ---------
+    async def agenerate(self, model: str, contents, schema: Optional[Dict[str, Any]] = None):
+        return await self.client.aio.models.generate_content(model=model, contents=contents,
+                                                             config=self._config(schema))
+
+    async def acount_tokens(self, model: str, contents) -> int:
+        return int((await self.client.aio.models.count_tokens(model=model, contents=contents)).total_tokens)
+
+    async def atranscribe(self, file_path: str, prompt: str, model: str) -> str:
+        aio = self.client.aio
+        file_obj = await aio.files.upload(file=file_path)
+        try:
+            resp = await aio.models.generate_content(
+                model=model,
+                contents=[
+                    {"role":"user","parts":[{"text":prompt}]},
+                    {"role":"user","parts":[{"file_data":{"file_uri":file_obj.uri,"mime_type":file_obj.mime_type}}]}
+                ]
+            )
+            return (resp.text or "").strip()
+        finally:
+            try:
+                await aio.files.delete(name=file_obj.name)
+            except Exception:
+                pass
+
+
+# ========= Fake local (benchmarks / pruebas de carga sin cuota) =========
+class FakeRateLimitError(Exception):
+    """429 con la misma forma que google.genai.errors.ClientError (code, status, message, details)."""
+    def __init__(self, retry_delay_s: float, reason: str):
+        self.code = 429
+        self.status = "RESOURCE_EXHAUSTED"
+        self.message = f"Resource has been exhausted ({reason})."
+        self.details = {"error": {
+            "code": 429,
+            "status": self.status,
+            "message": self.message,
+            "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_delay_s:g}s"}],
+        }}
+        super().__init__(f"429 {self.status}. {self.message}")
+
+
+_WORDS = ("modelo datos mercado producto equipo cliente escala costo riesgo agente "
+          "inferencia latencia empresa usuario plataforma estrategia ventas código nube chip").split()
+
+class FakeProvider(Provider):
+    """
+    Proveedor determinista y offline. Para una misma entrada (y seed) devuelve siempre lo mismo.
+      latency_s / latency_per_1k_s: demora simulada por llamada (+ por cada 1000 tokens de prompt)
+      error_rate: fracción de llamadas que fallan con 429 (secuencia fija por seed)
+      rpm / tpm: cuota simulada del "servidor" por modelo en ventana de 60 s; excederla da 429
+      bad_json_rate: fracción de respuestas JSON mal formadas (fences, prosa, coma colgante o cortadas)
+        cuando no se pide schema; con schema siempre responde JSON válido, como el modo estructurado
+      schema: False simula un modelo sin salida estructurada (como Gemma): nunca se le pide schema,
+        así que con bad_json_rate toda respuesta JSON pasa por la reparación
+      retry_delay_s: retryDelay de los 429 inyectados; los de cuota informan, como la API, cuánto
+        falta para que la ventana libere lo necesario
+    Respuestas: JSON {"summary","bullets"} si el prompt pide ese formato (ventanas), {"windows": []} para la
+    revisión de coherencia y texto plano para el resto. Los tokens se cuentan como len/4 y se
+    informan en usage_metadata; stats() acumula el consumo.
+    """
+    name = "fake"
+    requires_key = False
+
+    def __init__(self, latency_s: float = 0.0, latency_per_1k_s: float = 0.0, error_rate: float = 0.0,
+                 rpm: Optional[float] = None, tpm: Optional[float] = None, retry_delay_s: float = 1.0,
+                 output_tokens: int = 200, seed: int = 0, bad_json_rate: float = 0.0, schema: bool = True):
+        self.latency_s = latency_s
+        self.latency_per_1k_s = latency_per_1k_s
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.tpm = tpm
+        self.retry_delay_s = retry_delay_s
+        self.output_tokens = output_tokens
+        self.seed = seed
+        self.bad_json_rate = bad_json_rate
+        self.schema = schema
+        self._rng = random.Random(seed)
+        self._json_rng = random.Random(seed + 1)
+        self._windows: Dict[str, deque] = {}  # por modelo: (ts, tokens) aceptados en los últimos 60 s
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "transcribe_calls": 0, "count_calls": 0, "rate_limited": 0,
+                       "prompt_tokens": 0, "output_tokens": 0, "structured_calls": 0, "bad_json": 0, "oversized": 0}
+        self._per_model: Dict[str, Dict[str, int]] = {}
+
+    # --------- helpers ---------
+    @staticmethod
+    def _tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    @staticmethod
+    def _as_text(contents) -> str:
+        if isinstance(contents, str):
+            return contents
+        return json.dumps(contents, ensure_ascii=False, sort_keys=True, default=str)
+
+    def _words(self, key: str, n: int) -> str:
+        h = int(hashlib.sha256(f"{self.seed}:{key}".encode("utf-8")).hexdigest()[:16], 16)
+        rng = random.Random(h)
+        return " ".join(rng.choice(_WORDS) for _ in range(max(1, n)))
+
+    def _admit(self, model: str, tokens: int):
+        """Cuenta la llamada y decide si se rechaza con 429 (inyectado o por cuota simulada)."""
+        with self._lock:
+            now = time.monotonic()
+            window = self._windows.setdefault(model, deque())
+            while window and now - window[0][0] >= 60.0:
+                window.popleft()
+            m = self._per_model.setdefault(model, {"calls": 0, "rate_limited": 0, "prompt_tokens": 0})
+            if self.tpm and tokens > self.tpm:
+                # ni con la ventana vacía cabe: no es reintentable, igual que en ratelimit.TokenBucket
+                self._stats["oversized"] += 1
+                raise ValueError(f"Prompt too large for per-minute budget (~{tokens} tokens). Truncate input.")
+            reason, delay = None, self.retry_delay_s
+            if self.error_rate and self._rng.random() < self.error_rate:
+                reason = "injected"
+            elif self.rpm and len(window) + 1 > self.rpm:
+                reason = "rpm"
+                delay = 60.0 - (now - window[int(len(window) - self.rpm)][0])
+            elif self.tpm and sum(t for _, t in window) + tokens > self.tpm:
+                reason = "tpm"
+                excess = sum(t for _, t in window) + tokens - self.tpm
+                for ts, t in window:
+                    excess -= t
+                    if excess <= 0:
+                        break
+                delay = 60.0 - (now - ts)
+            if reason:
+                self._stats["rate_limited"] += 1
+                m["rate_limited"] += 1
+                raise FakeRateLimitError(math.ceil(delay * 10) / 10.0, reason)
+            window.append((now, tokens))
+            self._stats["prompt_tokens"] += tokens
+            m["calls"] += 1
+            m["prompt_tokens"] += tokens
+
+    def _malformed(self, text: str) -> str:
+        """Estropea un JSON como suelen hacerlo los modelos sin modo estructurado."""
+        with self._lock:
+            if not self.bad_json_rate or self._json_rng.random() >= self.bad_json_rate:
+                return text
+            self._stats["bad_json"] += 1
+            kind = self._json_rng.randrange(4)
+        if kind == 0:
+            return f"Aquí está el resultado:\n```json\n{text}\n```"
+        if kind == 1:
+            return text[:-2] + "],\n}"
+        if kind == 2:
+            # prosa con corchetes antes del objeto
+            return f"Nota [1]: resumen del fragmento [{self._words(text, 2)}].\n{text}"
+        return text[: int(len(text) * 0.8)]
+
+    def supports_schema(self, model: str) -> bool:
+        return self.schema
+
+    def _delay(self, tokens: int) -> float:
+        return max(0.0, self.latency_s + self.latency_per_1k_s * tokens / 1000.0)
+
+    def _response(self, text: str, prompt_tokens: int):
+        out = self._tokens(text)
+        with self._lock:
+            self._stats["output_tokens"] += out
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=out,
+                                total_token_count=prompt_tokens + out)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _generate(self, model: str, contents, schema: Optional[Dict[str, Any]] = None):
+        """Respuesta y demora simulada (la espera la hace la versión sync o async)."""
+        prompt = self._as_text(contents)
+        tokens = self._tokens(prompt)
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["structured_calls"] += int(bool(schema))
+        self._admit(model, tokens)
+        props = (schema or {}).get("properties") or {}
+        if "windows" in props or (not schema and '"windows"' in prompt):
+            text = json.dumps({"windows": []})
+        elif "summary" in props or (not schema and '"summary"' in prompt):
+            n = max(3, self.output_tokens * 3 // 4)
+            text = json.dumps({
+                "summary": self._words(prompt, n),
+                "bullets": [self._words(f"{prompt}#{i}", 6) for i in range(3)],
+            }, ensure_ascii=False)
+            if not schema:
+                text = self._malformed(text)
+        else:
+            text = self._words(prompt, max(3, self.output_tokens * 3 // 4))
+        return self._response(text, tokens), self._delay(tokens)
+
+    def count_tokens(self, model: str, contents) -> int:
+        with self._lock:
+            self._stats["count_calls"] += 1
+        return self._tokens(self._as_text(contents))
+
+    def _transcribe(self, file_path: str, prompt: str, model: str):
+        """~2.5 palabras por segundo de audio, estimando la duración por tamaño (32 kbps)."""
+        size = os.path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            digest = hashlib.sha256(f.read(1 << 16)).hexdigest()
+        seconds = size / 4000.0
+        tokens = self._tokens(prompt) + int(seconds * 32)  # ~32 tokens/s de audio, como Gemini
+        with self._lock:
+            self._stats["transcribe_calls"] += 1
+        self._admit(model, tokens)
+        text = self._words(digest, int(seconds * 2.5))
+        with self._lock:
+            self._stats["output_tokens"] += self._tokens(text)
+        return text, self._delay(tokens)
+
+    # --------- interfaz ---------
+    def generate(self, model: str, contents, schema: Optional[Dict[str, Any]] = None):
+        resp, delay = self._generate(model, contents, schema)
+        time.sleep(delay)
+        return resp
+
+    def transcribe(self, file_path: str, prompt: str, model: str) -> str:
+        text, delay = self._transcribe(file_path, prompt, model)
+        time.sleep(delay)
+        return text
+
+    async def agenerate(self, model: str, contents, schema: Optional[Dict[str, Any]] = None):
+        resp, delay = self._generate(model, contents, schema)
+        await asyncio.sleep(delay)
+        return resp
+
+    async def acount_tokens(self, model: str, contents) -> int:
+        return self.count_tokens(model, contents)
+
+    async def atranscribe(self, file_path: str, prompt: str, model: str) -> str:
+        text, delay = self._transcribe(file_path, prompt, model)
+        await asyncio.sleep(delay)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, per_model={m: dict(v) for m, v in self._per_model.items()})
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True si la excepción es un 429 / RESOURCE_EXHAUSTED (de Google GenAI o del fake)."""
+    msg = getattr(exc, "message", "") or str(exc)
+    return getattr(exc, "code", None) == 429 or "RESOURCE_EXHAUSTED" in (msg or "")
+
+
+# ========= Registro =========
+_PROVIDERS: Dict[Tuple[str, str], Provider] = {}
+_PROVIDERS_LOCK = threading.Lock()
+
+def _fake_from_env() -> FakeProvider:
+    env = lambda k, d: os.getenv(k) or d
+    return FakeProvider(
+        latency_s=float(env("FAKE_LATENCY_MS", "0")) / 1000.0,
+        latency_per_1k_s=float(env("FAKE_LATENCY_PER_1K_MS", "0")) / 1000.0,
+        error_rate=float(env("FAKE_429_RATE", "0")),
+        rpm=float(env("FAKE_RPM", "0")) or None,
+        tpm=float(env("FAKE_TPM", "0")) or None,
+        retry_delay_s=float(env("FAKE_RETRY_DELAY_S", "1")),
+        output_tokens=int(env("FAKE_OUTPUT_TOKENS", "200")),
+        seed=int(env("FAKE_SEED", "0")),
+        bad_json_rate=float(env("FAKE_BAD_JSON_RATE", "0")),
+        schema=env("FAKE_SCHEMA", "1") != "0",
+    )
+
+def provider_name(name: Optional[str] = None) -> str:
+    return (name or os.getenv("LLM_PROVIDER") or "gemini").lower()
+
+def get_provider(api_key: Optional[str] = None, name: Optional[str] = None) -> Provider:
+    """
+    Proveedor compartido del proceso. name (o LLM_PROVIDER): "gemini" (default) o "fake".
+    El fake se configura con FAKE_LATENCY_MS, FAKE_LATENCY_PER_1K_MS, FAKE_429_RATE,
+    FAKE_RPM, FAKE_TPM, FAKE_RETRY_DELAY_S, FAKE_OUTPUT_TOKENS, FAKE_BAD_JSON_RATE, FAKE_SCHEMA y FAKE_SEED.
+    """
+    name = provider_name(name)
+    if name not in ("gemini", "fake"):
+        raise ValueError(f"Proveedor desconocido: {name}")
+    key = (name, (api_key or "") if name == "gemini" else "")
+    with _PROVIDERS_LOCK:
+        p = _PROVIDERS.get(key)
+        if p is None:
+            p = _PROVIDERS[key] = GeminiProvider(api_key) if name == "gemini" else _fake_from_env()
+        return p
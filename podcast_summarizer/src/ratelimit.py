@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Optional
+import asyncio, os, threading, time
+
+DEFAULT_RPM = int(os.getenv("LLM_RPM", "30"))
+DEFAULT_TPM = int(os.getenv("LLM_TPM", "15000"))
+
+class TokenBucket:
+    """
+    Rate limiter de doble cubeta (requests/min y tokens/min) con recarga continua.
+    reserve() descuenta de inmediato (puede dejar saldo negativo = deuda) y devuelve
+    cuántos segundos debe esperar el llamador; así los que llegan después quedan en cola
+    detrás, sin que nadie duerma con el lock tomado. Sirve igual para hilos y asyncio.
+    """
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self._req = self.rpm
+        self._tok = self.tpm
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        dt = now - self._ts
+        self._ts = now
+        self._req = min(self.rpm, self._req + dt * self.rpm / 60.0)
+        self._tok = min(self.tpm, self._tok + dt * self.tpm / 60.0)
+
+    def configure(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        with self._lock:
+            self._refill(time.monotonic())
+            if rpm:
+                self.rpm = float(rpm); self._req = min(self._req, self.rpm)
+            if tpm:
+                self.tpm = float(tpm); self._tok = min(self._tok, self.tpm)
+
+    def reserve(self, tokens: int) -> float:
+        if tokens > self.tpm:
+            raise ValueError(f"Prompt too large for per-minute budget (~{tokens} tokens). Truncate input.")
+        with self._lock:
+            self._refill(time.monotonic())
+            self._req -= 1
+            self._tok -= tokens
+            return max(0.0, -self._req * 60.0 / self.rpm, -self._tok * 60.0 / self.tpm)
+
+    def refund(self, tokens: int):
+        """Devuelve (o cobra, si es negativo) tokens al corregir una estimación."""
+        with self._lock:
+            self._tok = min(self.tpm, self._tok + tokens)
+
+    def acquire(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+# ========= Registro global por modelo =========
+_BUCKETS: Dict[str, TokenBucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+
+def get_bucket(model: str) -> TokenBucket:
+    """
+    Devuelve el bucket compartido del proceso para `model` (lo crea con LLM_RPM / LLM_TPM si no existe).
+    Las peticiones no cambian sus límites: eso queda para configure_bucket.
+    """
+    with _BUCKETS_LOCK:
+        b = _BUCKETS.get(model)
+        if b is None:
+            b = _BUCKETS[model] = TokenBucket(DEFAULT_RPM, DEFAULT_TPM)
+        return b
+
+def configure_bucket(model: str, rpm: Optional[float] = None, tpm: Optional[float] = None) -> TokenBucket:
+    """Fija los límites del bucket de `model` (al arrancar, p.ej. bench.py); si no, rigen LLM_RPM / LLM_TPM."""
+    b = get_bucket(model)
+    b.configure(rpm=rpm, tpm=tpm)
+    return b
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict, List, Optional
+import os, random, re, threading, time
+
+from .providers import is_rate_limited
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_S = float(os.getenv("RETRY_BASE_S", "1"))
+RETRY_MAX_S = float(os.getenv("RETRY_MAX_S", "30"))
+RETRY_FALLBACK_AFTER_S = float(os.getenv("RETRY_FALLBACK_AFTER_S", "5"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN_S", "20"))
+
+_TRANSIENT_CODES = (500, 502, 503, 504)
+
+
+class CircuitOpenError(RuntimeError):
+    """El breaker del modelo está abierto: conviene pasar al siguiente modelo sin llamar."""
+    def __init__(self, model: str, retry_in: float):
+        self.model = model
+        self.retry_in = retry_in
+        super().__init__(f"Circuit open for {model} (retry in {retry_in:.1f}s).")
+
+
+# ========= RetryInfo =========
+_DURATION_RE = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*(ms|s|m)?\s*$")
+_RETRY_DELAY_RE = re.compile(r"""retryDelay['"]?\s*[:=]\s*['"]?([0-9]*\.?[0-9]+)\s*s""")
+
+def parse_duration(value: Any) -> Optional[float]:
+    """Duración de protobuf en segundos: "1.5s", "500ms", 12, {"seconds": 1, "nanos": 5e8}. None si no se entiende."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        try:
+            return float(value.get("seconds", 0)) + float(value.get("nanos", 0)) / 1e9
+        except (TypeError, ValueError):
+            return None
+    if isinstance(value, str):
+        m = _DURATION_RE.match(value)
+        if m:
+            n, unit = float(m.group(1)), m.group(2) or "s"
+            return n / 1000.0 if unit == "ms" else n * 60.0 if unit == "m" else n
+    return None
+
+def _error_details(exc: BaseException) -> List[Any]:
+    # google.genai.errors.APIError.details es el JSON de la respuesta: {"error": {..., "details": [...]}}
+    d = getattr(exc, "details", None)
+    if isinstance(d, dict):
+        d = (d.get("error") or {}).get("details", d.get("details"))
+    return d if isinstance(d, list) else []
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Segundos que pide el servidor (google.rpc.RetryInfo.retryDelay), o None si no lo indica."""
+    for d in _error_details(exc):
+        if isinstance(d, dict) and str(d.get("@type", "")).endswith("RetryInfo"):
+            secs = parse_duration(d.get("retryDelay"))
+            if secs is not None:
+                return secs
+    m = _RETRY_DELAY_RE.search(getattr(exc, "message", "") or str(exc))
+    return float(m.group(1)) if m else None
+
+def is_transient(exc: BaseException) -> bool:
+    """429 o 5xx: vale la pena reintentar (o pasar a otro modelo)."""
+    return is_rate_limited(exc) or getattr(exc, "code", None) in _TRANSIENT_CODES
+
+
+# ========= Política de reintento =========
+class RetryPolicy:
+    """
+    Backoff exponencial con full jitter: espera ~ U(0, min(max_s, base_s * 2**intento)).
+    Si el servidor manda retryDelay, ese es el mínimo (más hasta base_s de jitter, para que
+    los que recibieron el mismo 429 no vuelvan todos juntos).
+    fallback_after_s: si hay otro modelo disponible y la espera sería mayor, no se duerme:
+    se pasa al fallback de inmediato.
+    """
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_s: float = RETRY_BASE_S,
+                 max_s: float = RETRY_MAX_S, fallback_after_s: float = RETRY_FALLBACK_AFTER_S,
+                 rng: Optional[random.Random] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_s = base_s
+        self.max_s = max_s
+        self.fallback_after_s = fallback_after_s
+        self._rng = rng or random.Random()
+
+    def backoff(self, attempt: int, server_delay: Optional[float] = None) -> float:
+        if server_delay is not None:
+            return server_delay + self._rng.uniform(0, self.base_s)
+        return self._rng.uniform(0, min(self.max_s, self.base_s * (2 ** attempt)))
+
+_DEFAULT_POLICY = RetryPolicy()
+
+def default_policy() -> RetryPolicy:
+    return _DEFAULT_POLICY
+
+
+# ========= Circuit breaker por modelo =========
+class CircuitBreaker:
+    """
+    closed -> open tras `failures` errores transitorios seguidos; open dura max(cooldown_s, retryDelay).
+    Al vencer pasa a half-open: deja pasar una sola llamada de prueba; si sale bien se cierra,
+    si falla vuelve a abrirse.
+    """
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown_s: float = BREAKER_COOLDOWN_S):
+        self.failures = max(1, failures)
+        self.cooldown_s = cooldown_s
+        self._count = 0
+        self._open_until = 0.0
+        self._probing = False
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._count < self.failures:
+            return "closed"
+        return "open" if now < self._open_until or self._probing else "half_open"
+
+    def retry_in(self) -> float:
+        """Segundos hasta que se podría volver a llamar (0 si ya se puede)."""
+        with self._lock:
+            now = time.monotonic()
+            st = self._state(now)
+            if st == "closed" or st == "half_open":
+                return 0.0
+            return max(self._open_until - now, 0.0) or self.cooldown_s / 10.0
+
+    def admit(self) -> Optional[bool]:
+        """
+        None si el breaker está abierto (no llamar); False si está cerrado; True si está en
+        half-open y esta llamada queda reservada como la prueba (liberarla con success/failure/release).
+        """
+        with self._lock:
+            st = self._state(time.monotonic())
+            if st == "open":
+                return None
+            if st == "half_open":
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._count = 0
+            self._probing = False
+
+    def failure(self, server_delay: Optional[float] = None) -> bool:
+        """Registra un error transitorio; True si con esto el breaker pasó de cerrado a abierto."""
+        with self._lock:
+            was_closed = self._count < self.failures
+            self._count += 1
+            self._probing = False
+            if self._count < self.failures:
+                return False
+            self._open_until = time.monotonic() + max(self.cooldown_s, server_delay or 0.0)
+            if was_closed:
+                self.opened += 1
+            return was_closed
+
+    def release(self):
+        """Libera la prueba de half-open si la llamada terminó sin veredicto (p.ej. otro error)."""
+        with self._lock:
+            self._probing = False
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+def get_breaker(model: str) -> CircuitBreaker:
+    """Breaker compartido del proceso para `model` (lo crea si no existe)."""
+    with _BREAKERS_LOCK:
+        b = _BREAKERS.get(model)
+        if b is None:
+            b = _BREAKERS[model] = CircuitBreaker()
+        return b
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """Estado de cada breaker (para /metrics)."""
+    with _BREAKERS_LOCK:
+        items = list(_BREAKERS.items())
+    return {m: {"state": b.state(), "opened": b.opened} for m, b in items}
+
+def order_models(models: List[str]) -> List[str]:
+    """Modelos con breaker abierto al final (el que se reabre antes, último), sin alterar el orden del resto."""
+    ready = [m for m in models if get_breaker(m).retry_in() == 0]
+    blocked = sorted((m for m in models if m not in ready), key=lambda m: -get_breaker(m).retry_in())
+    return ready + blocked
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, List, Optional
+import contextlib, os, re, sqlite3, threading, time
+
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "1") not in ("0", "false", "no")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodes (
+    episode_id TEXT PRIMARY KEY,
+    video_id TEXT, url TEXT, audio_path TEXT,
+    source TEXT, lang TEXT, kind TEXT,
+    n_segments INTEGER, duration REAL, updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    episode_id TEXT NOT NULL, seg_id INTEGER, start REAL, "end" REAL, text TEXT
+);
+CREATE INDEX IF NOT EXISTS segments_episode ON segments (episode_id, start);
+-- índice FTS5 sobre segments.text (external content: el texto no se guarda dos veces)
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content = 'segments', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+_TERM_RE = re.compile(r"\w+\*?")
+
+
+def fts_query(q: str) -> str:
+    """
+    Consulta de usuario -> MATCH de FTS5: cada palabra entre comillas (todas deben aparecer),
+    "frase exacta" se respeta y palabra* busca por prefijo. Sin operadores sueltos que rompan la sintaxis.
+    """
+    parts: List[str] = []
+    for i, chunk in enumerate((q or "").split('"')):
+        if i % 2:
+            words = _TERM_RE.findall(chunk)
+            if words:
+                parts.append('"' + " ".join(w.rstrip("*") for w in words) + '"')
+        else:
+            for w in _TERM_RE.findall(chunk):
+                parts.append(f'"{w[:-1]}"*' if w.endswith("*") else f'"{w}"')
+    if not parts:
+        raise ValueError("Empty search query.")
+    return " ".join(parts)
+
+
+class SearchIndex:
+    """
+    Índice invertido (SQLite FTS5) de todos los segmentos transcritos: término -> (episodio,
+    segmento, start/end). Un solo archivo; acentos y mayúsculas no importan en la búsqueda.
+    Se alimenta desde get_segments (ver pipeline) y se consulta con search.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ready = False
+
+    @contextlib.contextmanager
+    def _conn(self):
+        # una conexión por operación: se usa desde hilos del pool y desde asyncio.to_thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                self._ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def index(self, episode_id: str, result: Dict[str, Any], url: Optional[str] = None,
+              audio_path: Optional[str] = None, since: Optional[float] = None) -> int:
+        """
+        (Re)indexa los segmentos de un resultado de get_segments. Reemplaza lo que hubiera del
+        episodio; con since (modo incremental) solo lo que empieza en since o después.
+        Devuelve cuántos segmentos se indexaron.
+        """
+        segs = result.get("segments") or []
+        meta = result.get("meta") or {}
+        with self._lock, self._conn() as conn:
+            if since:
+                conn.execute("DELETE FROM segments WHERE episode_id = ? AND start >= ?", (episode_id, since))
+            else:
+                conn.execute("DELETE FROM segments WHERE episode_id = ?", (episode_id,))
+            # seg_id = posición en la transcripción completa (la misma que en /transcripts/{id}/segments)
+            base = conn.execute("SELECT count(*) FROM segments WHERE episode_id = ?", (episode_id,)).fetchone()[0]
+            rows = [(s.get("text") or "", episode_id, base + i, float(s["start"]), float(s["end"]))
+                    for i, s in enumerate(segs)]
+            conn.executemany('INSERT INTO segments (text, episode_id, seg_id, start, "end") VALUES (?, ?, ?, ?, ?)',
+                             rows)
+            n, duration = conn.execute(
+                'SELECT count(*), max("end") FROM segments WHERE episode_id = ?', (episode_id,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO episodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (episode_id, meta.get("video_id"), url, audio_path, result.get("source"),
+                 result.get("lang"), result.get("kind"), n, duration or 0.0, time.time()))
+        return len(rows)
+
+    def search(self, q: str, limit: int = 20, offset: int = 0, episode_id: Optional[str] = None,
+               lang: Optional[str] = None, start: Optional[float] = None,
+               end: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Segmentos que contienen la consulta, del más relevante (bm25) al menos:
+          {query, offset, limit, next_offset, hits: [{episode_id, video_id, url, start, end, snippet, score}]}
+        episode_id / lang filtran episodios; start/end (segundos) limitan a ese tramo de cada episodio.
+        """
+        where, args = ["segments_fts MATCH ?"], [fts_query(q)]
+        if episode_id:
+            where.append("s.episode_id = ?"); args.append(episode_id)
+        if lang:
+            where.append("e.lang = ?"); args.append(lang)
+        if start is not None:
+            where.append('s."end" > ?'); args.append(start)
+        if end is not None:
+            where.append("s.start < ?"); args.append(end)
+        sql = f"""
+            SELECT s.episode_id, e.video_id, e.url, e.audio_path, s.seg_id, s.start, s."end",
+                   snippet(segments_fts, 0, '[', ']', '…', 16), bm25(segments_fts)
+            FROM segments_fts
+            JOIN segments s ON s.id = segments_fts.rowid
+            LEFT JOIN episodes e ON e.episode_id = s.episode_id
+            WHERE {" AND ".join(where)}
+            ORDER BY bm25(segments_fts), s.episode_id, s.start
+            LIMIT ? OFFSET ?"""
+        with self._conn() as conn:
+            rows = conn.execute(sql, args + [limit + 1, offset]).fetchall()
+        hits = [{
+            "episode_id": r[0], "video_id": r[1], "url": r[2], "audio_path": r[3],
+            "segment_id": r[4], "start": r[5], "end": r[6], "snippet": r[7], "score": round(-r[8], 4),
+        } for r in rows[:limit]]
+        return {"query": q, "offset": offset, "limit": limit,
+                "next_offset": offset + limit if len(rows) > limit else None, "hits": hits}
+
+    def episodes(self) -> List[Dict[str, Any]]:
+        cols = ("episode_id", "video_id", "url", "audio_path", "source", "lang", "kind",
+                "n_segments", "duration", "updated_at")
+        with self._conn() as conn:
+            rows = conn.execute(f"SELECT {', '.join(cols)} FROM episodes ORDER BY updated_at DESC").fetchall()
+        return [dict(zip(cols, r)) for r in rows]
+
+
+_INDEXES: Dict[str, SearchIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+def get_search_index(out_dir: str) -> SearchIndex:
+    """Índice compartido del proceso para out_dir (archivo out_dir/.search/index.sqlite)."""
+    root = os.path.join(os.path.abspath(out_dir), ".search")
+    with _INDEXES_LOCK:
+        idx = _INDEXES.get(root)
+        if idx is None:
+            os.makedirs(root, exist_ok=True)
+            idx = _INDEXES[root] = SearchIndex(os.path.join(root, "index.sqlite"))
+        return idx
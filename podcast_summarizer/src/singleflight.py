@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, Awaitable, Callable, Hashable, Optional, Tuple
+from concurrent.futures import Future
+import asyncio, threading
+
+class _Call:
+    def __init__(self):
+        self.future: Future = Future()
+        self.dups = 0
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas idénticas concurrentes: la primera con una clave ejecuta fn y
+    las que llegan mientras corre esperan y reciben el mismo resultado (o la misma excepción).
+    No es un cache: al terminar se olvida la clave y la siguiente llamada vuelve a ejecutar.
+    Llamadas sync (do) y async (do_async) con la misma clave comparten la misma ejecución.
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> Tuple[_Call, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                return call, True
+            call.dups += 1
+            return call, False
+
+    def _finish(self, key: Hashable, call: _Call, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            call.future.set_exception(error)
+        else:
+            call.future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any],
+           on_join: Optional[Callable[[], None]] = None) -> Tuple[Any, bool]:
+        """
+        Devuelve (resultado, shared); shared=True si se reutilizó una ejecución en curso.
+        on_join se llama (antes de esperar) cuando la llamada se suma a una ya en curso.
+        """
+        call, leader = self._join(key)
+        if not leader:
+            if on_join:
+                on_join()
+            return call.future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, call, error=e)
+            raise
+        self._finish(key, call, result)
+        return result, False
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                       on_join: Optional[Callable[[], None]] = None) -> Tuple[Any, bool]:
+        """Como do, pero fn es una corrutina y la espera no bloquea el loop."""
+        call, leader = self._join(key)
+        if not leader:
+            if on_join:
+                on_join()
+            # shield: si se cancela quien espera, no se cancela el future compartido
+            return await asyncio.shield(asyncio.wrap_future(call.future)), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, call, error=e)
+            raise
+        self._finish(key, call, result)
+        return result, False
+
+    def in_flight(self) -> Dict[str, int]:
+        with self._lock:
+            return {"keys": len(self._calls), "waiters": sum(c.dups for c in self._calls.values())}
@@ -1,8 +1,18 @@
 # -*- coding: utf-8 -*-
-from typing import Dict, Any, List, Tuple, Optional
-from google import genai
-from google.genai.errors import ClientError
-import math, time, json, re, os, io
+from typing import Dict, Any, List, Tuple, Optional, Callable, Iterator, AsyncIterator, Awaitable, Generator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio, contextlib, hashlib, math, time, json, os, io
+
+from .cache import SummaryCache
+from .providers import Provider, get_provider, is_rate_limited
+from .ratelimit import get_bucket
+from .jsonrepair import JSONRepairError
+from . import jsonrepair
+from .retry import RetryPolicy, CircuitOpenError, default_policy, get_breaker, is_transient, order_models, retry_after
+from .tokens import get_estimator, prompt_tokens_from_response, output_tokens_from_response
+from . import metrics
+from .windowing import SegmentIndex, time_windows, token_windows, split_long_segments
+from .topics import topic_windows
 
 # ========= Prompts =========
 # Usamos placeholders seguros: [[CONTEXT_BULLETS]] [[T_START]] [[T_END]] [[CHUNK_TEXT]] y [[WINDOWS_JSON]]
@@ -57,6 +67,32 @@ Window summaries (JSON):
 Return ONLY the OVERALL SUMMARIZE text in English.
 """
 
+_FALLBACK_COHERENCE_ES = """Estos resúmenes por ventana de un mismo podcast se generaron en paralelo, sin ver las ventanas vecinas.
+Revísalos en conjunto: elimina repeticiones entre ventanas, unifica nombres y términos y corrige referencias sueltas.
+No agregues información nueva ni cambies el sentido.
+
+Resúmenes por ventana (JSON):
+[[WINDOWS_JSON]]
+
+Responde SOLO en JSON, con una entrada por ventana y el mismo "index":
+{
+  "windows": [{"index": 1, "summary": "texto revisado", "bullets": ["punto 1", "punto 2", "punto 3"]}]
+}
+"""
+
+_FALLBACK_COHERENCE_EN = """These window summaries of one podcast were generated in parallel, without seeing neighbouring windows.
+Review them together: remove repetition across windows, unify names and terms, and fix dangling references.
+Do not add new information or change the meaning.
+
+Window summaries (JSON):
+[[WINDOWS_JSON]]
+
+Reply ONLY as JSON, one entry per window with the same "index":
+{
+  "windows": [{"index": 1, "summary": "revised text", "bullets": ["point 1", "point 2", "point 3"]}]
+}
+"""
+
 def _read_text(path: str) -> Optional[str]:
     try:
         with io.open(path, "r", encoding="utf-8") as f:
@@ -78,6 +114,13 @@ def _load_prompts(prompts_dir: Optional[str], lang: str):
         final = _FALLBACK_FINAL_ES if lang_is_es else _FALLBACK_FINAL_EN
     return win, final
 
+def _load_coherence_prompt(prompts_dir: Optional[str], lang: str) -> str:
+    lang_is_es = str(lang).lower().startswith("es")
+    tpl = None
+    if prompts_dir and os.path.isdir(prompts_dir):
+        tpl = _read_text(os.path.join(prompts_dir, "coherence_prompt_es.txt" if lang_is_es else "coherence_prompt_en.txt"))
+    return tpl or (_FALLBACK_COHERENCE_ES if lang_is_es else _FALLBACK_COHERENCE_EN)
+
 def _fill(tpl: str, mapping: Dict[str,str]) -> str:
     # Reemplazo simple de [[PLACEHOLDER]] sin .format()
     for k, v in mapping.items():
@@ -89,34 +132,52 @@ def _hhmmss(sec):
     sec = max(0, int(sec)); h = sec // 3600; m = (sec % 3600) // 60; s = sec % 60
     return f"{h:02d}:{m:02d}:{s:02d}"
 
-def _windows_from_segments(segments, window_sec=20*60): 
-    if not segments: return []
-    total_end = max(float(seg.get("end", 0)) for seg in segments)
-    n = max(1, math.ceil(total_end / window_sec))
-    wins = []
-    for k in range(n):
-        ws = k * window_sec; we = min((k+1)*window_sec, total_end)
-        txts = [seg.get("text","") for seg in segments if float(seg.get("start",0)) < we and float(seg.get("end",0)) > ws]
-        txt = " ".join(t.strip() for t in txts if t and t.strip())
-        if txt:
-            wins.append({"index": k, "start": ws, "end": we, "text": txt})
-    return wins
-
-def _strip_code_fences(t: str) -> str:
-    t = t.strip()
-    if t.startswith("```"):
-        t = re.sub(r"^```(?:json)?", "", t).strip()
-        t = re.sub(r"```$", "", t).strip()
-    return t
+def _windows_from_segments(segments, window_sec=20*60):
+    return time_windows(SegmentIndex(segments), window_sec, 0, keep_grid_index=True)
+
+# Salida estructurada: con modelos que la soportan (Provider.supports_schema) se pide JSON con este
+# esquema y el modelo no puede devolver otra cosa. STRUCTURED_OUTPUT=0 la desactiva.
+_STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1") != "0"
+_WINDOW_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "summary": {"type": "STRING"},
+        "bullets": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["summary", "bullets"],
+}
+_COHERENCE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "windows": {"type": "ARRAY", "items": {
+            "type": "OBJECT",
+            "properties": dict(_WINDOW_SCHEMA["properties"], index={"type": "INTEGER"}),
+            "required": ["index", "summary", "bullets"],
+        }},
+    },
+    "required": ["windows"],
+}
 
 def _parse_json_text(t: str):
-    t = _strip_code_fences(t)
+    """
+    Objeto JSON de la respuesta (reparado si hace falta, ver jsonrepair); ventanas y coherencia
+    siempre piden un objeto. Lanza JSONRepairError, no ValueError.
+    """
     try:
-        return json.loads(t)
-    except Exception:
-        m = re.search(r"\{.*\}\s*$", t, re.S)
-        if m: return json.loads(m.group(0))
+        obj, repaired = jsonrepair.loads(t or "", expect=dict)
+    except JSONRepairError:
+        metrics.add("json_parse_failures")
         raise
+    if repaired:
+        metrics.add("json_repaired")
+    return obj
+
+def _parse_window_json(t: str) -> Dict[str, Any]:
+    obj = _parse_json_text(t)  # una lista [{...}] se resuelve a su primer objeto
+    if not isinstance(obj.get("summary"), str) or not obj["summary"].strip():
+        metrics.add("json_parse_failures")
+        raise JSONRepairError("Model output has no summary.")
+    return obj
 
 def _truncate(s: str, max_chars: int) -> str:
     if len(s) <= max_chars: return s
@@ -127,65 +188,166 @@ def _truncate(s: str, max_chars: int) -> str:
 
 # ========= Token budgeting / retry =========
 class TokenBudget:
-    def __init__(self, client, model, tokens_per_minute=14000):
-        self.client = client
+    """
+    Fachada sobre el rate limiter compartido del proceso (ratelimit.get_bucket):
+    cada modelo (incluidos los fallbacks) tiene un único bucket RPM/TPM con recarga continua,
+    compartido por todas las peticiones concurrentes, con límites de LLM_RPM / LLM_TPM.
+    tokens_per_minute (per_minute_token_budget) no toca el bucket: dimensiona las ventanas y
+    es el máximo que una sola llamada puede reservar.
+    Los tokens se estiman localmente (tokens.get_estimator, calibrado con usage_metadata);
+    remote_count=True (o REMOTE_TOKEN_COUNT=1) usa count_tokens por red como antes.
+    """
+    def __init__(self, provider, model, tokens_per_minute=14000, remote_count=None):
+        self.provider = provider
         self.model = model
         self.budget = tokens_per_minute
-        self.window_start = time.time()
-        self.used = 0
+        if remote_count is None:
+            remote_count = os.getenv("REMOTE_TOKEN_COUNT", "0") == "1"
+        self.remote_count = remote_count
+        self.estimator = get_estimator()
 
-    def _reset_if_needed(self):
-        if time.time() - self.window_start >= 60:
-            self.window_start = time.time()
-            self.used = 0
-
-    def count(self, contents: str) -> int:
-        try:
-            r = self.client.models.count_tokens(model=self.model, contents=contents)
-            return int(r.total_tokens)
-        except Exception:
-            return max(1, len(contents) // 4)
-
-    def ensure(self, contents: str):
-        self._reset_if_needed()
-        need = self.count(contents)
-        remaining = self.budget - self.used
-        if need > self.budget:
-            return False, need
-        if need > remaining:
-            sleep_s = 60 - (time.time() - self.window_start)
-            if sleep_s > 0:
-                time.sleep(sleep_s)
-            self.window_start = time.time()
-            self.used = 0
-        self.used += need
-        return True, need
-
-def _gen_with_retry(client, model, contents, budget: TokenBudget, max_retries=3):
-    ok, need = budget.ensure(contents)
-    if not ok:
-        raise ValueError(f"Prompt too large for per-minute budget (~{need} tokens). Truncate input.")
-    delay_from_server = None
-    for _ in range(max_retries):
-        try:
-            return client.models.generate_content(model=model, contents=contents)
-        except ClientError as e:
-            msg = getattr(e, "message", "") or str(e)
-            if "RESOURCE_EXHAUSTED" in msg or getattr(e, "code", None) == 429:
-                retry_secs = 4
+    def count(self, contents: str, model: Optional[str] = None) -> int:
+        model = model or self.model
+        with metrics.timed("token_count"):
+            if self.remote_count:
                 try:
-                    details = e.details or []
-                    for d in details:
-                        if isinstance(d, dict) and d.get("@type","").endswith("RetryInfo"):
-                            retry_secs = int(d.get("retryDelay","4s").rstrip("s"))
-                            break
+                    return self.provider.count_tokens(model, contents)
                 except Exception:
                     pass
-                time.sleep(delay_from_server or retry_secs)
-                delay_from_server = max(retry_secs * 1.5, 4)
+            return self.estimator.estimate(model, contents)
+
+    def observe(self, contents: str, resp, need: int, model: Optional[str] = None):
+        """Calibra el estimador con el conteo real y corrige lo descontado del bucket."""
+        model = model or self.model
+        actual = prompt_tokens_from_response(resp)
+        if actual is None:
+            return
+        self.estimator.observe(model, contents, actual)
+        get_bucket(model).refund(need - actual)
+
+    def fits(self, contents: str, model: Optional[str] = None) -> Tuple[bool, int]:
+        """(cabe, tokens estimados): no cabe si supera el tope por llamada o el TPM del modelo."""
+        model = model or self.model
+        need = self.count(contents, model)
+        return need <= min(self.budget, get_bucket(model).tpm), need
+
+    def acquire(self, need: int, model: Optional[str] = None):
+        """Reserva una request y `need` tokens del bucket del modelo (espera si no alcanza)."""
+        metrics.add("ratelimit_wait_seconds", get_bucket(model or self.model).acquire(need))
+
+    def refund(self, need: int, model: Optional[str] = None):
+        get_bucket(model or self.model).refund(need)
+
+    async def count_async(self, contents: str, model: Optional[str] = None) -> int:
+        model = model or self.model
+        if not self.remote_count:
+            return self.count(contents, model)
+        with metrics.timed("token_count"):
+            try:
+                return await self.provider.acount_tokens(model, contents)
+            except Exception:
+                return self.estimator.estimate(model, contents)
+
+    async def fits_async(self, contents: str, model: Optional[str] = None) -> Tuple[bool, int]:
+        model = model or self.model
+        need = await self.count_async(contents, model)
+        return need <= min(self.budget, get_bucket(model).tpm), need
+
+    async def acquire_async(self, need: int, model: Optional[str] = None):
+        """Como acquire, pero la espera del rate limiter es asyncio.sleep (no bloquea el loop)."""
+        metrics.add("ratelimit_wait_seconds", await get_bucket(model or self.model).acquire_async(need))
+
+def _retry_wait(e: Exception, model: str, attempt: int, policy: RetryPolicy, can_fallback: bool) -> Optional[float]:
+    """
+    Segundos a dormir antes de reintentar `model` tras el error `e`, o None si hay que rendirse
+    (error no transitorio, intentos agotados o, habiendo fallback, espera larga o breaker abierto).
+    """
+    if not is_transient(e):
+        return None
+    breaker = get_breaker(model)
+    server_delay = retry_after(e)
+    if breaker.failure(server_delay):
+        metrics.add("breaker_trips")
+    if attempt + 1 >= policy.max_attempts:
+        return None
+    wait = policy.backoff(attempt, server_delay)
+    if can_fallback and (wait > policy.fallback_after_s or breaker.retry_in() > 0):
+        metrics.add("early_fallbacks")
+        return None
+    metrics.add("retries")
+    metrics.add("retry_sleep_seconds", wait)
+    return wait
+
+def _admit(model: str, can_fallback: bool) -> bool:
+    """
+    Con fallback disponible, no llama a un modelo con el breaker abierto (CircuitOpenError).
+    True si esta llamada es la prueba de half-open. El último modelo de la cadena siempre se intenta.
+    """
+    if not can_fallback:
+        return False
+    breaker = get_breaker(model)
+    probe = breaker.admit()
+    if probe is None:
+        metrics.add("breaker_skips")
+        raise CircuitOpenError(model, breaker.retry_in())
+    return probe
+
+def _request_schema(provider, model: str, schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # salida estructurada solo si está activa y el modelo la soporta (si no, se ignora)
+    return schema if _STRUCTURED_OUTPUT and schema and provider.supports_schema(model) else None
+
+def _fits(ok: bool, need: int) -> int:
+    if not ok:
+        raise ValueError(f"Prompt too large for per-minute budget (~{need} tokens). Truncate input.")
+    return need
+
+def _unbilled(e: Exception, need: int, model: str, budget: TokenBudget):
+    # un 429 se rechaza antes de procesar el prompt: sus tokens no se cobraron (la request sí cuenta)
+    if is_rate_limited(e):
+        budget.refund(need, model)
+
+def _generated(model: str, contents, resp, need: int, budget: TokenBudget, schema: Optional[Dict[str, Any]]):
+    """Registra una respuesta exitosa: breaker, métricas y calibración del presupuesto."""
+    get_breaker(model).success()
+    metrics.add("llm_calls")
+    metrics.add("tokens_in", prompt_tokens_from_response(resp) or need)
+    metrics.add("tokens_out", output_tokens_from_response(resp) or 0)
+    if schema:
+        metrics.add("structured_calls")
+    budget.observe(contents, resp, need, model)
+    return resp
+
+def _gen_with_retry(provider, model, contents, budget: TokenBudget,
+                    policy: Optional[RetryPolicy] = None, can_fallback: bool = False,
+                    schema: Optional[Dict[str, Any]] = None):
+    """
+    Genera con reintentos según `policy` (backoff con jitter, respetando retryDelay).
+    can_fallback=True: hay otro modelo después en la cadena, así que ante breaker abierto o
+    esperas largas se relanza el error enseguida en vez de dormir.
+    schema: pide salida JSON estructurada si el modelo la soporta (si no, se ignora).
+    """
+    policy = policy or default_policy()
+    schema = _request_schema(provider, model, schema)
+    probe = _admit(model, can_fallback)
+    try:
+        need = _fits(*budget.fits(contents, model))
+        for attempt in range(policy.max_attempts):
+            # cada intento reenvía el prompt completo: se cobra cada vez
+            budget.acquire(need, model)
+            try:
+                with metrics.timed("generate"):
+                    resp = provider.generate(model, contents, schema=schema)
+            except Exception as e:
+                _unbilled(e, need, model, budget)
+                wait = _retry_wait(e, model, attempt, policy, can_fallback)
+                if wait is None:
+                    raise
+                time.sleep(wait)
                 continue
-            raise
-    raise RuntimeError("LLM retry limit reached.")
+            return _generated(model, contents, resp, need, budget, schema)
+    finally:
+        if probe:
+            get_breaker(model).release()
 
 def _windows_from_segments_sliding(
     segments: list,
@@ -195,125 +357,233 @@ def _windows_from_segments_sliding(
     """
     Genera ventanas deslizantes con solapamiento.
     Ej: total=50m, window=20m, overlap=5m -> [0-20], [15-35], [30-50]
+    Usa SegmentIndex (bisect sobre start/end ordenados): O(n log n) en vez de O(ventanas × segmentos).
     """
-    if not segments:
-        return []
-    if overlap_sec < 0 or overlap_sec >= window_sec:
-        raise ValueError("overlap_sec debe ser >= 0 y < window_sec")
+    return time_windows(SegmentIndex(segments), window_sec, overlap_sec)
 
-    total_end = max(float(seg.get("end", 0)) for seg in segments)
+def _windows_from_segments_tokens(
+    segments: list,
+    model: str,
+    window_tokens: int,
+    overlap_tokens: int = 0
+):
+    """Ventanas por tokens estimados (bordes de segmento), con el factor calibrado del modelo."""
+    est = get_estimator()
+    per_char = est.factor(model) / est.chars_per_token
+    count = lambda t: len(t) * per_char
+    segments = split_long_segments(segments, window_tokens - overlap_tokens, count)
+    return token_windows(SegmentIndex(segments, count=count), window_tokens, overlap_tokens)
 
-    wins = []
-    start = 0.0
-    step = window_sec - overlap_sec  # cuánto avanzo cada vez
+def _budget_window_tokens(budget: "TokenBudget", win_tpl: str, model: str, share: float) -> int:
+    """
+    Tokens de transcripción por ventana para que el prompt completo (plantilla + contexto +
+    fragmento) use ~share del presupuesto por minuto.
+    """
+    ctx = _context_bullets(["x" * 160] * 3)
+    overhead = budget.count(_window_prompt(win_tpl, {"start": 0, "end": 0}, ctx, ""), model)
+    return max(200, int(budget.budget * share) - overhead)
 
-    while start < total_end:
-        end = min(start + window_sec, total_end)
-        txts = [
-            seg.get("text", "")
-            for seg in segments
-            if float(seg.get("start", 0)) < end and float(seg.get("end", 0)) > start
-        ]
-        txt = " ".join(t.strip() for t in txts if t and t.strip())
-        if txt:
-            wins.append({"index": len(wins), "start": start, "end": end, "text": txt})
 
-        # si ya llegamos al final, corta
-        if end >= total_end:
+# ========= Pasos sin E/S (comunes a sync y async) =========
+# La lógica que llama al LLM se escribe una vez como generador: cede cada llamada
+# (modelo, prompt, can_fallback, schema) y recibe resp.text, o la excepción de esa llamada.
+# _drive la ejecuta con _gen_with_retry y _adrive con _gen_with_retry_async.
+def _drive(steps: Generator, call: Callable[..., Any]) -> Any:
+    send, value = steps.send, None
+    while True:
+        try:
+            req = send(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            send, value = steps.send, call(*req)
+        except Exception as e:
+            send, value = steps.throw, e
+
+def _llm_call(provider, budget: TokenBudget) -> Callable[..., str]:
+    def call(model, prompt, can_fallback, schema):
+        return _gen_with_retry(provider, model, prompt, budget, can_fallback=can_fallback, schema=schema).text
+    return call
+
+def _fallback_steps(
+    prompt: str,
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    parse: Callable[[str], Any],
+    cache: Optional[SummaryCache],
+    what: str,
+    schema: Optional[Dict[str, Any]],
+) -> Generator:
+    """Pasos de _generate_with_fallbacks: cache, cadena de modelos y parse de la respuesta."""
+    value = cache.get(model, prompt) if cache else None
+    if value is not None:
+        return value
+    last_exc = None
+    chain = _model_chain(model, model_fallbacks)
+    for i, mdl in enumerate(chain):
+        try:
+            value = parse((yield mdl, prompt, i < len(chain) - 1, schema))
+            if value is not None:
+                break
+        except Exception as e:
+            last_exc = e
+            continue
+    if value is None:
+        raise last_exc or RuntimeError(f"Failed: {what}.")
+    if cache:
+        # bajo el modelo que respondió: lo de un fallback no pasa por respuesta del principal
+        cache.put(mdl, prompt, value)
+    return value
+
+def _window_steps(
+    win_tpl: str,
+    w: Dict[str, Any],
+    prev_bullets: List[str],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    per_window_max_chars: Optional[int],
+    cache: Optional[SummaryCache] = None,
+) -> Generator:
+    """Pasos de _summarize_window: prompt, cache, cadena de modelos y recorte ante ValueError."""
+    chunk_text = _truncate(w["text"], per_window_max_chars) if per_window_max_chars else w["text"]
+    context_bullets = _context_bullets(prev_bullets)
+    prompt = _window_prompt(win_tpl, w, context_bullets, chunk_text)
+
+    # se busca con el modelo principal y el prompt completo; un resultado de fallback o de un
+    # prompt recortado se guarda con su propia clave, así no tapa al de calidad completa
+    obj = cache.get(model, prompt) if cache else None
+    cached = obj is not None
+    last_exc = None
+    chain = [] if cached else _model_chain(model, model_fallbacks)
+    for i, mdl in enumerate(chain):
+        can_fallback = i < len(chain) - 1
+        try:
+            obj = _parse_window_json((yield mdl, prompt, can_fallback, _WINDOW_SCHEMA))
             break
-        start += step
+        except ValueError:
+            # prompt grande -> recortar y reintentar una vez
+            chunk_text = _truncate(chunk_text, max(2000, len(chunk_text)//2))
+            prompt = _window_prompt(win_tpl, w, context_bullets, chunk_text)
+            try:
+                obj = _parse_window_json((yield mdl, prompt, can_fallback, _WINDOW_SCHEMA))
+                break
+            except Exception as e2:
+                last_exc = e2
+                continue
+        except Exception as e:
+            last_exc = e
+            continue
+    if obj is None:
+        raise last_exc or RuntimeError("Failed to summarize a window.")
+    if cache and not cached:
+        cache.put(mdl, prompt, obj)
+    return _window_result(w, obj)
 
-    return wins
+def _reduce_steps(
+    budget: TokenBudget,
+    final_tpl: str,
+    summaries: List[Dict[str, Any]],
+    model: str,
+    group_size: int,
+    max_prompt_tokens: Optional[int],
+    progress: Optional[Callable[..., None]],
+) -> Generator:
+    """Niveles de la reducción jerárquica: cede (grupos,), recibe sus fusiones y devuelve los items finales."""
+    items = _compact_windows(summaries)
+    if max_prompt_tokens is None:
+        max_prompt_tokens = int(budget.budget * 0.6)
+    level = 0
+    while True:
+        groups = _reduce_groups(budget, final_tpl, items, model, max_prompt_tokens, group_size)
+        if groups is None:
+            return items
+        level += 1
+        if progress: progress("overall", status="running", level=level, groups=len(groups))
+        merged = yield (groups,)
+        items = _merged_level(groups, merged)
 
+def _draft_jobs(
+    windows: List[Dict[str, Any]],
+    context: str,
+    draft_model: Optional[str],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    per_window_max_chars: Optional[int],
+) -> List[Tuple[Dict[str, Any], str, Tuple[str, ...], int]]:
+    """context="draft": (ventana, modelo, fallbacks, max_chars) del pase barato de cada ventana menos la última."""
+    if context != "draft" or len(windows) < 2:
+        return []
+    dm = draft_model or (model_fallbacks[-1] if model_fallbacks else model)
+    return [(w, dm, (model,), max(1000, (per_window_max_chars or len(w["text"])) // 2)) for w in windows[:-1]]
 
-# ========= Public API =========
-def summarize_podcast_windows(
-    result: Dict[str, Any],
-    key_google: str,
-    lang: str = "es",
-    model: str = "gemma-3-12b-it",
-    window_minutes: int = 20,
-    overlap_minutes: int = 5,
-    per_window_max_chars: int = 6000,
-    per_minute_token_budget: int = 12000,
-    model_fallbacks: Tuple[str, ...] = ("gemma-3-4b-it",),
-    prompts_dir: Optional[str] = None,
-) -> Tuple[str, List[Dict[str, Any]], str]:
-    """
-    result: dict con 'segments' [{start,end,text}, ...]
-    Devuelve: (final_text, summaries_por_ventana, overall_text)
-    """
-    client = genai.Client(api_key=key_google)
-    win_tpl, final_tpl = _load_prompts(prompts_dir, lang)
-    segments = result.get("segments", [])
-    window_sec   = int(window_minutes * 60)
-    overlap_sec  = int(overlap_minutes * 60)
-    windows = _windows_from_segments_sliding(
-        segments,
-        window_sec=window_sec,
-        overlap_sec=overlap_sec
-    )
+def _draft_context(windows: List[Dict[str, Any]], drafts: List[Dict[str, Any]]) -> Dict[int, List[str]]:
+    # los bullets del borrador de una ventana son el contexto de la siguiente
+    return {w["index"]: d["bullets"] for w, d in zip(windows[1:], drafts)}
 
 
-    budget = TokenBudget(client, model, tokens_per_minute=per_minute_token_budget)
+# ========= Pasos por ventana / overall =========
+def _model_chain(model: str, model_fallbacks: Tuple[str, ...]) -> List[str]:
+    # los modelos con el breaker abierto pasan al final: se prueba antes uno que sí responde
+    return order_models([model] + [m for m in model_fallbacks if m != model])
 
-    summaries = []
-    prev_bullets: List[str] = []
+def _generate_with_fallbacks(
+    provider,
+    budget: TokenBudget,
+    prompt: str,
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    parse: Callable[[str], Any],
+    cache: Optional[SummaryCache] = None,
+    what: str = "LLM call",
+    schema: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """Genera con `model` y sus fallbacks; parse(resp.text) decide si la respuesta sirve. Usa la cache si viene."""
+    return _drive(_fallback_steps(prompt, model, model_fallbacks, parse, cache, what, schema),
+                  _llm_call(provider, budget))
 
-    # Ventanas
-    for w in windows:
-        chunk_text = _truncate(w["text"], per_window_max_chars)
-        context_bullets = "\n".join(f"- {b}" for b in prev_bullets[:3]) if prev_bullets else "(sin contexto / no context)"
-        prompt = _fill(win_tpl, {
-            "CONTEXT_BULLETS": context_bullets,
-            "T_START": _hhmmss(w["start"]),
-            "T_END": _hhmmss(w["end"]),
-            "CHUNK_TEXT": chunk_text
-        })
+def _window_prompt(win_tpl: str, w: Dict[str, Any], context_bullets: str, chunk_text: str) -> str:
+    return _fill(win_tpl, {
+        "CONTEXT_BULLETS": context_bullets,
+        "T_START": _hhmmss(w["start"]),
+        "T_END": _hhmmss(w["end"]),
+        "CHUNK_TEXT": chunk_text
+    })
 
-        obj = None
-        last_exc = None
-        for mdl in [model] + [m for m in model_fallbacks if m != model]:
-            budget.model = mdl
-            try:
-                resp = _gen_with_retry(client, mdl, prompt, budget)
-                obj = _parse_json_text(resp.text)
-                break
-            except ValueError:
-                # prompt grande -> recortar y reintentar una vez
-                chunk_text = _truncate(chunk_text, max(2000, len(chunk_text)//2))
-                prompt = _fill(win_tpl, {
-                    "CONTEXT_BULLETS": context_bullets,
-                    "T_START": _hhmmss(w["start"]),
-                    "T_END": _hhmmss(w["end"]),
-                    "CHUNK_TEXT": chunk_text
-                })
-                try:
-                    resp = _gen_with_retry(client, mdl, prompt, budget)
-                    obj = _parse_json_text(resp.text)
-                    break
-                except Exception as e2:
-                    last_exc = e2
-                    continue
-            except Exception as e:
-                last_exc = e
-                continue
-        if obj is None:
-            raise last_exc or RuntimeError("Failed to summarize a window.")
-
-        bullets = [b.strip() for b in obj.get("bullets", []) if isinstance(b, str) and b.strip()]
-        summaries.append({
-            "index": w["index"],
-            "start": w["start"],
-            "end": w["end"],
-            "start_hms": _hhmmss(w["start"]),
-            "end_hms": _hhmmss(w["end"]),
-            "summary": (obj.get("summary") or "").strip(),
-            "bullets": bullets[:3]
-        })
-        if bullets:
-            prev_bullets = bullets
+def _context_bullets(prev_bullets: List[str]) -> str:
+    return "\n".join(f"- {b}" for b in prev_bullets[:3]) if prev_bullets else "(sin contexto / no context)"
+
+def _summarize_window(
+    provider,
+    budget: TokenBudget,
+    win_tpl: str,
+    w: Dict[str, Any],
+    prev_bullets: List[str],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    per_window_max_chars: Optional[int],
+    cache: Optional[SummaryCache] = None,
+) -> Dict[str, Any]:
+    """
+    Resume una ventana (con fallback de modelos y recorte si el prompt excede el presupuesto).
+    per_window_max_chars=None: no recorta (ventanas ya dimensionadas por tokens).
+    Devuelve el dict de la ventana: {index, start, end, start_hms, end_hms, summary, bullets}
+    """
+    return _drive(_window_steps(win_tpl, w, prev_bullets, model, model_fallbacks, per_window_max_chars, cache),
+                  _llm_call(provider, budget))
+
+def _window_result(w: Dict[str, Any], obj: Dict[str, Any]) -> Dict[str, Any]:
+    bullets = [b.strip() for b in obj.get("bullets", []) if isinstance(b, str) and b.strip()]
+    return {
+        "index": w["index"],
+        "start": w["start"],
+        "end": w["end"],
+        "start_hms": _hhmmss(w["start"]),
+        "end_hms": _hhmmss(w["end"]),
+        "summary": (obj.get("summary") or "").strip(),
+        "bullets": bullets[:3]
+    }
 
+def _compact_windows(summaries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # Overall (compacto: bullets + excerpt)
     compact = []
     for s in summaries:
@@ -324,24 +594,90 @@ def summarize_podcast_windows(
             "bullets": s["bullets"],
             "excerpt": excerpt
         })
-    windows_json = json.dumps(compact, ensure_ascii=False, indent=2)
-    final_prompt = _fill(final_tpl, {"WINDOWS_JSON": windows_json})
+    return compact
 
-    overall = None
-    last_exc = None
-    for mdl in [model] + [m for m in model_fallbacks if m != model]:
-        budget.model = mdl
-        try:
-            resp = _gen_with_retry(client, mdl, final_prompt, budget)
-            overall = resp.text.strip()
-            break
-        except Exception as e:
-            last_exc = e
-            continue
-    if overall is None:
-        raise last_exc or RuntimeError("Failed to build overall summary.")
+def _merge_items(
+    provider,
+    budget: TokenBudget,
+    final_tpl: str,
+    items: List[Dict[str, Any]],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    cache: Optional[SummaryCache] = None,
+) -> str:
+    return _generate_with_fallbacks(
+        provider, budget, _merge_prompt(final_tpl, items), model, model_fallbacks,
+        parse=_parse_text, cache=cache, what="overall summary"
+    )
+
+def _merge_prompt(final_tpl: str, items: List[Dict[str, Any]]) -> str:
+    return _fill(final_tpl, {"WINDOWS_JSON": json.dumps(items, ensure_ascii=False, indent=2)})
+
+def _parse_text(t: Optional[str]) -> Optional[str]:
+    return (t or "").strip() or None
+
+def _items_prompt_tokens(budget: TokenBudget, final_tpl: str, items: List[Dict[str, Any]], model: str) -> int:
+    return budget.count(_fill(final_tpl, {"WINDOWS_JSON": json.dumps(items, ensure_ascii=False, indent=2)}), model)
+
+def _overall_summary(
+    provider,
+    budget: TokenBudget,
+    final_tpl: str,
+    summaries: List[Dict[str, Any]],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    cache: Optional[SummaryCache] = None,
+    group_size: int = 6,
+    max_prompt_tokens: Optional[int] = None,
+    max_workers: int = 8,
+    progress: Optional[Callable[..., None]] = None,
+) -> str:
+    """
+    Si el prompt plano (todas las ventanas) cabe en max_prompt_tokens, es una sola llamada.
+    Si no, reducción jerárquica: fusiona en grupos de group_size (en paralelo), cada fusión pasa
+    a ser un item del nivel siguiente, y repite hasta que queda un único prompt que cabe.
+    Llamadas ~ N/(k-1) y latencia ~ log_k(N) niveles.
+    """
+    def merge_level(groups):
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="reduce") as pool:
+            return list(pool.map(
+                metrics.propagate(lambda g: _merge_items(provider, budget, final_tpl, g, model, model_fallbacks, cache)),
+                groups
+            ))
+    items = _drive(_reduce_steps(budget, final_tpl, summaries, model, group_size, max_prompt_tokens, progress),
+                   merge_level)
+    return _merge_items(provider, budget, final_tpl, items, model, model_fallbacks, cache)
+
+def _reduce_groups(
+    budget: TokenBudget,
+    final_tpl: str,
+    items: List[Dict[str, Any]],
+    model: str,
+    max_prompt_tokens: int,
+    group_size: int,
+) -> Optional[List[List[Dict[str, Any]]]]:
+    """Grupos del siguiente nivel de reducción, o None si el prompt plano ya cabe."""
+    if len(items) <= 1 or _items_prompt_tokens(budget, final_tpl, items, model) <= max_prompt_tokens:
+        return None
+    # grupos más chicos si uno de tamaño k igual no cabe
+    kk = max(2, group_size)
+    while kk > 2 and any(
+        _items_prompt_tokens(budget, final_tpl, items[i:i+kk], model) > max_prompt_tokens
+        for i in range(0, len(items), kk)
+    ):
+        kk -= 1
+    return [items[i:i+kk] for i in range(0, len(items), kk)]
 
-    # Ensamble final
+def _merged_level(groups: List[List[Dict[str, Any]]], merged: List[str]) -> List[Dict[str, Any]]:
+    # cada fusión pasa a ser un item del nivel siguiente
+    return [{
+        "index": j+1,
+        "time": f'{g[0]["time"].split("-")[0]}-{g[-1]["time"].split("-")[-1]}',
+        "bullets": [],
+        "excerpt": _truncate(text, 1500)
+    } for j, (g, text) in enumerate(zip(groups, merged))]
+
+def _assemble_final_text(overall: str, summaries: List[Dict[str, Any]]) -> str:
     lines = []
     lines.append("1. Overall summarize\n")
     lines.append(overall.strip())
@@ -354,5 +690,590 @@ def summarize_podcast_windows(
             for b in s["bullets"]:
                 lines.append(f"- {b}")
         lines.append("")
-    final_text = "\n".join(lines).strip()
-    return final_text, summaries, overall
+    return "\n".join(lines).strip()
+
+
+def _coherence_pass(
+    provider,
+    budget: TokenBudget,
+    coherence_tpl: str,
+    summaries: List[Dict[str, Any]],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    cache: Optional[SummaryCache] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Revisión conjunta de ventanas resumidas en paralelo (quita repeticiones, unifica términos).
+    Es best-effort: si falla, devuelve los resúmenes originales.
+    """
+    prompt = _coherence_prompt(coherence_tpl, summaries)
+    try:
+        obj = _generate_with_fallbacks(
+            provider, budget, prompt, model, model_fallbacks,
+            parse=_parse_json_text, cache=cache, what="coherence pass", schema=_COHERENCE_SCHEMA
+        )
+    except Exception:
+        return summaries
+    return _apply_coherence(summaries, obj)
+
+def _coherence_prompt(coherence_tpl: str, summaries: List[Dict[str, Any]]) -> str:
+    payload = [{
+        "index": s["index"]+1,
+        "time": f'{s["start_hms"]}-{s["end_hms"]}',
+        "summary": s["summary"],
+        "bullets": s["bullets"]
+    } for s in summaries]
+    return _fill(coherence_tpl, {"WINDOWS_JSON": json.dumps(payload, ensure_ascii=False, indent=2)})
+
+def _apply_coherence(summaries: List[Dict[str, Any]], obj: Any) -> List[Dict[str, Any]]:
+    revised = {}
+    for r in (obj.get("windows") or []) if isinstance(obj, dict) else []:
+        try:
+            revised[int(r.get("index")) - 1] = r
+        except Exception:
+            continue
+    out = []
+    for s in summaries:
+        r = revised.get(s["index"])
+        if not r or not isinstance(r.get("summary"), str) or not r["summary"].strip():
+            out.append(s); continue
+        bullets = [b.strip() for b in r.get("bullets", []) if isinstance(b, str) and b.strip()]
+        out.append(dict(s, summary=r["summary"].strip(), bullets=bullets[:3] or s["bullets"]))
+    return out
+
+def _iter_windows_parallel(
+    provider,
+    budget: TokenBudget,
+    win_tpl: str,
+    windows: List[Dict[str, Any]],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    per_window_max_chars: Optional[int],
+    cache: Optional[SummaryCache],
+    context: str,
+    draft_model: Optional[str],
+    max_workers: int,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Resume todas las ventanas a la vez y las emite en orden de término.
+    context="none": sin contexto previo. context="draft": primero un pase barato (draft_model,
+    texto recortado a la mitad) en paralelo, y sus bullets sirven de contexto a la ventana siguiente.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="win") as pool:
+        drafts = list(pool.map(
+            metrics.propagate(lambda j: _summarize_window(provider, budget, win_tpl, j[0], [], *j[1:], cache)),
+            _draft_jobs(windows, context, draft_model, model, model_fallbacks, per_window_max_chars)
+        ))
+        prev_ctx = _draft_context(windows, drafts)
+        run = metrics.propagate(_summarize_window)
+        futs = [
+            pool.submit(run, provider, budget, win_tpl, w, prev_ctx.get(w["index"], []),
+                        model, model_fallbacks, per_window_max_chars, cache)
+            for w in windows
+        ]
+        for f in as_completed(futs):
+            yield f.result()
+
+
+def _prepare_windows(
+    provider: Provider,
+    result: Dict[str, Any],
+    lang: str,
+    model: str,
+    window_minutes: int,
+    overlap_minutes: int,
+    per_window_max_chars: Optional[int],
+    per_minute_token_budget: int,
+    prompts_dir: Optional[str],
+    mode: str,
+    context: str,
+    window_tokens: Optional[int],
+    overlap_tokens: int,
+    window_mode: str,
+    window_budget_share: float,
+):
+    """Valida opciones, carga prompts y arma las ventanas (común a la versión sync y async)."""
+    if mode not in ("sequential", "parallel"):
+        raise ValueError("mode debe ser 'sequential' o 'parallel'")
+    if context not in ("none", "draft"):
+        raise ValueError("context debe ser 'none' o 'draft'")
+    if window_mode not in ("time", "budget", "topic"):
+        raise ValueError("window_mode debe ser 'time', 'budget' o 'topic'")
+    win_tpl, final_tpl = _load_prompts(prompts_dir, lang)
+    segments = result.get("segments", [])
+    window_sec   = int(window_minutes * 60)
+    overlap_sec  = int(overlap_minutes * 60)
+    budget = TokenBudget(provider, model, tokens_per_minute=per_minute_token_budget)
+
+    if window_mode == "budget":
+        # ventanas dimensionadas al presupuesto: no se recorta ni se pierde texto
+        window_tokens = _budget_window_tokens(budget, win_tpl, model, window_budget_share)
+        windows = _windows_from_segments_tokens(segments, model, window_tokens, min(overlap_tokens, window_tokens // 2))
+        per_window_max_chars = None
+    elif window_mode == "topic":
+        # cortes en cambios de tema (cohesión léxica TF-IDF), sin solapamiento: overlap no aplica
+        with metrics.timed("topic_segmentation"):
+            windows = topic_windows(segments, window_sec)
+    elif window_tokens:
+        windows = _windows_from_segments_tokens(segments, model, window_tokens, overlap_tokens)
+    else:
+        windows = _windows_from_segments_sliding(
+            segments,
+            window_sec=window_sec,
+            overlap_sec=overlap_sec
+        )
+    return budget, win_tpl, final_tpl, windows, per_window_max_chars
+
+
+def _window_key(w: Dict[str, Any]) -> str:
+    """Identidad de una ventana por contenido: mismo (inicio, fin, texto) -> mismo resumen."""
+    h = hashlib.sha256(w["text"].encode("utf-8")).hexdigest()[:16]
+    return f'{w["start"]:.2f}-{w["end"]:.2f}-{h}'
+
+def _known_summaries(windows: List[Dict[str, Any]], known_windows: Optional[Dict[str, Dict[str, Any]]]):
+    """(claves de cada ventana, {index: resumen ya hecho}) para no volver a resumir lo que no cambió."""
+    keys = [_window_key(w) for w in windows]
+    known = known_windows or {}
+    reused = {w["index"]: dict(known[k], index=w["index"]) for w, k in zip(windows, keys) if k in known}
+    metrics.add("windows_reused", len(reused))
+    return keys, reused
+
+def _merge_revised(summaries: List[Dict[str, Any]], revised: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    by_index = {r["index"]: r for r in revised}
+    return [by_index.get(s["index"], s) for s in summaries]
+
+
+class _SummaryRun:
+    """
+    Estado y eventos de iter_summarize_podcast_windows, comunes a la versión sync y async:
+    esas solo hacen las llamadas (ventanas, coherencia, overall) con hilos o con awaits.
+    """
+    def __init__(self, provider: Provider, result: Dict[str, Any], lang: str, model: str, window_minutes: int,
+                 overlap_minutes: int, per_window_max_chars: Optional[int], per_minute_token_budget: int,
+                 model_fallbacks: Tuple[str, ...], prompts_dir: Optional[str], cache: Optional[SummaryCache],
+                 progress: Optional[Callable[..., None]], mode: str, context: str, window_tokens: Optional[int],
+                 overlap_tokens: int, window_mode: str, window_budget_share: float,
+                 known_windows: Optional[Dict[str, Dict[str, Any]]]):
+        self.budget, self.win_tpl, self.final_tpl, self.windows, self.per_window_max_chars = _prepare_windows(
+            provider, result, lang, model, window_minutes, overlap_minutes, per_window_max_chars,
+            per_minute_token_budget, prompts_dir, mode, context, window_tokens, overlap_tokens,
+            window_mode, window_budget_share,
+        )
+        self.provider, self.model, self.model_fallbacks, self.cache = provider, model, model_fallbacks, cache
+        self.lang, self.prompts_dir, self.progress = lang, prompts_dir, progress
+        self.summaries: List[Dict[str, Any]] = []
+        self.prev_bullets: List[str] = []
+        metrics.add("windows", len(self.windows))
+        self.keys, self.reused = _known_summaries(self.windows, known_windows)
+
+    def _report(self, stage: str, **info):
+        if self.progress: self.progress(stage, **info)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        self._report(name, status="running")
+        with metrics.timed(name):
+            yield
+        self._report(name, status="done")
+
+    # ---- ventanas ----
+    def start_windows(self):
+        # tiempo de reloj de la etapa completa
+        self._t_windows = time.perf_counter()
+        self._report("windows", status="running", done=0, total=len(self.windows))
+
+    def window_args(self, w: Dict[str, Any]) -> Tuple:
+        """Argumentos de _summarize_window (o su versión async) para la ventana w en modo secuencial."""
+        return (self.provider, self.budget, self.win_tpl, w, self.prev_bullets, self.model,
+                self.model_fallbacks, self.per_window_max_chars, self.cache)
+
+    def pending(self) -> List[Dict[str, Any]]:
+        return [w for w in self.windows if w["index"] not in self.reused]
+
+    def add(self, s: Dict[str, Any]) -> Dict[str, Any]:
+        """Registra una ventana resumida (o reutilizada) y devuelve su evento."""
+        self.summaries.append(s)
+        if s["bullets"]:
+            self.prev_bullets = s["bullets"]
+        done, total = len(self.summaries), len(self.windows)
+        self._report("windows", status="running", done=done, total=total)
+        ev = {"type": "window", "window": s, "done": done, "total": total}
+        return dict(ev, reused=True) if s["index"] in self.reused else ev
+
+    def end_windows(self):
+        # en paralelo llegan en orden de término
+        self.summaries.sort(key=lambda s: s["index"])
+        metrics.observe("windows", time.perf_counter() - self._t_windows)
+        self._report("windows", status="done", done=len(self.windows), total=len(self.windows))
+
+    # ---- coherencia / overall ----
+    def fresh(self, coherence_pass: bool) -> List[Dict[str, Any]]:
+        """Ventanas a revisar en la pasada de coherencia (las reutilizadas ya se revisaron); [] si no corresponde."""
+        fresh = [s for s in self.summaries if s["index"] not in self.reused]
+        return fresh if coherence_pass and len(fresh) > 1 else []
+
+    def coherence_tpl(self) -> str:
+        return _load_coherence_prompt(self.prompts_dir, self.lang)
+
+    def revised(self, fresh: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self.summaries = _merge_revised(self.summaries, fresh)
+        return {"type": "coherence", "per_window": self.summaries}
+
+    def final(self, overall: str) -> Dict[str, Any]:
+        return {"type": "final", "final_text": _assemble_final_text(overall, self.summaries),
+                "per_window": self.summaries, "overall": overall, "window_keys": self.keys}
+
+
+# ========= Public API =========
+def iter_summarize_podcast_windows(
+    result: Dict[str, Any],
+    key_google: str,
+    lang: str = "es",
+    model: str = "gemma-3-12b-it",
+    window_minutes: int = 20,
+    overlap_minutes: int = 5,
+    per_window_max_chars: int = 6000,
+    per_minute_token_budget: int = 12000,
+    model_fallbacks: Tuple[str, ...] = ("gemma-3-4b-it",),
+    prompts_dir: Optional[str] = None,
+    cache: Optional[SummaryCache] = None,
+    progress: Optional[Callable[..., None]] = None,
+    mode: str = "sequential",
+    context: str = "none",
+    draft_model: Optional[str] = None,
+    coherence_pass: bool = False,
+    max_workers: int = 8,
+    reduce_group_size: int = 6,
+    window_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    window_mode: str = "time",
+    window_budget_share: float = 0.5,
+    provider: Optional[Provider] = None,
+    known_windows: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Igual que summarize_podcast_windows, pero emite eventos a medida que avanzan:
+      {"type": "window",    "window": {...}, "done": k, "total": n}   (uno por ventana, apenas se parsea)
+      {"type": "coherence", "per_window": [...]}                     (solo si coherence_pass=True)
+      {"type": "overall",   "overall": "..."}
+      {"type": "final",     "final_text": "...", "per_window": [...], "overall": "...", "window_keys": [...]}
+    En mode="parallel" las ventanas llegan en orden de término (ver _iter_windows_parallel).
+    known_windows: {window_key: resumen} de una pasada anterior (modo incremental, ver pipeline);
+    esas ventanas se emiten con "reused": True sin llamar al LLM, y coherence_pass revisa solo las nuevas.
+    window_keys (en "final") va alineado con per_window.
+    """
+    provider = provider or get_provider(key_google)
+    run = _SummaryRun(provider, result, lang, model, window_minutes, overlap_minutes, per_window_max_chars,
+                      per_minute_token_budget, model_fallbacks, prompts_dir, cache, progress, mode, context,
+                      window_tokens, overlap_tokens, window_mode, window_budget_share, known_windows)
+
+    run.start_windows()
+    if mode == "parallel":
+        for s in run.reused.values():
+            yield run.add(s)
+        for s in _iter_windows_parallel(provider, run.budget, run.win_tpl, run.pending(), model, model_fallbacks,
+                                        run.per_window_max_chars, cache, context, draft_model, max_workers):
+            yield run.add(s)
+    else:
+        for w in run.windows:
+            yield run.add(run.reused.get(w["index"]) or _summarize_window(*run.window_args(w)))
+    run.end_windows()
+
+    fresh = run.fresh(coherence_pass)
+    if fresh:
+        with run.stage("coherence"):
+            fresh = _coherence_pass(provider, run.budget, run.coherence_tpl(), fresh, model, model_fallbacks, cache)
+        yield run.revised(fresh)
+
+    with run.stage("overall"):
+        overall = _overall_summary(provider, run.budget, run.final_tpl, run.summaries, model, model_fallbacks, cache,
+                                   group_size=reduce_group_size, max_workers=max_workers, progress=progress)
+    yield {"type": "overall", "overall": overall}
+    yield run.final(overall)
+
+def summarize_podcast_windows(
+    result: Dict[str, Any],
+    key_google: str,
+    lang: str = "es",
+    model: str = "gemma-3-12b-it",
+    window_minutes: int = 20,
+    overlap_minutes: int = 5,
+    per_window_max_chars: int = 6000,
+    per_minute_token_budget: int = 12000,
+    model_fallbacks: Tuple[str, ...] = ("gemma-3-4b-it",),
+    prompts_dir: Optional[str] = None,
+    cache: Optional[SummaryCache] = None,
+    progress: Optional[Callable[..., None]] = None,
+    mode: str = "sequential",
+    context: str = "none",
+    draft_model: Optional[str] = None,
+    coherence_pass: bool = False,
+    max_workers: int = 8,
+    reduce_group_size: int = 6,
+    window_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    window_mode: str = "time",
+    window_budget_share: float = 0.5,
+    provider: Optional[Provider] = None,
+    known_windows: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Tuple[str, List[Dict[str, Any]], str]:
+    """
+    result: dict con 'segments' [{start,end,text}, ...]
+    cache: si se entrega, reutiliza respuestas previas por (model, prompt) y solo llama al LLM en misses.
+    progress: callback opcional progress(stage, **info) (etapas 'windows', 'coherence' y 'overall').
+    mode="parallel": resume todas las ventanas a la vez (hasta max_workers), con context="none"
+      o context="draft" (bullets de un pase barato con draft_model como contexto previo).
+    coherence_pass=True: revisión conjunta de las ventanas antes del overall.
+    reduce_group_size: tamaño de grupo k de la reducción jerárquica del overall, que se activa
+      solo cuando el prompt plano no cabe en ~60% del presupuesto por minuto (episodios muy largos).
+    window_tokens: si se da, las ventanas se cortan por tokens estimados (overlap_tokens de solape)
+      en vez de por window_minutes/overlap_minutes.
+    window_mode="budget": ventanas cortadas en bordes de segmento para que cada prompt use
+      ~window_budget_share del presupuesto por minuto; no aplica per_window_max_chars (sin recortes).
+    window_mode="topic": ventanas de ~window_minutes (entre 50% y 125%) cortadas en cambios de tema
+      detectados localmente (topics.topic_windows), sin solapamiento; se ignoran overlap_minutes y window_tokens.
+    provider: proveedor LLM (providers.Provider); por defecto get_provider(key_google), que respeta LLM_PROVIDER.
+    known_windows: resúmenes ya hechos por clave de ventana (ver iter_summarize_podcast_windows).
+    Devuelve: (final_text, summaries_por_ventana, overall_text)
+    """
+    final = None
+    for ev in iter_summarize_podcast_windows(
+        result, key_google, lang=lang, model=model,
+        window_minutes=window_minutes, overlap_minutes=overlap_minutes,
+        per_window_max_chars=per_window_max_chars,
+        per_minute_token_budget=per_minute_token_budget,
+        model_fallbacks=model_fallbacks, prompts_dir=prompts_dir,
+        cache=cache, progress=progress,
+        mode=mode, context=context, draft_model=draft_model,
+        coherence_pass=coherence_pass, max_workers=max_workers,
+        reduce_group_size=reduce_group_size,
+        window_tokens=window_tokens, overlap_tokens=overlap_tokens,
+        window_mode=window_mode, window_budget_share=window_budget_share,
+        provider=provider, known_windows=known_windows,
+    ):
+        if ev["type"] == "final":
+            final = ev
+    return final["final_text"], final["per_window"], final["overall"]
+
+
+# ========= Async (asyncio) =========
+# Misma lógica que la versión con hilos (los pasos sin E/S y _SummaryRun son los mismos), pero las
+# llamadas al LLM (provider.agenerate), las esperas del rate limiter y los reintentos son awaits:
+# cientos de resúmenes en vuelo sin un hilo cada uno.
+
+async def _gather_limited(limit: int, coros) -> List[Any]:
+    sem = asyncio.Semaphore(max(1, limit))
+    async def run(c):
+        async with sem:
+            return await c
+    return await asyncio.gather(*(run(c) for c in coros))
+
+async def _adrive(steps: Generator, call: Callable[..., Awaitable[Any]]) -> Any:
+    """Como _drive, con await en cada llamada."""
+    send, value = steps.send, None
+    while True:
+        try:
+            req = send(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            send, value = steps.send, await call(*req)
+        except Exception as e:
+            send, value = steps.throw, e
+
+def _allm_call(provider, budget: TokenBudget) -> Callable[..., Awaitable[str]]:
+    async def call(model, prompt, can_fallback, schema):
+        return (await _gen_with_retry_async(provider, model, prompt, budget, can_fallback=can_fallback,
+                                            schema=schema)).text
+    return call
+
+async def _gen_with_retry_async(provider, model, contents, budget: TokenBudget,
+                                policy: Optional[RetryPolicy] = None, can_fallback: bool = False,
+                                schema: Optional[Dict[str, Any]] = None):
+    policy = policy or default_policy()
+    schema = _request_schema(provider, model, schema)
+    probe = _admit(model, can_fallback)
+    try:
+        need = _fits(*await budget.fits_async(contents, model))
+        for attempt in range(policy.max_attempts):
+            await budget.acquire_async(need, model)
+            try:
+                with metrics.timed("generate"):
+                    resp = await provider.agenerate(model, contents, schema=schema)
+            except Exception as e:
+                _unbilled(e, need, model, budget)
+                wait = _retry_wait(e, model, attempt, policy, can_fallback)
+                if wait is None:
+                    raise
+                await asyncio.sleep(wait)
+                continue
+            return _generated(model, contents, resp, need, budget, schema)
+    finally:
+        if probe:
+            get_breaker(model).release()
+
+async def _generate_with_fallbacks_async(
+    provider,
+    budget: TokenBudget,
+    prompt: str,
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    parse: Callable[[str], Any],
+    cache: Optional[SummaryCache] = None,
+    what: str = "LLM call",
+    schema: Optional[Dict[str, Any]] = None,
+) -> Any:
+    return await _adrive(_fallback_steps(prompt, model, model_fallbacks, parse, cache, what, schema),
+                         _allm_call(provider, budget))
+
+async def _summarize_window_async(
+    provider,
+    budget: TokenBudget,
+    win_tpl: str,
+    w: Dict[str, Any],
+    prev_bullets: List[str],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    per_window_max_chars: Optional[int],
+    cache: Optional[SummaryCache] = None,
+) -> Dict[str, Any]:
+    """Versión async de _summarize_window (mismos pasos: fallback de modelos y recorte ante ValueError)."""
+    return await _adrive(_window_steps(win_tpl, w, prev_bullets, model, model_fallbacks, per_window_max_chars, cache),
+                         _allm_call(provider, budget))
+
+async def _merge_items_async(provider, budget, final_tpl, items, model, model_fallbacks, cache=None) -> str:
+    return await _generate_with_fallbacks_async(
+        provider, budget, _merge_prompt(final_tpl, items), model, model_fallbacks,
+        parse=_parse_text, cache=cache, what="overall summary"
+    )
+
+async def _overall_summary_async(
+    provider,
+    budget: TokenBudget,
+    final_tpl: str,
+    summaries: List[Dict[str, Any]],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    cache: Optional[SummaryCache] = None,
+    group_size: int = 6,
+    max_prompt_tokens: Optional[int] = None,
+    max_workers: int = 8,
+    progress: Optional[Callable[..., None]] = None,
+) -> str:
+    async def merge_level(groups):
+        return await _gather_limited(max_workers, [
+            _merge_items_async(provider, budget, final_tpl, g, model, model_fallbacks, cache) for g in groups
+        ])
+    items = await _adrive(_reduce_steps(budget, final_tpl, summaries, model, group_size, max_prompt_tokens, progress),
+                          merge_level)
+    return await _merge_items_async(provider, budget, final_tpl, items, model, model_fallbacks, cache)
+
+async def _coherence_pass_async(provider, budget, coherence_tpl, summaries, model, model_fallbacks, cache=None):
+    try:
+        obj = await _generate_with_fallbacks_async(
+            provider, budget, _coherence_prompt(coherence_tpl, summaries), model, model_fallbacks,
+            parse=_parse_json_text, cache=cache, what="coherence pass", schema=_COHERENCE_SCHEMA
+        )
+    except Exception:
+        return summaries
+    return _apply_coherence(summaries, obj)
+
+async def _iter_windows_parallel_async(
+    provider,
+    budget: TokenBudget,
+    win_tpl: str,
+    windows: List[Dict[str, Any]],
+    model: str,
+    model_fallbacks: Tuple[str, ...],
+    per_window_max_chars: Optional[int],
+    cache: Optional[SummaryCache],
+    context: str,
+    draft_model: Optional[str],
+    max_workers: int,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Como _iter_windows_parallel, con tareas asyncio (a lo más max_workers en vuelo)."""
+    drafts = await _gather_limited(max_workers, [
+        _summarize_window_async(provider, budget, win_tpl, w, [], dm, fallbacks, max_chars, cache)
+        for w, dm, fallbacks, max_chars in _draft_jobs(windows, context, draft_model, model, model_fallbacks,
+                                                       per_window_max_chars)
+    ])
+    prev_ctx = _draft_context(windows, drafts)
+    sem = asyncio.Semaphore(max(1, max_workers))
+    async def one(w):
+        async with sem:
+            return await _summarize_window_async(provider, budget, win_tpl, w, prev_ctx.get(w["index"], []),
+                                                 model, model_fallbacks, per_window_max_chars, cache)
+    tasks = [asyncio.ensure_future(one(w)) for w in windows]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
+
+async def iter_summarize_podcast_windows_async(
+    result: Dict[str, Any],
+    key_google: str,
+    lang: str = "es",
+    model: str = "gemma-3-12b-it",
+    window_minutes: int = 20,
+    overlap_minutes: int = 5,
+    per_window_max_chars: int = 6000,
+    per_minute_token_budget: int = 12000,
+    model_fallbacks: Tuple[str, ...] = ("gemma-3-4b-it",),
+    prompts_dir: Optional[str] = None,
+    cache: Optional[SummaryCache] = None,
+    progress: Optional[Callable[..., None]] = None,
+    mode: str = "sequential",
+    context: str = "none",
+    draft_model: Optional[str] = None,
+    coherence_pass: bool = False,
+    max_workers: int = 8,
+    reduce_group_size: int = 6,
+    window_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    window_mode: str = "time",
+    window_budget_share: float = 0.5,
+    provider: Optional[Provider] = None,
+    known_windows: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Versión async de iter_summarize_podcast_windows (mismos eventos y parámetros)."""
+    provider = provider or get_provider(key_google)
+    run = _SummaryRun(provider, result, lang, model, window_minutes, overlap_minutes, per_window_max_chars,
+                      per_minute_token_budget, model_fallbacks, prompts_dir, cache, progress, mode, context,
+                      window_tokens, overlap_tokens, window_mode, window_budget_share, known_windows)
+
+    run.start_windows()
+    if mode == "parallel":
+        for s in run.reused.values():
+            yield run.add(s)
+        async for s in _iter_windows_parallel_async(provider, run.budget, run.win_tpl, run.pending(), model,
+                                                    model_fallbacks, run.per_window_max_chars, cache, context,
+                                                    draft_model, max_workers):
+            yield run.add(s)
+    else:
+        for w in run.windows:
+            yield run.add(run.reused.get(w["index"]) or await _summarize_window_async(*run.window_args(w)))
+    run.end_windows()
+
+    fresh = run.fresh(coherence_pass)
+    if fresh:
+        with run.stage("coherence"):
+            fresh = await _coherence_pass_async(provider, run.budget, run.coherence_tpl(), fresh, model,
+                                                model_fallbacks, cache)
+        yield run.revised(fresh)
+
+    with run.stage("overall"):
+        overall = await _overall_summary_async(provider, run.budget, run.final_tpl, run.summaries, model,
+                                               model_fallbacks, cache, group_size=reduce_group_size,
+                                               max_workers=max_workers, progress=progress)
+    yield {"type": "overall", "overall": overall}
+    yield run.final(overall)
+
+async def summarize_podcast_windows_async(result: Dict[str, Any], key_google: str, **kwargs) -> Tuple[str, List[Dict[str, Any]], str]:
+    """Versión async de summarize_podcast_windows (mismos parámetros; ver ahí)."""
+    final = None
+    async for ev in iter_summarize_podcast_windows_async(result, key_google, **kwargs):
+        if ev["type"] == "final":
+            final = ev
+    return final["final_text"], final["per_window"], final["overall"]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, Optional
+import math, threading
+
+class TokenEstimator:
+    """
+    Estimación local de tokens (sin red): len(texto)/chars_per_token * factor[modelo].
+    El factor por modelo se calibra con media móvil exponencial contra el
+    usage_metadata.prompt_token_count que devuelven las respuestas reales.
+    """
+    def __init__(self, chars_per_token: float = 4.0, alpha: float = 0.2,
+                 min_factor: float = 0.25, max_factor: float = 4.0):
+        self.chars_per_token = chars_per_token
+        self.alpha = alpha
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self._factor: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _base(self, text: str) -> float:
+        return max(1.0, len(text) / self.chars_per_token)
+
+    def factor(self, model: str) -> float:
+        with self._lock:
+            return self._factor.get(model, 1.0)
+
+    def estimate(self, model: str, text: str) -> int:
+        return max(1, math.ceil(self._base(text) * self.factor(model)))
+
+    def observe(self, model: str, text: str, actual_tokens: Optional[int]):
+        """Ajusta el factor de `model` con el conteo real de un prompt ya enviado."""
+        if not actual_tokens or actual_tokens <= 0:
+            return
+        ratio = actual_tokens / self._base(text)
+        ratio = min(self.max_factor, max(self.min_factor, ratio))
+        with self._lock:
+            n = self._samples.get(model, 0)
+            old = self._factor.get(model, 1.0)
+            # las primeras muestras pesan más para converger rápido
+            a = max(self.alpha, 1.0 / (n + 1))
+            self._factor[model] = old + a * (ratio - old)
+            self._samples[model] = n + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {m: {"factor": round(f, 4), "samples": self._samples.get(m, 0)} for m, f in self._factor.items()}
+
+
+# Estimador compartido por todo el proceso
+_ESTIMATOR = TokenEstimator()
+
+def get_estimator() -> TokenEstimator:
+    return _ESTIMATOR
+
+def prompt_tokens_from_response(resp) -> Optional[int]:
+    """Lee usage_metadata.prompt_token_count de una respuesta de generate_content (si viene)."""
+    usage = getattr(resp, "usage_metadata", None)
+    n = getattr(usage, "prompt_token_count", None) if usage is not None else None
+    try:
+        return int(n) if n is not None else None
+    except Exception:
+        return None
+
+def output_tokens_from_response(resp) -> Optional[int]:
+    """Lee usage_metadata.candidates_token_count (tokens generados), si viene."""
+    usage = getattr(resp, "usage_metadata", None)
+    n = getattr(usage, "candidates_token_count", None) if usage is not None else None
+    try:
+        return int(n) if n is not None else None
+    except Exception:
+        return None
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, List, Optional, Tuple
+from bisect import bisect_left
+import re
+
+import numpy as np
+
+from .windowing import SegmentIndex, split_long_segments
+
+# Cohesión léxica al estilo TextTiling: la transcripción se agrupa en unidades de ~unit_sec,
+# cada unidad es un vector TF-IDF y en cada hueco entre unidades se compara el bloque de la
+# izquierda con el de la derecha. Donde la similitud cae en un valle profundo cambia el tema.
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+_STOPWORDS = frozenset("""
+que los las del por para con una uno unos unas como pero más mas este esta esto estos estas ese esa eso
+esos esas aquí ahí allí muy ya sí son ser fue era han hay hemos tiene tienen todo toda todos todas
+cuando donde porque entonces también tambien bueno pues así algo nada otro otra otros sobre entre
+hasta desde sin nos les lo le se su sus mi mis tu tus yo él ella ellos ellas vamos voy va estoy está
+están estaba creo digamos tipo cosa cosas vez veces decir dice dijo hacer hace hecho puede pueden
+the and for that this with you are was were have has had not but they them their there what which
+who will would can could should about just like yeah okay really know think going get got one out
+from your our all its it's don't i'm we're that's been being into than then also very because
+""".split())
+
+
+def _units(index: SegmentIndex, unit_sec: float) -> List[Tuple[int, int]]:
+    """Rangos [lo, hi) de segmentos consecutivos que suman ~unit_sec (las 'oraciones' del algoritmo)."""
+    units, lo = [], 0
+    for i in range(len(index)):
+        if index.max_end[i] - index.starts[lo] >= unit_sec:
+            units.append((lo, i + 1))
+            lo = i + 1
+    if lo < len(index):
+        units.append((lo, len(index)))
+    return units
+
+def _tfidf(texts: List[str]) -> np.ndarray:
+    """Matriz unidades × términos con log(1+tf)·idf, filas normalizadas (términos en una sola unidad no aportan)."""
+    vocab: Dict[str, int] = {}
+    rows: List[Dict[int, int]] = []
+    for t in texts:
+        counts: Dict[int, int] = {}
+        for w in _WORD_RE.findall(t.lower()):
+            if w not in _STOPWORDS:
+                j = vocab.setdefault(w, len(vocab))
+                counts[j] = counts.get(j, 0) + 1
+        rows.append(counts)
+    m = np.zeros((len(texts), len(vocab)), dtype=np.float32)
+    for i, counts in enumerate(rows):
+        if counts:
+            m[i, list(counts)] = list(counts.values())
+    df = (m > 0).sum(axis=0)
+    keep = df >= 2
+    m, df = m[:, keep], df[keep]
+    m = np.log1p(m) * np.log(len(texts) / df).astype(np.float32)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms > 0, norms, 1.0)
+
+def _gap_similarity(m: np.ndarray, block: int) -> np.ndarray:
+    """Coseno entre los `block` vectores a cada lado de cada hueco (sumas acumuladas: O(unidades × términos))."""
+    n = len(m)
+    cum = np.vstack([np.zeros((1, m.shape[1]), dtype=m.dtype), np.cumsum(m, axis=0)])
+    gaps = np.arange(1, n)
+    left = cum[gaps] - cum[np.maximum(gaps - block, 0)]
+    right = cum[np.minimum(gaps + block, n)] - cum[gaps]
+    num = (left * right).sum(axis=1)
+    den = np.linalg.norm(left, axis=1) * np.linalg.norm(right, axis=1)
+    return np.where(den > 0, num / np.where(den > 0, den, 1.0), 0.0)
+
+def _depth_scores(sim: np.ndarray) -> np.ndarray:
+    """Profundidad de cada valle: cuánto sube la similitud hacia ambos lados hasta el pico más cercano."""
+    if len(sim) >= 3:
+        sim = np.convolve(np.pad(sim, 1, mode="edge"), np.ones(3) / 3, mode="valid")
+    depth = np.zeros_like(sim)
+    for g in range(len(sim)):
+        lo = g
+        while lo > 0 and sim[lo - 1] >= sim[lo]:
+            lo -= 1
+        hi = g
+        while hi < len(sim) - 1 and sim[hi + 1] >= sim[hi]:
+            hi += 1
+        depth[g] = (sim[lo] - sim[g]) + (sim[hi] - sim[g])
+    return depth
+
+
+def topic_boundaries(
+    index: SegmentIndex,
+    unit_sec: float = 30.0,
+    block_units: int = 4,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Candidatos a cambio de tema: (índice del primer segmento tras cada hueco, instante del hueco,
+    profundidad del valle de cohesión). Mayor profundidad = corte más claro.
+    """
+    units = _units(index, unit_sec)
+    if len(units) < 2:
+        return np.zeros(0, dtype=int), np.zeros(0), np.zeros(0)
+    m = _tfidf([index.join(range(lo, hi)) for lo, hi in units])
+    depth = _depth_scores(_gap_similarity(m, block_units))
+    seg = np.array([lo for lo, _ in units[1:]], dtype=int)
+    at = np.array([index.starts[i] for i in seg])
+    return seg, at, depth
+
+
+def topic_windows(
+    segments: List[Dict[str, Any]],
+    window_sec: float,
+    min_share: float = 0.5,
+    max_share: float = 1.25,
+    unit_sec: float = 30.0,
+    block_units: int = 4,
+    split_tokens: Optional[float] = 120,
+) -> List[Dict[str, Any]]:
+    """
+    Ventanas sin solapamiento cortadas en cambios de tema: desde el inicio de cada ventana se
+    elige, entre los huecos a window_sec·[min_share, max_share], el valle de cohesión más profundo
+    (a igual profundidad, el más cercano a window_sec). Si el resto cabe en window_sec·max_share
+    va entero en la última. Cada segmento queda en exactamente una ventana.
+    split_tokens: parte antes los segmentos largos (ASR: uno por chunk de audio) en oraciones.
+    """
+    if split_tokens:
+        segments = split_long_segments(segments, split_tokens)
+    index = SegmentIndex(segments)
+    n = len(index)
+    if not n:
+        return []
+    seg, at, depth = topic_boundaries(index, unit_sec, block_units)
+    total_end = index.total_end
+    lo_sec, hi_sec = window_sec * min_share, window_sec * max_share
+
+    bounds = [(0, 0.0)]
+    start_i, start_t = bounds[0]
+    while total_end - start_t > hi_sec:
+        # el resto tras el corte tampoco puede quedar más corto que una ventana mínima
+        ok = (at >= start_t + lo_sec) & (at <= min(start_t + hi_sec, total_end - lo_sec)) & (seg > start_i)
+        cand = np.flatnonzero(ok)
+        if len(cand):
+            dist = np.abs(at[cand] - (start_t + window_sec)) / window_sec
+            best = cand[np.lexsort((dist, -np.round(depth[cand], 3)))[0]]
+            start_i, start_t = int(seg[best]), float(at[best])
+        else:
+            # sin huecos entre unidades en el rango (segmentos muy largos): corte por tiempo
+            i = max(bisect_left(index.starts, start_t + window_sec), start_i + 1)
+            if i >= n:
+                break
+            start_i, start_t = i, index.starts[i]
+        bounds.append((start_i, start_t))
+    bounds.append((n, total_end))
+
+    wins = []
+    for (lo, t0), (hi, t1) in zip(bounds, bounds[1:]):
+        txt = index.join(range(lo, hi))
+        if txt:
+            wins.append({"index": len(wins), "start": t0, "end": t1, "text": txt})
+    return wins
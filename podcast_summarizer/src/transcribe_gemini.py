@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
-from typing import Dict, Any, List, Tuple
-from google import genai
-from google.genai.errors import ClientError
-import subprocess, os, time, tempfile
+from typing import Dict, Any, List, Tuple, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, subprocess, os, time, tempfile
+
+from .providers import Provider, get_provider
+from .audio import segment_stream, detect_silences, plan_chunks, encode_chunk, detect_silences_async, encode_chunk_async
+from .procs import run_async
+from .youtube import youtube_audio_stream
+from .workspace import Workspace
+from . import metrics
 
 TRANSCRIBE_PROMPT = {
     "es": "Transcribe verbatim the following audio in Spanish. Return only the transcript text.",
@@ -11,53 +17,218 @@ TRANSCRIBE_PROMPT = {
 
 def _run(cmd): subprocess.check_call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
 
+def _ffprobe_cmd(path: str) -> List[str]:
+    return ["ffprobe","-v","error","-show_entries","format=duration","-of","default=nk=1:nw=1",path]
+
 def _ffprobe_duration(path: str) -> float:
-    out = subprocess.check_output(
-        ["ffprobe","-v","error","-show_entries","format=duration","-of","default=nk=1:nw=1",path],
-        text=True
-    ).strip()
+    out = subprocess.check_output(_ffprobe_cmd(path), text=True).strip()
     return float(out)
 
-def split_audio(input_path: str, segment_minutes: int = 20) -> List[Tuple[str, float, float]]:
+async def _ffprobe_duration_async(path: str) -> float:
+    return float((await run_async(_ffprobe_cmd(path), capture="stdout")).strip())
+
+def split_audio(input_path: str, segment_minutes: int = 20, preprocess: bool = True,
+                work_dir: Optional[str] = None) -> List[Tuple[str, float, float]]:
+    """
+    Devuelve [(chunk_path, start, end)].
+    preprocess=True: chunks mono 16 kHz de bajo bitrate, cortados en silencios (no en el minuto exacto)
+    y sin las pausas largas. preprocess=False: cortes duros con el audio original (comportamiento anterior).
+    work_dir: carpeta donde escribir los chunks (p.ej. un Workspace); si no, se crea un tmp que
+    queda a cargo del llamador.
+    """
     dur = _ffprobe_duration(input_path)
     seg = int(segment_minutes*60)
-    if dur <= seg:
+    if not preprocess and dur <= seg:
         return [(input_path, 0.0, dur)]
-    tmpdir = tempfile.mkdtemp(prefix="chunks_")
-    parts=[]; start=0.0; i=0
+    # el tmp solo se crea si se van a escribir chunks (si no, nadie lo borraría)
+    tmpdir = work_dir or tempfile.mkdtemp(prefix="chunks_")
+    if preprocess:
+        return _split_audio_asr(input_path, dur, seg, tmpdir)
+    parts=[]
+    for cmd, outp, start, end in _hard_cuts(input_path, dur, seg, tmpdir):
+        _run(cmd)
+        parts.append((outp,start,end))
+    return parts
+
+def _hard_cuts(input_path: str, dur: float, seg: int, tmpdir: str) -> List[Tuple[List[str], str, float, float]]:
+    # cortes duros cada seg segundos: [(cmd ffmpeg, chunk_path, start, end)]
+    cuts=[]; start=0.0; i=0
     while start < dur - 1:
         end = min(start+seg, dur)
         outp = os.path.join(tmpdir, f"chunk_{i:03d}.mp3")
-        _run(["ffmpeg","-y","-ss",str(start),"-to",str(end),"-i",input_path,"-vn","-acodec","libmp3lame",outp])
-        parts.append((outp,start,end))
+        cuts.append((["ffmpeg","-y","-ss",str(start),"-to",str(end),"-i",input_path,"-vn","-acodec","libmp3lame",outp], outp, start, end))
         start = end; i += 1
+    return cuts
+
+def _split_audio_asr(input_path: str, dur: float, seg: int, tmpdir: str) -> List[Tuple[str, float, float]]:
+    try:
+        silences = detect_silences(input_path)
+    except Exception:
+        silences = []
+    plan = plan_chunks(dur, silences, seg)
+    parts = []
+    for i, intervals in enumerate(plan):
+        outp = os.path.join(tmpdir, f"chunk_{i:03d}.mp3")
+        encode_chunk(input_path, intervals, outp)
+        parts.append((outp, intervals[0][0], intervals[-1][1]))
+    return parts
+
+def gemini_transcribe_file(file_path: str, api_key: str, lang: str = "es", model: str = "gemini-1.5-flash",
+                           provider: Optional[Provider] = None) -> str:
+    provider = provider or get_provider(api_key)
+    prompt = TRANSCRIBE_PROMPT["es" if str(lang).lower().startswith("es") else "en"]
+    metrics.add("asr_bytes", os.path.getsize(file_path))
+    with metrics.timed("asr"):
+        return provider.transcribe(file_path, prompt, model)
+
+def transcribe_as_segments(mp3_path: str, api_key: str, lang: str = "es", model: str = "gemini-1.5-flash", window_minutes: int = 20,
+                           progress: Optional[Callable[..., None]] = None, preprocess: bool = True,
+                           provider: Optional[Provider] = None) -> Dict[str, Any]:
+    provider = provider or get_provider(api_key)
+    with Workspace(prefix="chunks_") as ws:
+        if progress: progress("split", status="running")
+        with metrics.timed("split"):
+            chunks = split_audio(mp3_path, segment_minutes=window_minutes, preprocess=preprocess, work_dir=ws.path)
+        metrics.add("asr_chunks", len(chunks))
+        if progress: progress("split", status="done", chunks=len(chunks))
+        segs=[]; texts=[]
+        for i,(p,st,en) in enumerate(chunks):
+            if progress: progress("transcribe", status="running", done=i, total=len(chunks))
+            txt = gemini_transcribe_file(p, api_key=api_key, lang=lang, model=model, provider=provider)
+            txt = (txt or "").replace("\r"," ").strip()
+            segs.append({"id":i,"start":st,"end":en,"text":txt}); texts.append(txt)
+        if progress: progress("transcribe", status="done", done=len(chunks), total=len(chunks))
+    return {
+        "text":"\n".join(texts).strip(),
+        "segments":segs,
+        "source":provider.name,
+        "lang":lang,
+        "kind":"asr",
+        "sep":"\n",
+        "meta":{"model": model}
+    }
+
+def transcribe_stream_as_segments(url: str, api_key: str, lang: str = "es", model: str = "gemini-1.5-flash", window_minutes: int = 20,
+                                  progress: Optional[Callable[..., None]] = None, max_workers: int = 2,
+                                  provider: Optional[Provider] = None) -> Dict[str, Any]:
+    """
+    Ingesta en streaming: yt-dlp escribe bestaudio a un pipe, un solo ffmpeg lo corta en chunks
+    ASR (mono 16 kHz) y cada chunk se transcribe apenas se cierra, mientras sigue la descarga.
+    Los chunks se borran al transcribirse; no queda MP3 completo en disco.
+    """
+    provider = provider or get_provider(api_key)
+    futs = []
+    with Workspace(prefix="stream_") as ws:
+        dl = youtube_audio_stream(url)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="asr") as pool:
+                def one(p: str) -> str:
+                    try:
+                        return gemini_transcribe_file(p, api_key=api_key, lang=lang, model=model, provider=provider)
+                    finally:
+                        try: os.remove(p)
+                        except OSError: pass
+                if progress: progress("download", status="running")
+                # descarga + troceo en streaming: se mide como una sola etapa (reloj)
+                t_dl = time.perf_counter()
+                for i, (p, st, en) in enumerate(segment_stream(dl.stdout, window_minutes * 60, ws.path)):
+                    futs.append((i, st, en, pool.submit(metrics.propagate(one), p)))
+                    if progress: progress("transcribe", status="running", done=sum(f.done() for *_, f in futs), total=len(futs))
+                if progress: progress("download", status="done", chunks=len(futs))
+                metrics.observe("download", time.perf_counter() - t_dl)
+                metrics.add("asr_chunks", len(futs))
+                segs=[]; texts=[]
+                for i, st, en, f in futs:
+                    txt = (f.result() or "").replace("\r"," ").strip()
+                    segs.append({"id":i,"start":st,"end":en,"text":txt}); texts.append(txt)
+            if progress: progress("transcribe", status="done", done=len(futs), total=len(futs))
+            dl.wait()
+            if dl.returncode != 0:
+                raise subprocess.CalledProcessError(dl.returncode, "yt-dlp")
+        finally:
+            if dl.poll() is None:
+                dl.kill(); dl.wait()
+            if dl.stdout:
+                dl.stdout.close()
+    return {
+        "text":"\n".join(texts).strip(),
+        "segments":segs,
+        "source":provider.name,
+        "lang":lang,
+        "kind":"asr",
+        "sep":"\n",
+        "meta":{"model": model, "ingest": "stream"}
+    }
+
+
+# ========= Async (asyncio) =========
+async def split_audio_async(input_path: str, segment_minutes: int = 20, preprocess: bool = True,
+                            work_dir: Optional[str] = None) -> List[Tuple[str, float, float]]:
+    """Versión async de split_audio: ffprobe/ffmpeg con asyncio.create_subprocess_exec."""
+    dur = await _ffprobe_duration_async(input_path)
+    seg = int(segment_minutes*60)
+    if not preprocess and dur <= seg:
+        return [(input_path, 0.0, dur)]
+    tmpdir = work_dir or tempfile.mkdtemp(prefix="chunks_")
+    if preprocess:
+        try:
+            silences = await detect_silences_async(input_path)
+        except Exception:
+            silences = []
+        parts = []
+        for i, intervals in enumerate(plan_chunks(dur, silences, seg)):
+            outp = os.path.join(tmpdir, f"chunk_{i:03d}.mp3")
+            await encode_chunk_async(input_path, intervals, outp)
+            parts.append((outp, intervals[0][0], intervals[-1][1]))
+        return parts
+    parts = []
+    for cmd, outp, start, end in _hard_cuts(input_path, dur, seg, tmpdir):
+        await run_async(cmd)
+        parts.append((outp, start, end))
     return parts
 
-def gemini_transcribe_file(file_path: str, api_key: str, lang: str = "es", model: str = "gemini-1.5-flash") -> str:
-    client = genai.Client(api_key=api_key)
-    file_obj = client.files.upload(file=file_path)
+async def gemini_transcribe_file_async(file_path: str, api_key: str, lang: str = "es", model: str = "gemini-1.5-flash",
+                                       provider: Optional[Provider] = None) -> str:
+    provider = provider or get_provider(api_key)
     prompt = TRANSCRIBE_PROMPT["es" if str(lang).lower().startswith("es") else "en"]
-    resp = client.models.generate_content(
-        model=model,
-        contents=[
-            {"role":"user","parts":[{"text":prompt}]},
-            {"role":"user","parts":[{"file_data":{"file_uri":file_obj.uri,"mime_type":file_obj.mime_type}}]}
-        ]
-    )
-    return (resp.text or "").strip()
-
-def transcribe_as_segments(mp3_path: str, api_key: str, lang: str = "es", model: str = "gemini-1.5-flash", window_minutes: int = 20) -> Dict[str, Any]:
-    chunks = split_audio(mp3_path, segment_minutes=window_minutes)
-    segs=[]; texts=[]
-    for i,(p,st,en) in enumerate(chunks):
-        txt = gemini_transcribe_file(p, api_key=api_key, lang=lang, model=model)
-        txt = (txt or "").replace("\r"," ").strip()
-        segs.append({"id":i,"start":st,"end":en,"text":txt}); texts.append(txt)
+    metrics.add("asr_bytes", os.path.getsize(file_path))
+    with metrics.timed("asr"):
+        return await provider.atranscribe(file_path, prompt, model)
+
+async def transcribe_as_segments_async(mp3_path: str, api_key: str, lang: str = "es", model: str = "gemini-1.5-flash",
+                                       window_minutes: int = 20, progress: Optional[Callable[..., None]] = None,
+                                       preprocess: bool = True, provider: Optional[Provider] = None,
+                                       max_concurrency: int = 2) -> Dict[str, Any]:
+    """
+    Versión async de transcribe_as_segments. Los chunks se transcriben concurrentemente
+    (hasta max_concurrency a la vez) con provider.atranscribe.
+    """
+    provider = provider or get_provider(api_key)
+    with Workspace(prefix="chunks_") as ws:
+        if progress: progress("split", status="running")
+        with metrics.timed("split"):
+            chunks = await split_audio_async(mp3_path, segment_minutes=window_minutes, preprocess=preprocess, work_dir=ws.path)
+        metrics.add("asr_chunks", len(chunks))
+        if progress: progress("split", status="done", chunks=len(chunks))
+        sem = asyncio.Semaphore(max(1, max_concurrency))
+        done = 0
+        async def one(p: str) -> str:
+            nonlocal done
+            async with sem:
+                txt = await gemini_transcribe_file_async(p, api_key=api_key, lang=lang, model=model, provider=provider)
+            done += 1
+            if progress: progress("transcribe", status="running", done=done, total=len(chunks))
+            return (txt or "").replace("\r"," ").strip()
+        if progress: progress("transcribe", status="running", done=0, total=len(chunks))
+        texts = await asyncio.gather(*(one(p) for p, _, _ in chunks))
+        if progress: progress("transcribe", status="done", done=len(chunks), total=len(chunks))
+    segs = [{"id":i,"start":st,"end":en,"text":txt} for i, ((_, st, en), txt) in enumerate(zip(chunks, texts))]
     return {
         "text":"\n".join(texts).strip(),
         "segments":segs,
-        "source":"gemini",
+        "source":provider.name,
         "lang":lang,
         "kind":"asr",
+        "sep":"\n",
         "meta":{"model": model}
     }
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, List, Optional, Tuple
+from array import array
+import bisect, collections, json, mmap, os, re, struct, sys, threading
+
+# ========= Formato en disco =========
+# MAGIC | versión u16 | largo del header u32 | header JSON (relleno a múltiplo de 8)
+# starts f64[n] | ends f64[n] | offsets u64[n+1] | texto UTF-8
+# El texto es la transcripción completa: los segmentos unidos por `sep`. El segmento i es
+# buf[offsets[i]:offsets[i+1] - len(sep)]; offsets[n] apunta un separador más allá del final.
+_MAGIC = b"PSTR"
+_VERSION = 1
+_PREFIX = struct.Struct("<4sHI")
+_ID_RE = re.compile(r"^[\w.\-]+$")
+
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+class CompactTranscript:
+    """
+    Transcripción en columnas: start/end en arrays de float, un único buffer UTF-8 con el texto
+    completo y offsets por segmento. Ocupa ~24 bytes por segmento más el texto (una sola vez),
+    frente al dict unificado que guarda el texto dos veces y un dict por segmento.
+    Abierta desde disco (open) hace mmap: los segmentos se decodifican solo al pedirlos.
+    """
+    def __init__(self, starts, ends, offsets, buf, info: Dict[str, Any], sep: str = " ", _mm=None):
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self.buf = buf
+        self.info = info
+        self.sep = sep
+        self._sep_len = len(sep.encode("utf-8"))
+        self._mm = _mm
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> "CompactTranscript":
+        """
+        Desde el dict unificado de get_segments ({text, segments, source, lang, kind, sep, meta}).
+        sep lo declara quien produce la transcripción (ASR "\n", captions " "); el texto de cada
+        segmento se guarda tal cual, aunque contenga sep (los offsets marcan dónde termina).
+        """
+        segs = result.get("segments") or []
+        sep = result.get("sep") or " "
+        sep_b = sep.encode("utf-8")
+        starts, ends, offsets = array("d"), array("d"), array("Q")
+        parts: List[bytes] = []
+        pos = 0
+        for s in segs:
+            b = (s.get("text") or "").encode("utf-8")
+            starts.append(float(s["start"]))
+            ends.append(float(s["end"]))
+            offsets.append(pos)
+            parts.append(b)
+            pos += len(b) + len(sep_b)
+        offsets.append(pos)
+        info = {k: result.get(k) for k in ("source", "lang", "kind", "meta")}
+        return cls(starts, ends, offsets, sep_b.join(parts), info, sep)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def text(self) -> str:
+        return bytes(self.buf).decode("utf-8")
+
+    @property
+    def duration(self) -> float:
+        return max(self.ends) if len(self) else 0.0
+
+    def segment(self, i: int) -> Dict[str, Any]:
+        a, b = self.offsets[i], self.offsets[i + 1] - self._sep_len
+        return {"id": i, "start": self.starts[i], "end": self.ends[i],
+                "text": bytes(self.buf[a:b]).decode("utf-8")}
+
+    def segments(self, lo: int = 0, hi: Optional[int] = None) -> List[Dict[str, Any]]:
+        hi = len(self) if hi is None else min(hi, len(self))
+        return [self.segment(i) for i in range(max(lo, 0), hi)]
+
+    def time_range(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[int, int]:
+        """Índices [lo, hi) de los segmentos que se solapan con [start, end) (starts ordenados)."""
+        hi = len(self) if end is None else bisect.bisect_left(self.starts, end)
+        if start is None:
+            return 0, hi
+        lo = bisect.bisect_right(self.starts, start)
+        # los que empezaron antes de start pero siguen sonando
+        while lo > 0 and self.ends[lo - 1] > start:
+            lo -= 1
+        return lo, max(lo, hi)
+
+    def page(self, offset: int = 0, limit: int = 200, start: Optional[float] = None,
+             end: Optional[float] = None) -> Dict[str, Any]:
+        """Página de segmentos dentro de [start, end): {total, offset, limit, next_offset, segments}."""
+        lo, hi = self.time_range(start, end)
+        a = lo + max(offset, 0)
+        b = min(a + limit, hi)
+        return {
+            "total": hi - lo,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + (b - a) if b < hi else None,
+            "segments": self.segments(a, b),
+        }
+
+    def header(self) -> Dict[str, Any]:
+        return dict(self.info, n_segments=len(self), duration=self.duration, text_bytes=len(self.buf))
+
+    def to_result(self) -> Dict[str, Any]:
+        """El dict unificado de siempre (con text y segments completos)."""
+        return dict(self.info, text=self.text, segments=self.segments(), sep=self.sep)
+
+    # ---- disco ----
+    def save(self, path: str) -> str:
+        header = json.dumps(dict(self.info, n=len(self), sep=self.sep), ensure_ascii=False).encode("utf-8")
+        header += b" " * (_pad8(_PREFIX.size + len(header)) - _PREFIX.size - len(header))
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_PREFIX.pack(_MAGIC, _VERSION, len(header)))
+            f.write(header)
+            for code, col in (("d", self.starts), ("d", self.ends), ("Q", self.offsets)):
+                f.write(_little_endian(array(code, col)))
+            f.write(self.buf)
+        os.replace(tmp, path)  # escritura atómica
+        return path
+
+    @classmethod
+    def open(cls, path: str) -> "CompactTranscript":
+        """Abre un archivo guardado con save sin leerlo entero (mmap)."""
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, hlen = _PREFIX.unpack_from(mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            mm.close()
+            raise ValueError(f"Not a compact transcript (v{_VERSION}): {path}")
+        pos = _PREFIX.size
+        info = json.loads(bytes(mm[pos:pos + hlen]).decode("utf-8"))
+        n, sep = info.pop("n"), info.pop("sep")
+        pos += hlen
+        view = memoryview(mm)
+        cols = []
+        for code, count in (("d", n), ("d", n), ("Q", n + 1)):
+            size = 8 * count
+            col = view[pos:pos + size].cast(code)
+            if sys.byteorder == "big":
+                col = array(code, col.tobytes())
+                col.byteswap()
+            cols.append(col)
+            pos += size
+        return cls(*cols, view[pos:], info, sep, _mm=mm)
+
+
+# ========= Store en disco =========
+class TranscriptStore:
+    """
+    Transcripciones compactas en root/<transcript_id>.pst, con las últimas max_open abiertas
+    (mmap) para servir páginas sin releer el archivo.
+    """
+    def __init__(self, root: str, max_open: int = 32):
+        self.root = root
+        self.max_open = max_open
+        self._open: "collections.OrderedDict[str, CompactTranscript]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, transcript_id: str) -> str:
+        if not _ID_RE.match(transcript_id or ""):
+            raise ValueError(f"Invalid transcript id: {transcript_id!r}")
+        return os.path.join(self.root, f"{transcript_id}.pst")
+
+    def _remember(self, transcript_id: str, t: CompactTranscript):
+        self._open[transcript_id] = t
+        self._open.move_to_end(transcript_id)
+        while len(self._open) > self.max_open:
+            self._open.popitem(last=False)
+
+    def put(self, transcript_id: str, result: Dict[str, Any]) -> CompactTranscript:
+        """Guarda el dict unificado de get_segments como transcript_id (reemplaza si existía)."""
+        path = self._path(transcript_id)
+        t = CompactTranscript.from_result(result)
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            t.save(path)
+            self._remember(transcript_id, t)
+        return t
+
+    def get(self, transcript_id: str) -> Optional[CompactTranscript]:
+        path = self._path(transcript_id)
+        with self._lock:
+            t = self._open.get(transcript_id)
+            if t is not None:
+                self._open.move_to_end(transcript_id)
+                return t
+            if not os.path.exists(path):
+                return None
+            t = CompactTranscript.open(path)
+            self._remember(transcript_id, t)
+            return t
+
+
+_STORES: Dict[str, TranscriptStore] = {}
+_STORES_LOCK = threading.Lock()
+
+def get_transcript_store(root: str) -> TranscriptStore:
+    root = os.path.abspath(root)
+    with _STORES_LOCK:
+        s = _STORES.get(root)
+        if s is None:
+            s = _STORES[root] = TranscriptStore(root)
+        return s
+
+def transcript_id(result: Dict[str, Any], base_name: str) -> str:
+    """Id estable por episodio e idioma (p.ej. yt_<video_id>_es)."""
+    return f'{base_name}_{result.get("lang") or "xx"}'
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Any, List, Callable, Optional
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+import math, re
+
+_SENT_END_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+class SegmentIndex:
+    """
+    Índice de segmentos ordenados por start: arrays paralelos start/end/text,
+    máximo acumulado de end (para ubicar el primer segmento que solapa un instante)
+    y sumas acumuladas de tokens estimados. Construirlo es O(n log n); cada consulta
+    por rango de tiempo o de tokens es O(log n + k).
+    """
+    def __init__(self, segments: List[Dict[str, Any]], count: Optional[Callable[[str], float]] = None):
+        segs = [s for s in segments if s is not None]
+        starts = [float(s.get("start", 0)) for s in segs]
+        if any(b < a for a, b in zip(starts, starts[1:])):
+            order = sorted(range(len(segs)), key=starts.__getitem__)
+            segs = [segs[i] for i in order]
+            starts = [starts[i] for i in order]
+        self.starts = starts
+        self.ends = [float(s.get("end", 0)) for s in segs]
+        self.texts = [(s.get("text") or "").strip() for s in segs]
+        self.max_end = list(accumulate(self.ends, max))
+        count = count or (lambda t: len(t) / 4.0)
+        self.cum_tokens = [0.0] + list(accumulate(count(t) for t in self.texts))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def total_end(self) -> float:
+        return self.max_end[-1] if self.max_end else 0.0
+
+    def time_range(self, t0: float, t1: float) -> List[int]:
+        """Índices de segmentos con start < t1 y end > t0."""
+        lo = bisect_right(self.max_end, t0)
+        hi = bisect_left(self.starts, t1)
+        return [i for i in range(lo, hi) if self.ends[i] > t0]
+
+    def join(self, idx) -> str:
+        return " ".join(self.texts[i] for i in idx if self.texts[i])
+
+    def tokens(self, lo: int, hi: int) -> float:
+        return self.cum_tokens[hi] - self.cum_tokens[lo]
+
+
+def time_windows(
+    index: SegmentIndex,
+    window_sec: float,
+    overlap_sec: float = 0.0,
+    keep_grid_index: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Ventanas por tiempo [start, start+window_sec) avanzando window_sec - overlap_sec.
+    keep_grid_index=True numera por posición en la grilla (aunque haya ventanas vacías).
+    """
+    if not len(index):
+        return []
+    if overlap_sec < 0 or overlap_sec >= window_sec:
+        raise ValueError("overlap_sec debe ser >= 0 y < window_sec")
+    total_end = index.total_end
+    step = window_sec - overlap_sec
+    wins = []
+    k = 0
+    start = 0.0
+    while start < total_end:
+        end = min(start + window_sec, total_end)
+        txt = index.join(index.time_range(start, end))
+        if txt:
+            wins.append({"index": k if keep_grid_index else len(wins), "start": start, "end": end, "text": txt})
+        if end >= total_end:
+            break
+        k += 1
+        start = k * step
+    return wins
+
+
+def token_windows(
+    index: SegmentIndex,
+    max_tokens: float,
+    overlap_tokens: float = 0.0,
+) -> List[Dict[str, Any]]:
+    """
+    Ventanas que cortan en bordes de segmento con ~max_tokens cada una (dos punteros sobre
+    las sumas acumuladas). Cada ventana siguiente repite ~overlap_tokens del final de la anterior.
+    Un segmento que por sí solo excede max_tokens queda como ventana propia
+    (usar split_long_segments antes para evitarlo).
+    """
+    n = len(index)
+    if not n:
+        return []
+    if overlap_tokens < 0 or overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens debe ser >= 0 y < max_tokens")
+    cum = index.cum_tokens
+    wins = []
+    lo = 0
+    while lo < n:
+        hi = bisect_right(cum, cum[lo] + max_tokens) - 1
+        hi = min(n, max(hi, lo + 1))
+        txt = index.join(range(lo, hi))
+        if txt:
+            wins.append({
+                "index": len(wins),
+                "start": index.starts[lo],
+                "end": index.max_end[hi - 1],
+                "text": txt,
+                "tokens": int(math.ceil(index.tokens(lo, hi))),
+            })
+        if hi >= n:
+            break
+        nxt = bisect_left(cum, cum[hi] - overlap_tokens) if overlap_tokens else hi
+        lo = min(hi, max(lo + 1, nxt))
+    return wins
+
+
+
+def split_long_segments(
+    segments: List[Dict[str, Any]],
+    max_tokens: float,
+    count: Optional[Callable[[str], float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Parte segmentos cuyo texto excede max_tokens (p.ej. los de ASR, uno por chunk de audio)
+    en trozos por bordes de oración (o de palabra si una oración sola no cabe), repartiendo
+    start/end en proporción a los caracteres. No se pierde texto.
+    """
+    count = count or (lambda t: len(t) / 4.0)
+    out: List[Dict[str, Any]] = []
+    for seg in segments:
+        text = (seg.get("text") or "").strip()
+        if not text or count(text) <= max_tokens:
+            out.append(seg)
+            continue
+        units = [u for u in _SENT_END_RE.split(text) if u.strip()]
+        pieces: List[str] = []
+        cur = ""
+        for u in units:
+            parts = [u] if count(u) <= max_tokens else u.split()
+            for p in parts:
+                cand = f"{cur} {p}" if cur else p
+                if cur and count(cand) > max_tokens:
+                    pieces.append(cur)
+                    cur = p
+                else:
+                    cur = cand
+        if cur:
+            pieces.append(cur)
+        st = float(seg.get("start", 0)); en = float(seg.get("end", st))
+        total = sum(len(p) for p in pieces) or 1
+        acc = 0
+        for p in pieces:
+            a = st + (en - st) * acc / total
+            acc += len(p)
+            b = st + (en - st) * acc / total
+            out.append(dict(seg, start=a, end=b, text=p))
+    return out
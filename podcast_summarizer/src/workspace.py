@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, List, Optional
+import contextlib, os, shutil, tempfile, threading
+
+class Workspace:
+    """
+    Directorio temporal de trabajo (chunks de audio, etc.) que se borra al salir del `with`,
+    también si hubo error. Base configurable con WORK_DIR (por defecto el tmp del sistema).
+    """
+    def __init__(self, prefix: str = "ws_", base_dir: Optional[str] = None):
+        self.prefix = prefix
+        self.base_dir = base_dir or os.getenv("WORK_DIR") or None
+        self.path: Optional[str] = None
+
+    def __enter__(self) -> "Workspace":
+        if self.base_dir:
+            os.makedirs(self.base_dir, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=self.prefix, dir=self.base_dir)
+        return self
+
+    def __exit__(self, *exc):
+        if self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+        return False
+
+
+class AudioCache:
+    """
+    Carpeta de audios descargados con cuota total en bytes y desalojo LRU.
+    La recencia es el mtime del archivo (se actualiza con touch() al reutilizarlo);
+    los archivos en uso (pin) nunca se desalojan.
+    """
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def lookup(self, name: str) -> Optional[str]:
+        p = self.path_for(name)
+        if os.path.isfile(p) and os.path.getsize(p) > 0:
+            self.touch(p)
+            return p
+        return None
+
+    def touch(self, path: str):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def pin(self, path: str):
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+        try:
+            yield path
+        finally:
+            with self._lock:
+                n = self._pins.get(path, 1) - 1
+                if n <= 0:
+                    self._pins.pop(path, None)
+                else:
+                    self._pins[path] = n
+
+    def usage(self) -> int:
+        total = 0
+        for e in os.scandir(self.root):
+            if e.is_file():
+                total += e.stat().st_size
+        return total
+
+    def enforce(self) -> List[str]:
+        """Borra los audios menos usados recientemente hasta quedar bajo la cuota. Devuelve los borrados."""
+        with self._lock:
+            pinned = set(self._pins)
+            files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(self.root) if e.is_file()]
+            total = sum(sz for _, sz, _ in files)
+            evicted = []
+            for _, sz, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if path in pinned:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= sz
+                    evicted.append(path)
+                except OSError:
+                    pass
+            return evicted
+
+
+# Una instancia por carpeta, compartida por el proceso (la cuota es global a esa carpeta)
+_CACHES: Dict[str, AudioCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+def get_audio_cache(root: str, max_bytes: Optional[int] = None) -> AudioCache:
+    root = os.path.abspath(root)
+    with _CACHES_LOCK:
+        c = _CACHES.get(root)
+        if c is None:
+            if max_bytes is None:
+                max_bytes = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(2 * 1024**3)))
+            c = _CACHES[root] = AudioCache(root, max_bytes)
+        return c
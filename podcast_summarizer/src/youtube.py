@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 import subprocess, pathlib, re, time
-from typing import Optional
+from typing import Optional, List, Tuple
+
+from .procs import run_async
 
 def safe_filename(s: str) -> str:
     s = re.sub(r"[^\w\-. ]", "_", (s or "episode")).strip()
     return (s[:120] or "episode").strip("_")
 
-def youtube_to_mp3(url: str, out_dir: str = "/outputs", title_hint: Optional[str] = None) -> str:
+def _mp3_cmd(url: str, out_dir: str, title_hint: Optional[str], start_s: Optional[float] = None) -> Tuple[List[str], str]:
     pathlib.Path(out_dir).mkdir(parents=True, exist_ok=True)
     base = safe_filename(title_hint or f"yt_{int(time.time())}")
     out = str(pathlib.Path(out_dir) / (base + ".%(ext)s"))
@@ -18,5 +20,39 @@ def youtube_to_mp3(url: str, out_dir: str = "/outputs", title_hint: Optional[str
         "-o", out,
         url,
     ]
+    if start_s:
+        # solo desde start_s hasta el final (modo incremental); yt-dlp corta con ffmpeg
+        cmd[1:1] = ["--download-sections", f"*{start_s:.2f}-inf"]
+    return cmd, str(pathlib.Path(out_dir) / (base + ".mp3"))
+
+def youtube_to_mp3(url: str, out_dir: str = "/outputs", title_hint: Optional[str] = None,
+                   start_s: Optional[float] = None) -> str:
+    cmd, path = _mp3_cmd(url, out_dir, title_hint, start_s)
     subprocess.check_call(cmd)
-    return str(pathlib.Path(out_dir) / (base + ".mp3"))
+    return path
+
+async def youtube_to_mp3_async(url: str, out_dir: str = "/outputs", title_hint: Optional[str] = None,
+                               start_s: Optional[float] = None) -> str:
+    cmd, path = _mp3_cmd(url, out_dir, title_hint, start_s)
+    await run_async(cmd)
+    return path
+
+def list_playlist_ids(url: str) -> List[str]:
+    """IDs de los videos de una playlist/canal sin descargar nada (yt-dlp --flat-playlist)."""
+    out = subprocess.check_output(
+        ["yt-dlp", "--flat-playlist", "--print", "id", "--ignore-errors", url],
+        text=True
+    )
+    return [l.strip() for l in out.splitlines() if l.strip()]
+
+def youtube_audio_stream(url: str) -> subprocess.Popen:
+    """Lanza yt-dlp escribiendo el mejor audio a stdout (sin transcodificar ni tocar disco)."""
+    cmd = [
+        "yt-dlp",
+        "-f", "bestaudio/best",
+        "--no-playlist",
+        "--quiet", "--no-progress",
+        "-o", "-",
+        url,
+    ]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)